@@ -1,33 +1,102 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
-from database import init_db
+import click
+from config import Config
+from database import init_db, rebuild_album_aggregates, rebuild_timeline, rebuild_search_index
 from routes.albums import albums_bp
 from routes.photos import photos_bp
-import os
+from routes.jobs import jobs_bp
+from routes.uploads import uploads_bp
+from routes.timeline import timeline_bp
+from routes.search import search_bp
+from services.job_queue import resume_workers
+from services.gc import collect_garbage, start_collector
+from services.cache import photo_cache
+from services import metrics
+from services.file_serving import SERVING_BACKENDS
+from services.file_manager import ensure_directories
 
 def create_app():
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'your-secret-key-here'
-    app.config['UPLOAD_FOLDER'] = 'uploads'
-    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    app.config['UPLOAD_FOLDER'] = Config.UPLOAD_FOLDER
+    app.config['MAX_CONTENT_LENGTH'] = Config.MAX_CONTENT_LENGTH
+    
+    # Let the fronting web server send photo files
+    if Config.FILE_SERVING not in SERVING_BACKENDS:
+        raise ValueError(f"Unknown FILE_SERVING backend: {Config.FILE_SERVING}")
+    app.config['USE_X_SENDFILE'] = Config.FILE_SERVING == 'x-sendfile'
     
     # Enable CORS for frontend
     CORS(app)
     
     # Create upload directories
-    os.makedirs('uploads/originals', exist_ok=True)
-    os.makedirs('uploads/compressed', exist_ok=True)
+    ensure_directories()
     
     # Initialize database
     init_db()
     
+    # Resume interrupted upload jobs; queue workers start when there is work
+    resume_workers()
+    
+    # Purge expired soft-deleted photos and albums in the background if GC_INTERVAL is set
+    start_collector()
+    
     # Register blueprints
     app.register_blueprint(albums_bp, url_prefix='/api')
     app.register_blueprint(photos_bp, url_prefix='/api')
+    app.register_blueprint(jobs_bp, url_prefix='/api')
+    app.register_blueprint(uploads_bp, url_prefix='/api')
+    app.register_blueprint(timeline_bp, url_prefix='/api')
+    app.register_blueprint(search_bp, url_prefix='/api')
     
     @app.route('/api/health')
     def health_check():
-        return jsonify({'status': 'healthy', 'message': 'Photo Organizer API is running'})
+        return jsonify({
+            'status': 'healthy',
+            'message': 'Photo Organizer API is running',
+            'cache': photo_cache.stats()
+        })
+    
+    @app.route('/api/metrics')
+    def metrics_endpoint():
+        if not metrics.enabled():
+            return jsonify({'error': 'Metrics are disabled'}), 404
+        
+        stats = photo_cache.stats()
+        for stat in ('hits', 'misses', 'evictions'):
+            metrics.set_counter(f'photo_cache_{stat}_total', stats.pop(stat))
+        for stat, value in stats.items():
+            metrics.set_gauge('photo_cache', value, stat=stat)
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+    
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index_command():
+        """Reindex album names, descriptions and photo filenames for search"""
+        rebuild_search_index()
+        print("Rebuilt the search index")
+    
+    @app.cli.command('rebuild-aggregates')
+    def rebuild_aggregates_command():
+        """Recompute album photo counts, byte totals and covers, and timeline day counts"""
+        count = rebuild_album_aggregates()
+        rebuild_timeline()
+        print(f"Rebuilt aggregates for {count} albums and the timeline day counts")
+    
+    @app.cli.command('gc')
+    @click.option('--retention-days', type=float, default=None,
+                  help=f'purge what was deleted over this many days ago (default {Config.GC_RETENTION_DAYS})')
+    @click.option('--batch-size', type=int, default=None,
+                  help=f'photos purged per transaction (default {Config.GC_BATCH_SIZE})')
+    @click.option('--skip-orphans', is_flag=True, help='do not scan the upload folders for orphaned files')
+    def gc_command(retention_days, batch_size, skip_orphans):
+        """Hard-delete expired soft-deleted photos and albums and remove unreferenced files"""
+        stats = collect_garbage(retention_days, batch_size, orphans=not skip_orphans)
+        print(f"Purged {stats['photos']} photos, {stats['albums']} albums, {stats['blobs']} blobs, "
+              f"{stats['renditions']} renditions, {stats['jobs']} upload jobs and "
+              f"{stats['upload_sessions']} upload sessions; "
+              f"removed {stats['orphan_files']} orphaned files")
+        print(f"Reclaimed {stats['bytes_reclaimed'] / (1024 * 1024):.1f} MB")
     
     return app
 
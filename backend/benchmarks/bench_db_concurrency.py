@@ -0,0 +1,109 @@
+"""Measure read throughput while an upload batch is writing
+
+Compares the legacy setup (rollback journal, a new connection per query)
+with pooled WAL connections. Run from the backend directory:
+
+    python -m benchmarks.bench_db_concurrency --seconds 5 --readers 4
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+import database
+from config import Config
+
+MODES = {
+    'legacy': {'DB_JOURNAL_MODE': 'DELETE', 'DB_SYNCHRONOUS': 'FULL', 'DB_POOL_SIZE': 0},
+    'pooled-wal': {'DB_JOURNAL_MODE': 'WAL', 'DB_SYNCHRONOUS': 'NORMAL', 'DB_POOL_SIZE': 8}
+}
+
+def configure(directory, settings):
+    """Point the database layer at a fresh file with the given settings"""
+    for name, value in settings.items():
+        setattr(Config, name, value)
+    
+    database.close_db_connections()
+    database.DATABASE_PATH = os.path.join(directory, 'bench.db')
+    database._pool = database.ConnectionPool(Config.DB_POOL_SIZE)
+    database.init_db()
+
+def insert_photo(album_id, index):
+    """Insert one synthetic photo row"""
+    return database.create_photo(
+        album_id=album_id,
+        filename=f"bench_{index}.jpeg",
+        original_filename=f"bench_{index}.jpg",
+        file_format='JPEG',
+        original_path=f"uploads/originals/bench_{index}.jpeg",
+        compressed_path=f"uploads/compressed/bench_{index}.jpeg",
+        original_size=4000000,
+        compressed_size=400000,
+        width=1920,
+        height=1280
+    )
+
+def run(seconds, readers, seed_photos):
+    """Return (reads/s, writes/s) with one writer and several readers"""
+    album_id = database.create_album('bench')
+    photo_ids = [insert_photo(album_id, i) for i in range(seed_photos)]
+    
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0}
+    lock = threading.Lock()
+    
+    def writer():
+        index = seed_photos
+        while not stop.is_set():
+            insert_photo(album_id, index)
+            index += 1
+            with lock:
+                counts['writes'] += 1
+    
+    def reader(offset):
+        index = offset
+        while not stop.is_set():
+            database.get_photo_by_id(photo_ids[index % len(photo_ids)])
+            database.get_album_by_id(album_id)
+            index += 1
+            with lock:
+                counts['reads'] += 2
+    
+    threads = [threading.Thread(target=writer)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    
+    return counts['reads'] / seconds, counts['writes'] / seconds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seed-photos', type=int, default=1000)
+    args = parser.parse_args()
+    
+    original = {name: getattr(Config, name) for name in MODES['legacy']}
+    original_path = database.DATABASE_PATH
+    
+    print(f"{'mode':>11} {'reads/s':>10} {'writes/s':>10}")
+    try:
+        for mode, settings in MODES.items():
+            with tempfile.TemporaryDirectory() as tmp:
+                configure(tmp, settings)
+                reads, writes = run(args.seconds, args.readers, args.seed_photos)
+                database.close_db_connections()
+            print(f"{mode:>11} {reads:>10.0f} {writes:>10.0f}")
+    finally:
+        for name, value in original.items():
+            setattr(Config, name, value)
+        database.DATABASE_PATH = original_path
+        database._pool = database.ConnectionPool(Config.DB_POOL_SIZE)
+
+if __name__ == '__main__':
+    main()
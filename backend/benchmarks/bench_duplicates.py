@@ -0,0 +1,49 @@
+"""Measure near-duplicate clustering time for large albums
+
+Each size is run on random hashes with planted near-duplicates and on an
+album where every photo has the same hash.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_duplicates --photos 10000 100000 --threshold 3
+"""
+import argparse
+import random
+import time
+from services.similarity import find_duplicate_clusters
+
+def synthetic_hashes(count, duplicate_pairs, seed=0):
+    """Random 64-bit hashes with duplicate_pairs planted near-duplicates (2 bits apart)"""
+    rng = random.Random(seed)
+    hashes = [rng.getrandbits(64) for _ in range(count)]
+    
+    for i in range(0, min(duplicate_pairs * 2, count - 1), 2):
+        hashes[i + 1] = hashes[i] ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64))
+    return hashes
+
+def identical_hashes(count, seed=0):
+    """One random hash shared by every photo, as in an album of burst shots"""
+    return [random.Random(seed).getrandbits(64)] * count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--photos', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--threshold', type=int, nargs='+', default=[2, 3, 4])
+    parser.add_argument('--duplicates', type=float, default=0.01, help='fraction of photos with a planted twin')
+    args = parser.parse_args()
+    
+    print(f"{'hashes':>9} {'photos':>8} {'threshold':>10} {'clusters':>9} {'seconds':>8}")
+    for count in args.photos:
+        ids = list(range(count))
+        cases = (('random', synthetic_hashes(count, int(count * args.duplicates))),
+                 ('identical', identical_hashes(count)))
+        
+        for case, hashes in cases:
+            for threshold in args.threshold:
+                start = time.perf_counter()
+                clusters = find_duplicate_clusters(ids, hashes, threshold)
+                elapsed = time.perf_counter() - start
+                print(f"{case:>9} {count:>8} {threshold:>10} {len(clusters):>9} {elapsed:>8.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Compare compress_image speed and output quality with and without fast decode
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_fast_decode --images 6 --megapixels 24 48
+"""
+import argparse
+import math
+import os
+import tempfile
+import time
+from PIL import Image, ImageChops, ImageStat
+from benchmarks.corpus import write_corpus
+from config import Config
+from services.image_processor import compress_image
+
+def psnr(reference_path, candidate_path):
+    """Peak signal-to-noise ratio of candidate against reference, in dB"""
+    with Image.open(reference_path) as reference, Image.open(candidate_path) as candidate:
+        diff = ImageChops.difference(reference.convert('RGB'), candidate.convert('RGB'))
+    
+    pixels = diff.width * diff.height
+    mse = sum(ImageStat.Stat(diff).sum2) / (pixels * 3)
+    return float('inf') if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+def run(paths, output_dir, fast_decode):
+    """Compress every path and return (elapsed seconds, output paths)"""
+    Config.FAST_DECODE = fast_decode
+    outputs = []
+    
+    start = time.perf_counter()
+    for i, path in enumerate(paths):
+        output_path = os.path.join(output_dir, f"{'fast' if fast_decode else 'full'}_{i}.jpeg")
+        compress_image(path, output_path, 'JPEG')
+        outputs.append(output_path)
+    return time.perf_counter() - start, outputs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', type=int, default=6)
+    parser.add_argument('--megapixels', type=int, nargs='+', default=[12, 24, 48])
+    args = parser.parse_args()
+    
+    original_setting = Config.FAST_DECODE
+    print(f"{'MP':>4} {'full s/img':>11} {'fast s/img':>11} {'speedup':>8} {'PSNR dB':>8}")
+    
+    try:
+        for megapixels in args.megapixels:
+            # 3:2 aspect ratio, like most camera sensors
+            width = int(math.sqrt(megapixels * 1e6 * 3 / 2))
+            height = int(width * 2 / 3)
+            
+            with tempfile.TemporaryDirectory() as tmp:
+                paths = write_corpus(os.path.join(tmp, 'corpus'), [(width, height)] * args.images)
+                
+                full_time, full_outputs = run(paths, tmp, False)
+                fast_time, fast_outputs = run(paths, tmp, True)
+                quality = min(psnr(ref, out) for ref, out in zip(full_outputs, fast_outputs))
+                
+                print(f"{megapixels:>4} {full_time / args.images:>11.3f} {fast_time / args.images:>11.3f} "
+                      f"{full_time / fast_time:>7.2f}x {quality:>8.2f}")
+    finally:
+        Config.FAST_DECODE = original_setting
+
+if __name__ == '__main__':
+    main()
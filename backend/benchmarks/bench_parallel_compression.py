@@ -0,0 +1,59 @@
+"""Measure how compress_image throughput scales with worker count
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_parallel_compression --images 24 --workers 1 2 4
+"""
+import argparse
+import os
+import tempfile
+import time
+from benchmarks.corpus import write_corpus
+from services.image_processor import compress_batch, create_executor
+
+def run(paths, output_dir, kind, workers):
+    """Compress every path once and return elapsed seconds"""
+    jobs = [(path, os.path.join(output_dir, f"{kind}_{workers}_{i}.jpeg"), 'JPEG')
+            for i, path in enumerate(paths)]
+    
+    executor = create_executor(kind, workers)
+    try:
+        # Warm up the pool so worker start-up is not part of the measurement
+        compress_batch(jobs[:workers], executor)
+        
+        start = time.perf_counter()
+        results = compress_batch(jobs, executor)
+        elapsed = time.perf_counter() - start
+    finally:
+        executor.shutdown()
+    
+    failed = [error for _, error in results if error is not None]
+    if failed:
+        raise failed[0]
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', type=int, default=24)
+    parser.add_argument('--width', type=int, default=4000)
+    parser.add_argument('--height', type=int, default=3000)
+    parser.add_argument('--executor', default='process', choices=['process', 'thread', 'serial'])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_corpus(os.path.join(tmp, 'corpus'), [(args.width, args.height)] * args.images)
+        output_dir = os.path.join(tmp, 'out')
+        os.makedirs(output_dir)
+        
+        print(f"{args.images} images of {args.width}x{args.height}, executor={args.executor}")
+        print(f"{'workers':>8} {'seconds':>9} {'images/s':>9} {'speedup':>8}")
+        
+        baseline = None
+        for workers in sorted(set(args.workers)):
+            elapsed = run(paths, output_dir, args.executor, workers)
+            baseline = baseline or elapsed
+            print(f"{workers:>8} {elapsed:>9.2f} {args.images / elapsed:>9.2f} {baseline / elapsed:>7.2f}x")
+
+if __name__ == '__main__':
+    main()
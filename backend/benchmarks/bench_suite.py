@@ -0,0 +1,416 @@
+"""Benchmark the ingest and serving hot paths and write the results as JSON
+
+Measures per-format compress_image stages, DB inserts, end-to-end upload
+throughput through the Flask test client, album listing latency as the
+album grows, near-duplicate search at the default threshold and the cold
+start of a fresh worker process. Run from the backend directory:
+
+    python -m benchmarks.bench_suite --output results.json
+    python -m benchmarks.bench_suite --output new.json --baseline results.json
+    python -m benchmarks.bench_suite --compare results.json new.json
+
+Comparisons flag metrics that got worse by more than --tolerance and exit
+with status 1 if any did.
+"""
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+import PIL
+import pillow_heif
+import database
+from benchmarks.bench_duplicates import identical_hashes, synthetic_hashes
+from benchmarks.corpus import VARIANTS, encode_variant, write_variant
+from config import Config
+from services.image_processor import compress_image, get_output_format
+from services.pagination import encode_cursor
+from services.similarity import find_duplicate_clusters
+
+SECTIONS = ('stages', 'db', 'upload', 'listing', 'duplicates', 'startup')
+
+# Stages compress_image times, in the order it runs them
+STAGES = ('decode', 'resize', 'hash', 'encode')
+
+def metric(value, unit, better='lower'):
+    """Build one result entry"""
+    return {'value': round(value, 4), 'unit': unit, 'better': better}
+
+def dimensions(megapixels):
+    """Width and height of a 3:2 image with the given megapixel count"""
+    width = int(math.sqrt(megapixels * 1e6 * 3 / 2))
+    return width, width * 2 // 3
+
+def median_ms(samples):
+    """Median of samples in seconds, as milliseconds"""
+    return statistics.median(samples) * 1000
+
+def time_stages(path, file_format, output_dir, repeat):
+    """Median milliseconds of each compress_image stage for one input file
+    
+    The stages are the ones compress_image times itself, so they always
+    cover the code production runs; stages it skipped (resize for images
+    already narrow enough) count as zero.
+    """
+    output_path = os.path.join(output_dir, f"stage.{get_output_format(file_format).lower()}")
+    samples = defaultdict(list)
+    metrics_enabled = Config.METRICS_ENABLED
+    Config.METRICS_ENABLED = True
+    
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = compress_image(path, output_path, file_format)
+            total = time.perf_counter() - start
+            
+            stages = dict.fromkeys(STAGES, 0.0)
+            for stage, seconds in result['stages']:
+                stages[stage] += seconds
+            for stage, seconds in stages.items():
+                samples[stage].append(seconds)
+            samples['compress_image'].append(total)
+    finally:
+        Config.METRICS_ENABLED = metrics_enabled
+    
+    return {stage: median_ms(values) for stage, values in samples.items()}
+
+def bench_stages(args, workdir):
+    """Per-format, per-size stage timings"""
+    results = {}
+    for megapixels in args.megapixels:
+        width, height = dimensions(megapixels)
+        for label in VARIANTS:
+            path = write_variant(os.path.join(workdir, 'corpus'), label, width, height, args.seed)
+            stages = time_stages(path, VARIANTS[label][3], workdir, args.repeat)
+            
+            for stage, value in stages.items():
+                results[f"stages.{label}.{megapixels}mp.{stage}"] = metric(value, 'ms')
+            print(f"  {label:>12} {megapixels:>3}MP " +
+                  ' '.join(f"{stage}={value:.1f}ms" for stage, value in stages.items()))
+    return results
+
+def photo_rows(album_id, count, start=0):
+    """Build synthetic photo rows for create_photos"""
+    return [dict(album_id=album_id,
+                 filename=f"bench_{i}.jpeg",
+                 original_filename=f"bench_{i}.jpg",
+                 file_format='JPEG',
+                 original_path=f"uploads/originals/bench_{i}.jpeg",
+                 compressed_path=f"uploads/compressed/bench_{i}.jpeg",
+                 original_size=4000000,
+                 compressed_size=400000,
+                 width=1920,
+                 height=1280)
+            for i in range(start, start + count)]
+
+def bench_db(args):
+    """Per-photo insert cost, one transaction per photo vs. batched"""
+    album_id = database.create_album('bench-db')
+    
+    rows = photo_rows(album_id, args.db_rows // 10)
+    start = time.perf_counter()
+    for row in rows:
+        database.create_photo(**row)
+    single = (time.perf_counter() - start) / len(rows)
+    
+    rows = photo_rows(album_id, args.db_rows, len(rows))
+    start = time.perf_counter()
+    database.create_photos(rows)
+    bulk = (time.perf_counter() - start) / len(rows)
+    
+    print(f"  insert single={single * 1e6:.0f}us/photo bulk={bulk * 1e6:.0f}us/photo")
+    return {
+        'db.insert_single': metric(single * 1e6, 'us/photo'),
+        'db.insert_bulk': metric(bulk * 1e6, 'us/photo')
+    }
+
+def bench_upload(args, client):
+    """End-to-end POST /api/albums/<id>/photos throughput"""
+    album_id = client.post('/api/albums', json={'name': 'bench-upload'}).json['id']
+    width, height = dimensions(args.upload_megapixels)
+    labels = list(VARIANTS)
+    
+    # Distinct seeds so content deduplication never skips compression
+    batches = []
+    for request_index in range(args.uploads):
+        batch = []
+        for file_index in range(args.files_per_upload):
+            label = labels[(request_index + file_index) % len(labels)]
+            seed = args.seed + 1000 + request_index * args.files_per_upload + file_index
+            data = encode_variant(label, width, height, seed)
+            batch.append((data, f"upload_{seed}.{VARIANTS[label][2]}"))
+        batches.append(batch)
+    
+    total_bytes = sum(len(data) for batch in batches for data, _ in batch)
+    start = time.perf_counter()
+    for batch in batches:
+        files = [(io.BytesIO(data), name) for data, name in batch]
+        response = client.post(f'/api/albums/{album_id}/photos?mode=sync',
+                               data={'files': files}, content_type='multipart/form-data')
+        if response.status_code != 201:
+            raise RuntimeError(f"Upload failed: {response.status_code} {response.get_json()}")
+    elapsed = time.perf_counter() - start
+    
+    photos = args.uploads * args.files_per_upload
+    print(f"  {photos} photos in {elapsed:.2f}s: {photos / elapsed:.2f} photos/s, "
+          f"{total_bytes / elapsed / 1e6:.2f} MB/s")
+    return {
+        'upload.photos_per_second': metric(photos / elapsed, 'photos/s', 'higher'),
+        'upload.megabytes_per_second': metric(total_bytes / elapsed / 1e6, 'MB/s', 'higher')
+    }
+
+def time_request(client, url, repeat):
+    """Median milliseconds of a GET request"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url)
+        samples.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} failed: {response.status_code}")
+    return median_ms(samples)
+
+def middle_cursor(album_id, count):
+    """Cursor of the photo halfway down an album listing"""
+    with database.db_cursor('middle_cursor') as cursor:
+        cursor.execute('''
+            SELECT created_at, id FROM photos
+            WHERE album_id = ? AND status = 'active'
+            ORDER BY created_at DESC, id DESC
+            LIMIT 1 OFFSET ?
+        ''', (album_id, count // 2))
+        row = cursor.fetchone()
+    return encode_cursor(row['created_at'], row['id'])
+
+def bench_listing(args, client):
+    """Album and photo listing latency as one album grows"""
+    album_id = database.create_album('bench-listing')
+    results = {}
+    count = 0
+    repeat = args.repeat * 5
+    
+    for size in sorted(args.listing_sizes):
+        database.create_photos(photo_rows(album_id, size - count, count))
+        count = size
+        
+        timings = {
+            'albums': time_request(client, '/api/albums', repeat),
+            'album_detail': time_request(client, f'/api/albums/{album_id}', repeat),
+            'first_page': time_request(client, f'/api/albums/{album_id}/photos?limit=100', repeat),
+            'middle_page': time_request(
+                client, f'/api/albums/{album_id}/photos?limit=100&cursor={middle_cursor(album_id, size)}',
+                repeat)
+        }
+        for name, value in timings.items():
+            results[f"listing.{size}.{name}"] = metric(value, 'ms')
+        print(f"  {size:>7} photos " + ' '.join(f"{name}={value:.2f}ms" for name, value in timings.items()))
+    return results
+
+def bench_duplicates(args):
+    """Near-duplicate clustering time at DUPLICATE_THRESHOLD as albums grow
+    
+    Random hashes with 1% planted near-duplicates, and an album where every
+    photo shares one hash.
+    """
+    results = {}
+    for count in sorted(args.duplicate_sizes):
+        ids = list(range(count))
+        cases = (('random', synthetic_hashes(count, count // 100, args.seed)),
+                 ('identical', identical_hashes(count, args.seed)))
+        
+        timings = {}
+        for case, hashes in cases:
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                find_duplicate_clusters(ids, hashes, Config.DUPLICATE_THRESHOLD)
+                samples.append(time.perf_counter() - start)
+            timings[case] = median_ms(samples)
+        
+        for case, value in timings.items():
+            results[f"duplicates.{count}.{case}"] = metric(value, 'ms')
+        print(f"  {count:>7} photos " + ' '.join(f"{case}={value:.1f}ms" for case, value in timings.items()))
+    return results
+
+# Run in a fresh interpreter: times importing the app and create_app, and
+# reports whether the image codecs were loaded on the way
+STARTUP_SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print(imported - start, created - imported, int('PIL' in sys.modules))
+'''
+
+def start_process(directory):
+    """Start one worker process in directory and return its (import, create_app) seconds and codec flag"""
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=backend)
+    output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], cwd=directory, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    imported, created, codecs = output.split()
+    return float(imported), float(created), int(codecs)
+
+def bench_startup(args, workdir):
+    """Cold start of a worker process: importing the app and create_app
+    
+    The first start creates the schema; the others find it up to date, as a
+    worker respawned by the WSGI server does.
+    """
+    directory = os.path.join(workdir, 'startup')
+    os.makedirs(directory)
+    
+    _, fresh, _ = start_process(directory)
+    samples = [start_process(directory) for _ in range(args.startup_runs)]
+    imported = median_ms([sample[0] for sample in samples])
+    created = median_ms([sample[1] for sample in samples])
+    codecs = max(sample[2] for sample in samples)
+    
+    print(f"  import={imported:.1f}ms create_app={created:.1f}ms "
+          f"create_app_new_db={fresh * 1000:.1f}ms codecs_loaded={bool(codecs)}")
+    return {
+        'startup.import': metric(imported, 'ms'),
+        'startup.create_app': metric(created, 'ms'),
+        'startup.create_app_new_db': metric(fresh * 1000, 'ms'),
+        'startup.total': metric(imported + created, 'ms'),
+        'startup.codecs_loaded': metric(codecs, 'bool')
+    }
+
+def run(args):
+    """Run the selected sections in a scratch directory and database"""
+    results = {}
+    original_cwd = os.getcwd()
+    original_path = database.DATABASE_PATH
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            # The app writes uploads relative to the working directory
+            os.chdir(workdir)
+            database.close_db_connections()
+            database.DATABASE_PATH = os.path.join(workdir, 'bench.db')
+            database._pool = database.ConnectionPool(Config.DB_POOL_SIZE)
+            database.init_db()
+            
+            client = None
+            if 'upload' in args.sections or 'listing' in args.sections:
+                from app import create_app
+                client = create_app().test_client()
+            
+            for section in SECTIONS:
+                if section not in args.sections:
+                    continue
+                print(section)
+                if section == 'stages':
+                    results.update(bench_stages(args, workdir))
+                elif section == 'db':
+                    results.update(bench_db(args))
+                elif section == 'upload':
+                    results.update(bench_upload(args, client))
+                elif section == 'listing':
+                    results.update(bench_listing(args, client))
+                elif section == 'duplicates':
+                    results.update(bench_duplicates(args))
+                else:
+                    results.update(bench_startup(args, workdir))
+        finally:
+            os.chdir(original_cwd)
+            database.close_db_connections()
+            database.DATABASE_PATH = original_path
+            database._pool = database.ConnectionPool(Config.DB_POOL_SIZE)
+    
+    return {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'pillow_heif': pillow_heif.__version__,
+            'sqlite': sqlite3.sqlite_version,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'config': {
+                'FAST_DECODE': Config.FAST_DECODE,
+                'COMPRESSION_EXECUTOR': Config.COMPRESSION_EXECUTOR,
+                'JPEG_QUALITY': Config.JPEG_QUALITY,
+                'DUPLICATE_THRESHOLD': Config.DUPLICATE_THRESHOLD,
+                'MAX_WIDTH': Config.MAX_WIDTH
+            },
+            'args': vars(args)
+        },
+        'results': results
+    }
+
+def compare(baseline, current, tolerance):
+    """Print metric changes between two runs and return the regressed metric names"""
+    regressions = []
+    print(f"{'metric':<45} {'baseline':>12} {'current':>12} {'change':>8}")
+    
+    for name, entry in sorted(current['results'].items()):
+        base = baseline['results'].get(name)
+        if base is None or not base['value']:
+            continue
+        
+        change = entry['value'] / base['value'] - 1
+        worse = change > tolerance if entry['better'] == 'lower' else change < -tolerance
+        flag = '  REGRESSION' if worse else ''
+        if worse:
+            regressions.append(name)
+        print(f"{name:<45} {base['value']:>12.3f} {entry['value']:>12.3f} {change:>+7.1%}{flag}")
+    
+    return regressions
+
+def load(path):
+    """Read a saved result file"""
+    with open(path) as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare the new results against this JSON file')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help='compare two saved result files without running anything')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='relative slowdown allowed before a metric is flagged')
+    parser.add_argument('--sections', nargs='+', choices=SECTIONS, default=list(SECTIONS))
+    parser.add_argument('--megapixels', type=int, nargs='+', default=[2, 12])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--db-rows', type=int, default=5000)
+    parser.add_argument('--uploads', type=int, default=8)
+    parser.add_argument('--files-per-upload', type=int, default=4)
+    parser.add_argument('--upload-megapixels', type=int, default=2)
+    parser.add_argument('--listing-sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--duplicate-sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--startup-runs', type=int, default=10)
+    args = parser.parse_args()
+    
+    if args.compare:
+        regressions = compare(load(args.compare[0]), load(args.compare[1]), args.tolerance)
+        sys.exit(1 if regressions else 0)
+    
+    current = run(args)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+        print(f"Results written to {args.output}")
+    
+    if args.baseline:
+        regressions = compare(load(args.baseline), current, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} metrics regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
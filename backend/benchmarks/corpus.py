@@ -0,0 +1,62 @@
+import io
+import os
+import random
+from PIL import Image
+import pillow_heif
+
+pillow_heif.register_heif_opener()
+
+# Corpus variants: label -> (image mode, Pillow save format, extension, upload file format)
+VARIANTS = {
+    'jpeg': ('RGB', 'JPEG', 'jpg', 'JPEG'),
+    'png-rgba': ('RGBA', 'PNG', 'png', 'PNG'),
+    'png-palette': ('P', 'PNG', 'png', 'PNG'),
+    'heic': ('RGB', 'HEIF', 'heic', 'HEIC')
+}
+
+def synthetic_image(width, height, seed=0, mode='RGB'):
+    """Build a deterministic photo-like image of the given size"""
+    rng = random.Random(seed)
+    channels = len(mode)
+    
+    # Upscale a small random image so the result has smooth, photo-like detail
+    small_size = (max(width // 16, 1), max(height // 16, 1))
+    small = Image.frombytes(mode, small_size, rng.randbytes(small_size[0] * small_size[1] * channels))
+    return small.resize((width, height), Image.Resampling.BICUBIC)
+
+def synthetic_variant(label, width, height, seed=0):
+    """Build a synthetic image in the mode of a corpus variant"""
+    mode = VARIANTS[label][0]
+    if mode == 'P':
+        return synthetic_image(width, height, seed).quantize(256)
+    return synthetic_image(width, height, seed, mode)
+
+def encode_variant(label, width, height, seed=0):
+    """Encode a synthetic image of a corpus variant and return the file bytes"""
+    _, save_format, _, _ = VARIANTS[label]
+    buffer = io.BytesIO()
+    synthetic_variant(label, width, height, seed).save(buffer, save_format, quality=95)
+    return buffer.getvalue()
+
+def write_variant(directory, label, width, height, seed=0):
+    """Write one synthetic image of a corpus variant and return its path"""
+    os.makedirs(directory, exist_ok=True)
+    extension = VARIANTS[label][2]
+    path = os.path.join(directory, f"synthetic_{label}_{width}x{height}_{seed}.{extension}")
+    
+    with open(path, 'wb') as f:
+        f.write(encode_variant(label, width, height, seed))
+    return path
+
+def write_corpus(directory, sizes, file_format='JPEG', seed=0):
+    """Write one synthetic image per (width, height) and return the paths"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    
+    for index, (width, height) in enumerate(sizes):
+        extension = 'jpg' if file_format == 'JPEG' else file_format.lower()
+        path = os.path.join(directory, f"synthetic_{index}_{width}x{height}.{extension}")
+        synthetic_image(width, height, seed=seed + index).save(path, file_format, quality=95)
+        paths.append(path)
+    
+    return paths
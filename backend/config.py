@@ -4,7 +4,25 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     DATABASE_URL = os.environ.get('DATABASE_URL') or 'sqlite:///photo_organizer.db'
     UPLOAD_FOLDER = 'uploads'
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
+    
+    # SQLite connection settings
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 8)  # idle connections kept open
+    DB_JOURNAL_MODE = os.environ.get('DB_JOURNAL_MODE') or 'WAL'
+    DB_SYNCHRONOUS = 'NORMAL'
+    DB_CACHE_SIZE_KB = 16 * 1024  # page cache per connection
+    DB_MMAP_SIZE = 256 * 1024 * 1024
+    DB_BUSY_TIMEOUT = 30  # seconds to wait for a lock
+    DB_STATEMENT_CACHE_SIZE = 256
+    DB_INSERT_BATCH_SIZE = 500  # photo rows per bulk insert transaction
+    PAGE_SIZE = 100  # default page size for paginated listings
+    MAX_PAGE_SIZE = 500
+    BULK_MAX_PHOTOS = 5000  # photos changed by one bulk delete/restore/move request
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH') or 16 * 1024 * 1024)  # 16MB per request
+    
+    # Chunked upload settings (each chunk is one request, so it must fit MAX_CONTENT_LENGTH)
+    MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE') or 1024 * 1024 * 1024)  # 1GB per file
+    UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # 8MB
+    UPLOAD_BUFFER_SIZE = 64 * 1024  # 64KB
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'heic', 'heif'}
     
     # Image compression settings
@@ -12,6 +30,91 @@ class Config:
     JPEG_QUALITY = 85
     PNG_COMPRESS_LEVEL = 6
     
+    # Fast decode: JPEG DCT scaling (Image.draft) plus reduce-based downscaling
+    # before the final LANCZOS pass. A larger REDUCING_GAP keeps more detail for
+    # the LANCZOS pass at the cost of speed.
+    FAST_DECODE = (os.environ.get('FAST_DECODE') or 'true').lower() == 'true'
+    REDUCING_GAP = 2.0
+    
+    # Near-duplicate detection: max differing bits between 64-bit dHashes.
+    # Search cost grows quickly with the threshold (it sets the band count):
+    # a 100k-photo album takes about 0.26s at 2, 0.6s at 3 and 2.3s at 4 on
+    # one Xeon vCPU with Python 3.11. The duplicates section of
+    # benchmarks/bench_suite.py tracks the default, so --baseline flags a
+    # regression.
+    DUPLICATE_THRESHOLD = 3
+    MAX_DUPLICATE_THRESHOLD = 4
+    
+    # Full-text search: bm25 scores every match, so queries matching more photos
+    # than this rank only the newest SEARCH_RANK_WINDOW of them (albums always);
+    # the older matches follow the ranked ones, newest first
+    SEARCH_RANK_WINDOW = 2000
+    MAX_SEARCH_TERMS = 8
+    
+    # Rendition widths served by /api/photos/<id>/view?size=... ('full' is the compressed file)
+    RENDITION_SIZES = {
+        'thumb': 320,
+        'small': 640,
+        'medium': 1280
+    }
+    
+    # Extra view formats offered to clients that list them in Accept ('webp',
+    # 'avif'); formats the installed Pillow cannot encode are skipped
+    RENDITION_FORMATS = (os.environ.get('RENDITION_FORMATS') or 'webp,avif').upper().split(',')
+    # Concurrent first requests for a rendition wait for the one generating
+    # it (in any process); a claim older than the timeout is taken over
+    RENDITION_CLAIM_TIMEOUT = 60  # seconds
+    RENDITION_CLAIM_POLL_INTERVAL = 0.05  # seconds
+    WEBP_QUALITY = 80
+    AVIF_QUALITY = 60
+    
+    # Served image files never change once written, so browsers may cache them for a year
+    PHOTO_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+    
+    # In-process LRU cache for photo rows and small served files (0 disables it)
+    PHOTO_CACHE_MAX_BYTES = int(os.environ.get('PHOTO_CACHE_MAX_BYTES') or 64 * 1024 * 1024)
+    PHOTO_CACHE_MAX_FILE_SIZE = 256 * 1024  # larger files are streamed from disk
+    # Seconds an entry is served before the row is read again. Deletes only
+    # invalidate the cache of the process that handled them, so this bounds
+    # how long other worker processes keep serving a deleted photo.
+    PHOTO_CACHE_TTL = int(os.environ.get('PHOTO_CACHE_TTL') or 10)
+    
+    # How photo files are sent: 'sendfile' (the WSGI server's file wrapper,
+    # os.sendfile under gunicorn, read in Python where there is none),
+    # 'stream' (always read in Python, for servers whose wrapper misbehaves),
+    # 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache mod_xsendfile, lighttpd)
+    FILE_SERVING = os.environ.get('FILE_SERVING') or 'sendfile'
+    # nginx internal location aliased to UPLOAD_FOLDER, used with x-accel-redirect
+    X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX') or '/protected-uploads'
+    
+    # Per-stage timing and counters exposed at /api/metrics
+    METRICS_ENABLED = (os.environ.get('METRICS_ENABLED') or 'true').lower() == 'true'
+    
+    # Compression executor settings ('process', 'thread' or 'serial')
+    COMPRESSION_EXECUTOR = os.environ.get('COMPRESSION_EXECUTOR') or 'process'
+    COMPRESSION_WORKERS = int(os.environ.get('COMPRESSION_WORKERS') or os.cpu_count() or 1)
+    
+    # Upload ingestion ('sync' compresses in the request, 'async' enqueues a job)
+    UPLOAD_MODE = os.environ.get('UPLOAD_MODE') or 'sync'
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 2)
+    JOB_POLL_INTERVAL = 1.0  # seconds
+    
     # File storage paths
     ORIGINALS_FOLDER = 'uploads/originals'
     COMPRESSED_FOLDER = 'uploads/compressed'
+    RENDITIONS_FOLDER = 'uploads/renditions'
+    
+    # Originals and compressed files fan out into STORAGE_SHARD_DEPTH levels of
+    # directories named by STORAGE_SHARD_WIDTH hex characters of the content
+    # hash (ab/cd/abcd...jpeg); depth 0 is the flat layout. Existing files
+    # are moved with migrate_storage.py.
+    STORAGE_SHARD_DEPTH = int(os.environ.get('STORAGE_SHARD_DEPTH') or 2)
+    STORAGE_SHARD_WIDTH = int(os.environ.get('STORAGE_SHARD_WIDTH') or 2)
+    
+    # Garbage collection of soft-deleted photos and albums (flask gc, or every
+    # GC_INTERVAL seconds in the background; 0 leaves it to the CLI)
+    GC_RETENTION_DAYS = int(os.environ.get('GC_RETENTION_DAYS') or 30)
+    GC_INTERVAL = int(os.environ.get('GC_INTERVAL') or 0)
+    GC_BATCH_SIZE = 200  # photos purged per transaction
+    GC_ORPHAN_GRACE = 24 * 60 * 60  # files younger than this are never treated as orphans
+    UPLOAD_SESSION_TTL = 7 * 24 * 60 * 60  # idle chunked uploads are abandoned after this
@@ -1,20 +1,224 @@
 import sqlite3
 import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime
+from config import Config
+from services import metrics
 
 DATABASE_PATH = 'photo_organizer.db'
 
+# Keep IN (...) lists below SQLite's bound-parameter limit
+MAX_QUERY_PARAMS = 500
+
+def _chunks(items, size=MAX_QUERY_PARAMS):
+    """Split a list into consecutive chunks of at most size items"""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
 def get_db_connection():
-    """Get database connection"""
-    conn = sqlite3.connect(DATABASE_PATH)
+    """Open a new database connection with the configured pragmas"""
+    conn = sqlite3.connect(
+        DATABASE_PATH,
+        timeout=Config.DB_BUSY_TIMEOUT,
+        cached_statements=Config.DB_STATEMENT_CACHE_SIZE,
+        check_same_thread=False
+    )
     conn.row_factory = sqlite3.Row
+    
+    # WAL lets readers proceed while a writer holds the lock; NORMAL sync is
+    # durable across application crashes in WAL mode and avoids an fsync per commit
+    conn.execute(f'PRAGMA journal_mode = {Config.DB_JOURNAL_MODE}')
+    conn.execute(f'PRAGMA synchronous = {Config.DB_SYNCHRONOUS}')
+    conn.execute(f'PRAGMA cache_size = -{Config.DB_CACHE_SIZE_KB}')
+    conn.execute(f'PRAGMA mmap_size = {Config.DB_MMAP_SIZE}')
+    conn.execute('PRAGMA temp_store = MEMORY')
     return conn
 
-def init_db():
-    """Initialize database with tables and triggers"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+class ConnectionPool:
+    """Pool of reusable connections shared by all threads of a process"""
+    
+    def __init__(self, size):
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+    
+    def acquire(self):
+        """Take an idle connection or open a new one"""
+        with self._lock:
+            # Connections must not be used across fork; the child starts empty
+            if self._pid != os.getpid():
+                self._idle = []
+                self._pid = os.getpid()
+            
+            if self._idle:
+                return self._idle.pop()
+        
+        return get_db_connection()
+    
+    def release(self, conn):
+        """Return a connection to the pool, closing it if the pool is full"""
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        
+        conn.close()
+    
+    def close_all(self):
+        """Close every idle connection (e.g. after DATABASE_PATH changes)"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        
+        for conn in idle:
+            conn.close()
+
+_pool = ConnectionPool(Config.DB_POOL_SIZE)
+
+@contextmanager
+def db_cursor(operation, immediate=False):
+    """Borrow a pooled connection and run the block as one transaction
+    
+    Commits when the block succeeds and rolls back if it raises. With
+    immediate=True the write lock is taken before the first statement.
+    With metrics enabled, the transaction is timed under operation, the
+    name of the helper that opened it.
+    """
+    start = time.perf_counter()
+    
+    conn = _pool.acquire()
+    try:
+        cursor = conn.cursor()
+        if immediate:
+            cursor.execute('BEGIN IMMEDIATE')
+        
+        yield cursor
+        with metrics.timed('db_commit_seconds', operation=operation):
+            conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        _pool.release(conn)
+        metrics.observe('db_transaction_seconds', time.perf_counter() - start, operation=operation)
+
+def close_db_connections():
+    """Close pooled connections"""
+    _pool.close_all()
+
+def _add_column_if_missing(cursor, table, column, definition):
+    """Add a column to an existing table created before the column existed
+    
+    Returns True if the column was added.
+    """
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column in [row['name'] for row in cursor.fetchall()]:
+        return False
+    
+    cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return True
+
+# EXIF metadata read at ingest, stored on photos and blobs
+_METADATA_COLUMNS = (
+    ('taken_at', 'TIMESTAMP'),  # camera local time
+    ('camera_model', 'TEXT'),
+    ('orientation', 'INTEGER'),
+    ('gps_latitude', 'REAL'),
+    ('gps_longitude', 'REAL')
+)
+
+# Timeline position of a photo row: capture time, or upload time without EXIF
+_TIMELINE_TIME = 'COALESCE({row}taken_at, {row}created_at)'
+
+# Newest active photo of an album, in listing order
+_LATEST_PHOTO_SQL = '''
+    SELECT id FROM photos
+    WHERE album_id = {album} AND status = 'active'
+    ORDER BY created_at DESC, id DESC LIMIT 1
+'''
+
+def _rebuild_album_aggregates(cursor, album_id=None):
+    """Recompute album aggregates from the photos table and return the rows changed"""
+    query = '''
+        UPDATE albums
+        SET photo_count = (
+                SELECT COUNT(*) FROM photos
+                WHERE album_id = albums.id AND status = 'active'),
+            total_original_size = (
+                SELECT COALESCE(SUM(original_size), 0) FROM photos
+                WHERE album_id = albums.id AND status = 'active'),
+            total_compressed_size = (
+                SELECT COALESCE(SUM(compressed_size), 0) FROM photos
+                WHERE album_id = albums.id AND status = 'active'),
+            cover_photo_id = (%s)
+    ''' % _LATEST_PHOTO_SQL.format(album='albums.id')
+    params = ()
+    
+    if album_id is not None:
+        query += ' WHERE id = ?'
+        params = (album_id,)
     
+    cursor.execute(query, params)
+    return cursor.rowcount
+
+def _rebuild_timeline(cursor):
+    """Recount timeline_days from the photos table"""
+    cursor.execute('DELETE FROM timeline_days')
+    cursor.execute('''
+        INSERT INTO timeline_days (day, photo_count)
+        SELECT substr(%s, 1, 10), COUNT(*)
+        FROM photos p
+        JOIN albums a ON a.id = p.album_id
+        WHERE p.status = 'active' AND a.status = 'active'
+        GROUP BY 1
+    ''' % _TIMELINE_TIME.format(row='p.'))
+
+def rebuild_timeline():
+    """Rebuild the per-day timeline counts kept by the photos and albums triggers"""
+    with db_cursor('rebuild_timeline', immediate=True) as cursor:
+        _rebuild_timeline(cursor)
+
+# Full-text index over album names and descriptions and photo filenames.
+# Photos are indexed under their id and albums under their negated id, so
+# both share one rowid space and one set of bm25 statistics.
+_SEARCH_WEIGHTS = (2.0, 1.0)  # name, description
+
+def _rebuild_search_index(cursor):
+    """Reindex active albums and photos"""
+    cursor.execute('DELETE FROM search_index')
+    cursor.execute('''
+        INSERT INTO search_index (rowid, name)
+        SELECT id, original_filename FROM photos WHERE status = 'active'
+    ''')
+    cursor.execute('''
+        INSERT INTO search_index (rowid, name, description)
+        SELECT -id, name, description FROM albums WHERE status = 'active'
+    ''')
+    cursor.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+
+def rebuild_search_index():
+    """Rebuild the full-text index kept by the albums and photos triggers"""
+    with db_cursor('rebuild_search_index', immediate=True) as cursor:
+        _rebuild_search_index(cursor)
+
+def rebuild_album_aggregates(album_id=None):
+    """Rebuild photo counts, byte totals and covers for one or all albums
+    
+    The triggers keep these exact; this repairs albums after manual edits or
+    restores from backup. Returns the number of albums rewritten.
+    """
+    with db_cursor('rebuild_album_aggregates', immediate=True) as cursor:
+        return _rebuild_album_aggregates(cursor, album_id)
+
+def _migrate_baseline(cursor):
+    """Tables, indexes and triggers as they were when schema versioning began
+    
+    Every statement is idempotent, so this also upgrades databases created
+    before versioning, whatever columns and triggers they already have.
+    """
     # Create albums table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS albums (
@@ -28,6 +232,12 @@ def init_db():
             FOREIGN KEY (cover_photo_id) REFERENCES photos(id) ON DELETE SET NULL
         )
     ''')
+    # Aggregates over active photos, kept exact by the photos triggers below
+    added = [_add_column_if_missing(cursor, 'albums', column, 'INTEGER NOT NULL DEFAULT 0')
+             for column in ('photo_count', 'total_original_size', 'total_compressed_size')]
+    # When the album was soft-deleted; updated_at moves with every photo change
+    if _add_column_if_missing(cursor, 'albums', 'deleted_at', 'TIMESTAMP'):
+        cursor.execute("UPDATE albums SET deleted_at = updated_at WHERE status = 'deleted'")
     
     # Create photos table
     cursor.execute('''
@@ -50,13 +260,173 @@ def init_db():
             FOREIGN KEY (album_id) REFERENCES albums(id) ON DELETE CASCADE
         )
     ''')
+    _add_column_if_missing(cursor, 'photos', 'content_hash', 'TEXT')
+    if _add_column_if_missing(cursor, 'photos', 'deleted_at', 'TIMESTAMP'):
+        cursor.execute("UPDATE photos SET deleted_at = updated_at WHERE status = 'deleted'")
+    _add_column_if_missing(cursor, 'photos', 'phash', 'INTEGER')
+    for column, definition in _METADATA_COLUMNS:
+        _add_column_if_missing(cursor, 'photos', column, definition)
+    
+    # Create blobs table (content-addressed files shared by identical photos)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS blobs (
+            content_hash TEXT PRIMARY KEY,
+            file_format TEXT NOT NULL,
+            original_path TEXT NOT NULL,
+            compressed_path TEXT NOT NULL,
+            original_size INTEGER NOT NULL,
+            compressed_size INTEGER NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    _add_column_if_missing(cursor, 'blobs', 'phash', 'INTEGER')
+    for column, definition in _METADATA_COLUMNS:
+        _add_column_if_missing(cursor, 'blobs', column, definition)
+    
+    # Create renditions table (downscaled copies of the compressed photo)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS renditions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            photo_id INTEGER NOT NULL,
+            size TEXT NOT NULL,
+            path TEXT NOT NULL,
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL,
+            file_size INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (photo_id, size),
+            FOREIGN KEY (photo_id) REFERENCES photos(id) ON DELETE CASCADE
+        )
+    ''')
+    # WebP/AVIF variants are keyed as '<size>:<format>' and record the size
+    # of the JPEG/PNG file they stand in for
+    _add_column_if_missing(cursor, 'renditions', 'format', 'TEXT')
+    _add_column_if_missing(cursor, 'renditions', 'legacy_size', 'INTEGER')
+    
+    # Create upload jobs table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            album_id INTEGER NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (album_id) REFERENCES albums(id) ON DELETE CASCADE
+        )
+    ''')
+    
+    # Create job items table (one compression task per uploaded file)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS job_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            original_filename TEXT NOT NULL,
+            content_hash TEXT,
+            filename TEXT,
+            file_format TEXT,
+            original_path TEXT,
+            compressed_path TEXT,
+            original_size INTEGER,
+            status TEXT DEFAULT 'pending' CHECK(status IN ('pending', 'processing', 'completed', 'failed')),
+            photo_id INTEGER,
+            error TEXT,
+            worker_pid INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (job_id) REFERENCES jobs(id) ON DELETE CASCADE,
+            FOREIGN KEY (photo_id) REFERENCES photos(id) ON DELETE SET NULL
+        )
+    ''')
+    
+    # Create chunked upload sessions table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            id TEXT PRIMARY KEY,
+            album_id INTEGER NOT NULL,
+            original_filename TEXT NOT NULL,
+            file_format TEXT NOT NULL,
+            partial_path TEXT NOT NULL,
+            total_size INTEGER NOT NULL,
+            received_size INTEGER NOT NULL DEFAULT 0,
+            status TEXT DEFAULT 'uploading' CHECK(status IN ('uploading', 'completed')),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (album_id) REFERENCES albums(id) ON DELETE CASCADE
+        )
+    ''')
+    
+    # Files seen by the bulk importer; the (size, mtime) signature lets
+    # re-runs skip files that were already imported
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS imported_files (
+            source_path TEXT PRIMARY KEY,
+            file_size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            content_hash TEXT,
+            album_id INTEGER,
+            photo_id INTEGER,
+            status TEXT NOT NULL CHECK(status IN ('imported', 'failed')),
+            error TEXT,
+            imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Old names of files moved by migrate_storage.py, removed once the
+    # database points at the new names
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stale_files (
+            path TEXT PRIMARY KEY
+        ) WITHOUT ROWID
+    ''')
+    
+    # Active photos in active albums per capture day, kept by the triggers below
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'timeline_days'")
+    timeline_created = cursor.fetchone() is None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS timeline_days (
+            day TEXT PRIMARY KEY,
+            photo_count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
     
     # Create indexes
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_albums_status ON albums(status)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_albums_created_at ON albums(created_at DESC)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_photos_album_id ON photos(album_id)')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_photos_album_listing
+        ON photos(album_id, status, created_at DESC, id DESC)
+    ''')
+    # Superseded by idx_photos_album_listing, which has album_id as its prefix
+    cursor.execute('DROP INDEX IF EXISTS idx_photos_album_id')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_photos_status ON photos(status)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_photos_created_at ON photos(created_at DESC)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_photos_content_hash ON photos(content_hash)')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_photos_deleted_at
+        ON photos(deleted_at) WHERE status = 'deleted'
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_photos_timeline
+        ON photos(%s DESC, id DESC) WHERE status = 'active'
+    ''' % _TIMELINE_TIME.format(row=''))
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_photos_camera_model
+        ON photos(camera_model) WHERE camera_model IS NOT NULL
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_photos_gps
+        ON photos(gps_latitude, gps_longitude) WHERE gps_latitude IS NOT NULL
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_job_items_job_id ON job_items(job_id, position)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_job_items_status ON job_items(status, id)')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_imported_files_content_hash
+        ON imported_files(content_hash) WHERE status = 'imported'
+    ''')
     
     # Create triggers for updated_at
     cursor.execute('''
@@ -77,173 +447,1480 @@ def init_db():
         END
     ''')
     
-    conn.commit()
-    conn.close()
-
-def get_album_by_id(album_id):
-    """Get album by ID with photo count"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    # Deletion time for the garbage collector's retention window; restoring clears it
+    for table in ('albums', 'photos'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_deleted_at
+            AFTER UPDATE OF status ON {table}
+            FOR EACH ROW WHEN OLD.status IS NOT NEW.status
+            BEGIN
+                UPDATE {table}
+                SET deleted_at = CASE WHEN NEW.status = 'deleted' THEN CURRENT_TIMESTAMP END
+                WHERE id = NEW.id;
+            END
+        ''')
     
+    # Keep album aggregates in step with every change to an active photo.
+    # The cover is the newest active photo, found via idx_photos_album_listing.
     cursor.execute('''
-        SELECT a.*, 
-               COUNT(p.id) as photo_count
-        FROM albums a
-        LEFT JOIN photos p ON a.id = p.album_id AND p.status = 'active'
-        WHERE a.id = ? AND a.status = 'active'
-        GROUP BY a.id
-    ''', (album_id,))
+        CREATE TRIGGER IF NOT EXISTS photos_aggregate_insert
+        AFTER INSERT ON photos
+        FOR EACH ROW WHEN NEW.status = 'active'
+        BEGIN
+            UPDATE albums
+            SET photo_count = photo_count + 1,
+                total_original_size = total_original_size + NEW.original_size,
+                total_compressed_size = total_compressed_size + NEW.compressed_size,
+                cover_photo_id = (%s)
+            WHERE id = NEW.album_id;
+        END
+    ''' % _LATEST_PHOTO_SQL.format(album='NEW.album_id'))
     
-    album = cursor.fetchone()
-    conn.close()
-    return album
-
-def get_all_albums():
-    """Get all active albums with photo counts"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS photos_aggregate_update
+        AFTER UPDATE OF status, album_id, original_size, compressed_size ON photos
+        FOR EACH ROW WHEN OLD.status = 'active' OR NEW.status = 'active'
+        BEGIN
+            UPDATE albums
+            SET photo_count = photo_count - 1,
+                total_original_size = total_original_size - OLD.original_size,
+                total_compressed_size = total_compressed_size - OLD.compressed_size
+            WHERE id = OLD.album_id AND OLD.status = 'active';
+            
+            UPDATE albums
+            SET photo_count = photo_count + 1,
+                total_original_size = total_original_size + NEW.original_size,
+                total_compressed_size = total_compressed_size + NEW.compressed_size
+            WHERE id = NEW.album_id AND NEW.status = 'active';
+            
+            UPDATE albums
+            SET cover_photo_id = (%s)
+            WHERE id IN (OLD.album_id, NEW.album_id);
+        END
+    ''' % _LATEST_PHOTO_SQL.format(album='albums.id'))
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS photos_aggregate_delete
+        AFTER DELETE ON photos
+        FOR EACH ROW WHEN OLD.status = 'active'
+        BEGIN
+            UPDATE albums
+            SET photo_count = photo_count - 1,
+                total_original_size = total_original_size - OLD.original_size,
+                total_compressed_size = total_compressed_size - OLD.compressed_size,
+                cover_photo_id = (%s)
+            WHERE id = OLD.album_id;
+        END
+    ''' % _LATEST_PHOTO_SQL.format(album='OLD.album_id'))
+    
+    # Albums created before the aggregate columns existed start from zero
+    if any(added):
+        _rebuild_album_aggregates(cursor)
+    
+    # Timeline day counts follow active photos of active albums, including
+    # whole albums being deleted or restored
+    day = 'substr(%s, 1, 10)'
+    counted = "{row}.status = 'active' AND (SELECT status FROM albums WHERE id = {row}.album_id) = 'active'"
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS photos_timeline_insert
+        AFTER INSERT ON photos
+        FOR EACH ROW WHEN %s
+        BEGIN
+            INSERT INTO timeline_days (day, photo_count) VALUES (%s, 1)
+            ON CONFLICT(day) DO UPDATE SET photo_count = photo_count + 1;
+        END
+    ''' % (counted.format(row='NEW'), day % _TIMELINE_TIME.format(row='NEW.')))
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS photos_timeline_update
+        AFTER UPDATE OF status, album_id, taken_at, created_at ON photos
+        FOR EACH ROW
+        BEGIN
+            UPDATE timeline_days
+            SET photo_count = photo_count - 1
+            WHERE day = %s AND %s;
+            
+            INSERT INTO timeline_days (day, photo_count)
+            SELECT %s, 1 WHERE %s
+            ON CONFLICT(day) DO UPDATE SET photo_count = photo_count + 1;
+        END
+    ''' % (day % _TIMELINE_TIME.format(row='OLD.'), counted.format(row='OLD'),
+           day % _TIMELINE_TIME.format(row='NEW.'), counted.format(row='NEW')))
     
     cursor.execute('''
-        SELECT a.*, 
-               COUNT(p.id) as photo_count
-        FROM albums a
-        LEFT JOIN photos p ON a.id = p.album_id AND p.status = 'active'
-        WHERE a.status = 'active'
-        GROUP BY a.id
-        ORDER BY a.created_at DESC
+        CREATE TRIGGER IF NOT EXISTS photos_timeline_delete
+        AFTER DELETE ON photos
+        FOR EACH ROW WHEN %s
+        BEGIN
+            UPDATE timeline_days
+            SET photo_count = photo_count - 1
+            WHERE day = %s;
+        END
+    ''' % (counted.format(row='OLD'), day % _TIMELINE_TIME.format(row='OLD.')))
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS albums_timeline_status
+        AFTER UPDATE OF status ON albums
+        FOR EACH ROW WHEN (OLD.status = 'active') != (NEW.status = 'active')
+        BEGIN
+            INSERT INTO timeline_days (day, photo_count)
+            SELECT %s, CASE WHEN NEW.status = 'active' THEN COUNT(*) ELSE -COUNT(*) END
+            FROM photos
+            WHERE album_id = NEW.id AND status = 'active'
+            GROUP BY 1
+            ON CONFLICT(day) DO UPDATE SET photo_count = photo_count + excluded.photo_count;
+        END
+    ''' % (day % _TIMELINE_TIME.format(row='')))
+    
+    if timeline_created:
+        _rebuild_timeline(cursor)
+    
+    # Search index over active rows; photos of deleted albums stay indexed
+    # and are filtered out at query time, so deleting an album is cheap
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'")
+    search_created = cursor.fetchone() is None
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+            name, description,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3 4'
+        )
     ''')
     
-    albums = cursor.fetchall()
-    conn.close()
-    return albums
-
-def create_album(name, description=None):
-    """Create new album"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS photos_search_insert
+        AFTER INSERT ON photos
+        FOR EACH ROW WHEN NEW.status = 'active'
+        BEGIN
+            INSERT INTO search_index (rowid, name) VALUES (NEW.id, NEW.original_filename);
+        END
+    ''')
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS photos_search_update
+        AFTER UPDATE OF status, original_filename ON photos
+        FOR EACH ROW WHEN OLD.status IS NOT NEW.status OR OLD.original_filename IS NOT NEW.original_filename
+        BEGIN
+            DELETE FROM search_index WHERE rowid = OLD.id;
+            INSERT INTO search_index (rowid, name)
+            SELECT NEW.id, NEW.original_filename WHERE NEW.status = 'active';
+        END
+    ''')
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS photos_search_delete
+        AFTER DELETE ON photos
+        FOR EACH ROW
+        BEGIN
+            DELETE FROM search_index WHERE rowid = OLD.id;
+        END
+    ''')
     
     cursor.execute('''
-        INSERT INTO albums (name, description)
-        VALUES (?, ?)
-    ''', (name, description))
+        CREATE TRIGGER IF NOT EXISTS albums_search_insert
+        AFTER INSERT ON albums
+        FOR EACH ROW WHEN NEW.status = 'active'
+        BEGIN
+            INSERT INTO search_index (rowid, name, description) VALUES (-NEW.id, NEW.name, NEW.description);
+        END
+    ''')
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS albums_search_update
+        AFTER UPDATE OF name, description, status ON albums
+        FOR EACH ROW WHEN OLD.name IS NOT NEW.name OR OLD.description IS NOT NEW.description
+                       OR OLD.status IS NOT NEW.status
+        BEGIN
+            DELETE FROM search_index WHERE rowid = -OLD.id;
+            INSERT INTO search_index (rowid, name, description)
+            SELECT -NEW.id, NEW.name, NEW.description WHERE NEW.status = 'active';
+        END
+    ''')
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS albums_search_delete
+        AFTER DELETE ON albums
+        FOR EACH ROW
+        BEGIN
+            DELETE FROM search_index WHERE rowid = -OLD.id;
+        END
+    ''')
+    
+    if search_created:
+        _rebuild_search_index(cursor)
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS update_job_items_timestamp 
+        AFTER UPDATE ON job_items
+        FOR EACH ROW
+        BEGIN
+            UPDATE job_items SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+            UPDATE jobs SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.job_id;
+        END
+    ''')
     
-    album_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return album_id
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS update_upload_sessions_timestamp 
+        AFTER UPDATE ON upload_sessions
+        FOR EACH ROW
+        BEGIN
+            UPDATE upload_sessions SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+        END
+    ''')
 
-def update_album(album_id, name=None, description=None):
-    """Update album"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def _migrate_job_item_photos(cursor):
+    """Index job items by photo and clear those whose photo was already purged"""
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_job_items_photo_id ON job_items(photo_id)
+        WHERE photo_id IS NOT NULL
+    ''')
+    cursor.execute('''
+        UPDATE job_items SET photo_id = NULL
+        WHERE photo_id IS NOT NULL AND photo_id NOT IN (SELECT id FROM photos)
+    ''')
+
+def _migrate_rendition_claims(cursor):
+    """Track which request is generating each rendition, across processes"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rendition_claims (
+            photo_id INTEGER NOT NULL,
+            size TEXT NOT NULL,
+            token TEXT NOT NULL,
+            claimed_at REAL NOT NULL,
+            PRIMARY KEY (photo_id, size)
+        )
+    ''')
+
+def _migrate_job_item_worker_start(cursor):
+    """Record when the worker process holding a job item started, next to its PID"""
+    _add_column_if_missing(cursor, 'job_items', 'worker_started', 'INTEGER')
+
+# Schema migrations in order; PRAGMA user_version counts those applied.
+# Append new steps here and never change one that has shipped.
+MIGRATIONS = (
+    _migrate_baseline,
+    _migrate_job_item_photos,
+    _migrate_rendition_claims,
+    _migrate_job_item_worker_start,
+)
+
+def get_schema_version(cursor):
+    """Get the number of migrations applied to the database"""
+    cursor.execute('PRAGMA user_version')
+    return cursor.fetchone()[0]
+
+def init_db():
+    """Bring the database schema up to date and return its version
     
-    updates = []
-    params = []
+    Only migrations newer than the stored user_version are run, all in one
+    write transaction, so a database that is already current costs a single
+    pragma read. Processes starting together apply each step once: the
+    version is checked again after taking the write lock.
+    """
+    with db_cursor('init_db') as cursor:
+        version = get_schema_version(cursor)
     
-    if name is not None:
-        updates.append('name = ?')
-        params.append(name)
+    if version > len(MIGRATIONS):
+        raise RuntimeError(f"Database schema version {version} is newer than this code "
+                           f"supports ({len(MIGRATIONS)})")
+    if version == len(MIGRATIONS):
+        return version
     
-    if description is not None:
-        updates.append('description = ?')
-        params.append(description)
+    with db_cursor('init_db', immediate=True) as cursor:
+        version = get_schema_version(cursor)
+        for version, migrate in enumerate(MIGRATIONS[version:], version + 1):
+            migrate(cursor)
+            # PRAGMA does not take bound parameters
+            cursor.execute(f'PRAGMA user_version = {version}')
     
-    if updates:
-        params.append(album_id)
-        cursor.execute(f'''
+    return version
+
+def get_album_by_id(album_id):
+    """Get album by ID with its photo aggregates"""
+    with db_cursor('get_album_by_id') as cursor:
+        cursor.execute('''
+            SELECT * FROM albums
+            WHERE id = ? AND status = 'active'
+        ''', (album_id,))
+        
+        album = cursor.fetchone()
+        return album
+
+def get_album_by_name(name):
+    """Get active album by name"""
+    with db_cursor('get_album_by_name') as cursor:
+        cursor.execute('''
+            SELECT * FROM albums
+            WHERE name = ? AND status = 'active'
+        ''', (name,))
+        
+        album = cursor.fetchone()
+        return album
+
+def get_all_albums():
+    """Get all active albums with their photo aggregates"""
+    with db_cursor('get_all_albums') as cursor:
+        cursor.execute('''
+            SELECT * FROM albums
+            WHERE status = 'active'
+            ORDER BY created_at DESC
+        ''')
+        
+        albums = cursor.fetchall()
+        return albums
+
+def create_album(name, description=None):
+    """Create new album"""
+    with db_cursor('create_album') as cursor:
+        cursor.execute('''
+            INSERT INTO albums (name, description)
+            VALUES (?, ?)
+        ''', (name, description))
+        
+        album_id = cursor.lastrowid
+        return album_id
+
+def update_album(album_id, name=None, description=None):
+    """Update album"""
+    with db_cursor('update_album') as cursor:
+        updates = []
+        params = []
+        
+        if name is not None:
+            updates.append('name = ?')
+            params.append(name)
+        
+        if description is not None:
+            updates.append('description = ?')
+            params.append(description)
+        
+        if updates:
+            params.append(album_id)
+            cursor.execute(f'''
+                UPDATE albums 
+                SET {', '.join(updates)}
+                WHERE id = ? AND status = 'active'
+            ''', params)
+            
+            success = cursor.rowcount > 0
+        else:
+            success = True
+        
+        return success
+
+def delete_album(album_id):
+    """Soft delete album"""
+    with db_cursor('delete_album') as cursor:
+        cursor.execute('''
             UPDATE albums 
-            SET {', '.join(updates)}
+            SET status = 'deleted'
             WHERE id = ? AND status = 'active'
-        ''', params)
+        ''', (album_id,))
         
-        conn.commit()
         success = cursor.rowcount > 0
-    else:
-        success = True
+        return success
+
+def get_photos_by_album(album_id, limit=None, after=None):
+    """Get active photos in album, newest first
+    
+    With limit, returns one page of at most limit photos; after is the
+    (created_at, id) of the last photo of the previous page. Pages are read
+    straight off idx_photos_album_listing, so cost does not grow with the
+    album size or page depth.
+    """
+    query = '''
+        SELECT * FROM photos
+        WHERE album_id = ? AND status = 'active'
+    '''
+    params = [album_id]
     
-    conn.close()
-    return success
+    if after is not None:
+        query += ' AND (created_at, id) < (?, ?)'
+        params.extend(after)
+    
+    query += ' ORDER BY created_at DESC, id DESC'
+    
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit)
+    
+    with db_cursor('get_photos_by_album') as cursor:
+        cursor.execute(query, params)
+        
+        photos = cursor.fetchall()
+        return photos
 
-def delete_album(album_id):
-    """Soft delete album"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def get_timeline_photos(limit, after=None):
+    """Get active photos of active albums by capture time, newest first
     
-    cursor.execute('''
-        UPDATE albums 
-        SET status = 'deleted'
-        WHERE id = ? AND status = 'active'
-    ''', (album_id,))
+    after is the (timeline time, id) of the last photo of the previous page.
+    Pages are read in order off idx_photos_timeline, so cost does not grow
+    with the library size or page depth. The planner prefers idx_photos_status
+    plus a sort here, hence INDEXED BY; the keyset condition is spelled out
+    because SQLite only seeks an expression index on plain comparisons, not
+    on row values.
+    """
+    timeline_time = _TIMELINE_TIME.format(row='')
+    query = f'''
+        SELECT *, {timeline_time} AS timeline_time FROM photos INDEXED BY idx_photos_timeline
+        WHERE status = 'active'
+          AND (SELECT status FROM albums WHERE id = photos.album_id) = 'active'
+    '''
+    params = []
+    
+    if after is not None:
+        query += f' AND {timeline_time} <= ? AND ({timeline_time} < ? OR id < ?)'
+        params.extend((after[0], after[0], after[1]))
+    
+    query += f' ORDER BY {timeline_time} DESC, id DESC LIMIT ?'
+    params.append(limit)
     
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
-    return success
+    with db_cursor('get_timeline_photos') as cursor:
+        cursor.execute(query, params)
+        
+        photos = cursor.fetchall()
+        return photos
 
-def get_photos_by_album(album_id):
-    """Get all active photos in album"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def get_timeline_buckets(granularity):
+    """Count active photos per capture day ('day') or month ('month'), newest first"""
+    length = {'day': 10, 'month': 7}[granularity]
     
-    cursor.execute('''
-        SELECT * FROM photos
-        WHERE album_id = ? AND status = 'active'
-        ORDER BY created_at DESC
-    ''', (album_id,))
+    with db_cursor('get_timeline_buckets') as cursor:
+        cursor.execute('''
+            SELECT substr(day, 1, ?) AS bucket, SUM(photo_count) AS count
+            FROM timeline_days
+            WHERE photo_count > 0
+            GROUP BY bucket
+            ORDER BY bucket DESC
+        ''', (length,))
+        
+        buckets = cursor.fetchall()
+        return buckets
+
+def _match_query(text):
+    """Turn free text into an FTS5 query ANDing a prefix match of every word
     
-    photos = cursor.fetchall()
-    conn.close()
-    return photos
+    Words are quoted, so FTS5 operators and punctuation in the input are
+    matched literally. Raises ValueError if the text has no words.
+    """
+    words = re.findall(r'[^\W_]+', text)[:Config.MAX_SEARCH_TERMS]
+    if not words:
+        raise ValueError("Search query must contain letters or digits")
+    return ' '.join(f'"{word}"*' for word in words)
 
-def create_photo(album_id, filename, original_filename, file_format, 
-                original_path, compressed_path, original_size, compressed_size,
-                width=None, height=None):
-    """Create photo record"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+# Album and photo columns of a search result, after score, item and kind
+_SEARCH_COLUMNS = '''
+    a.id AS album_id, a.name AS album_name, a.description AS album_description,
+    a.photo_count AS album_photo_count, a.cover_photo_id AS album_cover_photo_id,
+    p.*
+'''
+
+def search(text, limit, after=None):
+    """Full-text search active albums and photos, best bm25 match first
     
+    Returns rows with the match's score, item (its index rowid) and kind
+    ('album' or 'photo'), the album's id, name, description, photo_count
+    and cover_photo_id as album_*, then the photo columns (NULL for
+    albums). after is the (score, item) of the last match of the previous
+    page.
+    
+    bm25 scores every row it is asked about, so when more photos match
+    than SEARCH_RANK_WINDOW only the newest SEARCH_RANK_WINDOW of them are
+    ranked (found by rowid order, which FTS5 reads without scoring); albums
+    are always ranked. The older photo matches follow the ranked ones,
+    newest first, with a NULL score. Scores move as the index changes, so
+    pages taken across writes may overlap slightly.
+    """
+    query = _match_query(text)
+    bm25 = 'bm25(search_index, %s)' % ', '.join(str(weight) for weight in _SEARCH_WEIGHTS)
+    
+    with db_cursor('search') as cursor:
+        # Lowest photo rowid still ranked
+        cursor.execute('''
+            SELECT rowid FROM search_index
+            WHERE search_index MATCH ? AND rowid > 0
+            ORDER BY rowid DESC LIMIT 1 OFFSET ?
+        ''', (query, Config.SEARCH_RANK_WINDOW - 1))
+        row = cursor.fetchone()
+        floor = row['rowid'] if row else 1
+        
+        results = []
+        if after is None or after[0] is not None:
+            sql = f'''
+                WITH matches AS (
+                    SELECT rowid AS item, {bm25} AS score FROM search_index
+                    WHERE search_index MATCH :query AND rowid >= :floor
+                    UNION ALL
+                    SELECT rowid, {bm25} FROM search_index
+                    WHERE search_index MATCH :query AND rowid < 0
+                )
+                SELECT m.score, m.item, CASE WHEN m.item < 0 THEN 'album' ELSE 'photo' END AS kind,
+                       {_SEARCH_COLUMNS}
+                FROM matches m
+                LEFT JOIN photos p ON m.item > 0 AND p.id = m.item
+                JOIN albums a ON a.id = CASE WHEN m.item < 0 THEN -m.item ELSE p.album_id END
+                WHERE a.status = 'active' AND (m.item < 0 OR p.status = 'active')
+            '''
+            params = {'query': query, 'floor': floor, 'limit': limit}
+            
+            if after is not None:
+                sql += ' AND (m.score, m.item) > (:score, :item)'
+                params.update(score=after[0], item=after[1])
+            
+            sql += ' ORDER BY m.score, m.item LIMIT :limit'
+            cursor.execute(sql, params)
+            results = cursor.fetchall()
+        
+        # Fill the page with unranked matches, read in rowid order
+        below = floor if after is None or after[0] is not None else min(after[1], floor)
+        if len(results) < limit and below > 1:
+            cursor.execute(f'''
+                SELECT NULL AS score, search_index.rowid AS item, 'photo' AS kind,
+                       {_SEARCH_COLUMNS}
+                FROM search_index
+                JOIN photos p ON p.id = search_index.rowid
+                JOIN albums a ON a.id = p.album_id
+                WHERE search_index MATCH :query AND search_index.rowid > 0
+                  AND search_index.rowid < :below
+                  AND p.status = 'active' AND a.status = 'active'
+                ORDER BY search_index.rowid DESC LIMIT :limit
+            ''', {'query': query, 'below': below, 'limit': limit - len(results)})
+            results += cursor.fetchall()
+        
+        return results
+
+def _photo_params(photo):
+    """Build the photos INSERT parameters for a photo dict"""
+    original_size = photo['original_size']
+    compressed_size = photo['compressed_size']
     compression_ratio = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
     
-    cursor.execute('''
+    return (photo['album_id'], photo['filename'], photo['original_filename'], photo['file_format'],
+            photo['original_path'], photo['compressed_path'], original_size, compressed_size,
+            photo.get('width'), photo.get('height'), compression_ratio,
+            photo.get('content_hash'), photo.get('phash'),
+            *(photo.get(column) for column, _ in _METADATA_COLUMNS))
+
+def _insert_photos(cursor, photos):
+    """Insert photo rows using an open cursor and return their IDs in order
+    
+    The cursor must hold the write lock (BEGIN IMMEDIATE): new IDs are read
+    back as everything above the previous maximum, which only holds while no
+    other connection can insert. Photos with a content hash also take a
+    reference on the matching blob, and take its current file paths in case
+    migrate_storage.py moved the files since the caller read them. Album
+    counts, totals and covers are updated by the photos triggers in the same
+    transaction.
+    """
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM photos')
+    last_id = cursor.fetchone()[0]
+    
+    cursor.executemany('''
         INSERT INTO photos (album_id, filename, original_filename, file_format,
                           original_path, compressed_path, original_size, compressed_size,
-                          width, height, compression_ratio)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (album_id, filename, original_filename, file_format,
-          original_path, compressed_path, original_size, compressed_size,
-          width, height, compression_ratio))
+                          width, height, compression_ratio, content_hash, phash,
+                          taken_at, camera_model, orientation, gps_latitude, gps_longitude)
+        VALUES (?1, ?2, ?3, ?4,
+                COALESCE((SELECT original_path FROM blobs WHERE content_hash = ?12), ?5),
+                COALESCE((SELECT compressed_path FROM blobs WHERE content_hash = ?12), ?6),
+                ?7, ?8, ?9, ?10, ?11, ?12, ?13, ?14, ?15, ?16, ?17, ?18)
+    ''', [_photo_params(photo) for photo in photos])
     
-    photo_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return photo_id
+    cursor.executemany('''
+        INSERT INTO blobs (content_hash, file_format, original_path, compressed_path,
+                           original_size, compressed_size, width, height, phash,
+                           taken_at, camera_model, orientation, gps_latitude, gps_longitude, ref_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+        ON CONFLICT(content_hash) DO UPDATE SET ref_count = ref_count + 1
+    ''', [(photo['content_hash'], photo['file_format'], photo['original_path'],
+           photo['compressed_path'], photo['original_size'], photo['compressed_size'],
+           photo.get('width'), photo.get('height'), photo.get('phash'),
+           *(photo.get(column) for column, _ in _METADATA_COLUMNS))
+          for photo in photos if photo.get('content_hash')])
+    
+    cursor.execute('SELECT id FROM photos WHERE id > ? ORDER BY id', (last_id,))
+    photo_ids = [row['id'] for row in cursor.fetchall()]
+    return photo_ids
+
+def create_photo(album_id, filename, original_filename, file_format, 
+                original_path, compressed_path, original_size, compressed_size,
+                width=None, height=None, content_hash=None, phash=None, **metadata):
+    """Create photo record; metadata holds optional EXIF fields (taken_at, camera_model, ...)"""
+    photo = dict(metadata, album_id=album_id, filename=filename, original_filename=original_filename,
+                 file_format=file_format, original_path=original_path,
+                 compressed_path=compressed_path, original_size=original_size,
+                 compressed_size=compressed_size, width=width, height=height,
+                 content_hash=content_hash, phash=phash)
+    
+    with db_cursor('create_photo', immediate=True) as cursor:
+        photo_id = _insert_photos(cursor, [photo])[0]
+        return photo_id
+
+def create_photos(photos):
+    """Create photo records in bounded batches
+    
+    photos are dicts with the create_photo arguments. Each batch of
+    DB_INSERT_BATCH_SIZE rows is inserted in a single transaction, together
+    with its blob references and album cover update. If a batch fails, its
+    rows are retried one per transaction so only the offending rows fail.
+    Returns one (photo_id, error) pair per photo, in order; photo_id is None
+    when the row failed.
+    """
+    results = []
+    
+    for batch in _chunks(photos, Config.DB_INSERT_BATCH_SIZE):
+        try:
+            with db_cursor('create_photos', immediate=True) as cursor:
+                photo_ids = _insert_photos(cursor, batch)
+            results.extend((photo_id, None) for photo_id in photo_ids)
+            continue
+        except sqlite3.Error:
+            pass
+        
+        for photo in batch:
+            try:
+                with db_cursor('create_photos', immediate=True) as cursor:
+                    photo_id = _insert_photos(cursor, [photo])[0]
+                results.append((photo_id, None))
+            except sqlite3.Error as e:
+                results.append((None, str(e)))
+    
+    return results
 
 def delete_photo(photo_id):
     """Soft delete photo"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_cursor('delete_photo') as cursor:
+        cursor.execute('''
+            UPDATE photos 
+            SET status = 'deleted'
+            WHERE id = ? AND status = 'active'
+        ''', (photo_id,))
+        
+        success = cursor.rowcount > 0
+        return success
+
+# Photo status each bulk action selects by filter
+_BULK_FILTER_STATUS = {'delete': 'active', 'move': 'active', 'restore': 'deleted'}
+
+def _bulk_outcome(action, photo, target_album_id):
+    """Decide what a bulk action does to one photo row (None if it does not exist)"""
+    if photo is None:
+        return 'not_found'
+    if action == 'delete':
+        return 'deleted' if photo['status'] == 'active' else 'unchanged'
+    if action == 'restore':
+        if photo['status'] == 'active':
+            return 'unchanged'
+        return 'restored' if photo['album_status'] == 'active' else 'album_not_found'
+    if photo['status'] != 'active':
+        return 'not_found'
+    return 'unchanged' if photo['album_id'] == target_album_id else 'moved'
+
+def _filter_photo_ids(cursor, action, photo_filter, limit):
+    """Get up to limit IDs of the album's photos a bulk action applies to, in ID order
     
-    cursor.execute('''
-        UPDATE photos 
-        SET status = 'deleted'
-        WHERE id = ? AND status = 'active'
-    ''', (photo_id,))
+    photo_filter holds album_id and optionally taken_from and taken_to
+    (inclusive YYYY-MM-DD days on the timeline) and file_format.
+    """
+    query = 'SELECT id FROM photos WHERE album_id = ? AND status = ?'
+    params = [photo_filter['album_id'], _BULK_FILTER_STATUS[action]]
+    
+    if photo_filter.get('taken_from'):
+        query += f" AND substr({_TIMELINE_TIME.format(row='')}, 1, 10) >= ?"
+        params.append(photo_filter['taken_from'])
+    if photo_filter.get('taken_to'):
+        query += f" AND substr({_TIMELINE_TIME.format(row='')}, 1, 10) <= ?"
+        params.append(photo_filter['taken_to'])
+    if photo_filter.get('file_format'):
+        query += ' AND file_format = ?'
+        params.append(photo_filter['file_format'].upper())
+    
+    query += ' ORDER BY id LIMIT ?'
+    params.append(limit)
+    
+    cursor.execute(query, params)
+    return [row['id'] for row in cursor.fetchall()]
+
+def bulk_update_photos(action, photo_ids=None, photo_filter=None, target_album_id=None, limit=None):
+    """Delete, restore or move (to target_album_id) many photos in one transaction
     
-    success = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
-    return success
+    Photos are given as photo_ids or selected by photo_filter (see
+    _filter_photo_ids), at most limit of them. Each chunk of IDs is read
+    once and changed with a single UPDATE; the photos triggers keep album
+    aggregates and covers, the timeline and the search index in step.
+    Deleting also drops the photos' renditions, as deleting one photo does.
+    
+    Returns a dict with (photo_id, outcome) pairs in request order, the
+    album_ids whose photos changed, the rendition_paths whose files the
+    caller removes, and has_more when the filter matched more than limit.
+    """
+    limit = limit or Config.BULK_MAX_PHOTOS
+    outcomes = []
+    album_ids = set()
+    rendition_paths = []
+    has_more = False
+    
+    with db_cursor('bulk_update_photos', immediate=True) as cursor:
+        if photo_filter is not None:
+            photo_ids = _filter_photo_ids(cursor, action, photo_filter, limit + 1)
+            has_more = len(photo_ids) > limit
+            photo_ids = photo_ids[:limit]
+        
+        for chunk in _chunks(list(dict.fromkeys(photo_ids))):
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'''
+                SELECT p.id, p.album_id, p.status, a.status AS album_status
+                FROM photos p JOIN albums a ON a.id = p.album_id
+                WHERE p.id IN ({placeholders})
+            ''', chunk)
+            photos = {photo['id']: photo for photo in cursor.fetchall()}
+            
+            changed = []
+            for photo_id in chunk:
+                outcome = _bulk_outcome(action, photos.get(photo_id), target_album_id)
+                outcomes.append((photo_id, outcome))
+                if outcome in ('deleted', 'restored', 'moved'):
+                    changed.append(photo_id)
+                    album_ids.add(photos[photo_id]['album_id'])
+            
+            if not changed:
+                continue
+            
+            placeholders = ', '.join('?' * len(changed))
+            if action == 'move':
+                cursor.execute(f'UPDATE photos SET album_id = ? WHERE id IN ({placeholders})',
+                               [target_album_id] + changed)
+                album_ids.add(target_album_id)
+            else:
+                status = 'deleted' if action == 'delete' else 'active'
+                cursor.execute(f'UPDATE photos SET status = ? WHERE id IN ({placeholders})',
+                               [status] + changed)
+            
+            if action == 'delete':
+                cursor.execute(f'DELETE FROM renditions WHERE photo_id IN ({placeholders}) RETURNING path',
+                               changed)
+                rendition_paths.extend(row['path'] for row in cursor.fetchall())
+    
+    return {
+        'outcomes': outcomes,
+        'album_ids': album_ids,
+        'rendition_paths': rendition_paths,
+        'has_more': has_more
+    }
 
 def get_photo_by_id(photo_id):
     """Get photo by ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_cursor('get_photo_by_id') as cursor:
+        cursor.execute('''
+            SELECT * FROM photos
+            WHERE id = ? AND status = 'active'
+        ''', (photo_id,))
+        
+        photo = cursor.fetchone()
+        return photo
+
+def get_photo_for_view(photo_id, size, variant_keys=(), width=0):
+    """Get photo by ID together with the path of its rendition at size, if any
     
-    cursor.execute('''
-        SELECT * FROM photos
-        WHERE id = ? AND status = 'active'
-    ''', (photo_id,))
+    One lookup on the photos primary key and the renditions (photo_id, size)
+    unique index; rendition_path is NULL until the rendition is generated.
+    variant_keys adds one (sized_key, full_key) pair per modern format: a
+    photo wider than width is matched with the variant at sized_key, a
+    narrower one (served from its compressed file) with the one at full_key.
+    Variant i is returned as variant_<i>_path, _size, _format, _file_size and
+    _legacy_size, all NULL until it is generated.
+    """
+    columns = ''.join(f""", v{i}.path AS variant_{i}_path, v{i}.size AS variant_{i}_size,
+                   v{i}.format AS variant_{i}_format, v{i}.file_size AS variant_{i}_file_size,
+                   v{i}.legacy_size AS variant_{i}_legacy_size""" for i in range(len(variant_keys)))
+    joins = ''.join(f"""
+            LEFT JOIN renditions v{i} ON v{i}.photo_id = p.id
+                AND v{i}.size = CASE WHEN p.width > ? THEN ? ELSE ? END""" for i in range(len(variant_keys)))
+    params = [size]
+    for sized_key, full_key in variant_keys:
+        params.extend((width, sized_key, full_key))
     
-    photo = cursor.fetchone()
-    conn.close()
-    return photo
+    with db_cursor('get_photo_for_view') as cursor:
+        cursor.execute(f'''
+            SELECT p.*, r.path AS rendition_path{columns}
+            FROM photos p
+            LEFT JOIN renditions r ON r.photo_id = p.id AND r.size = ?{joins}
+            WHERE p.id = ? AND p.status = 'active'
+        ''', params + [photo_id])
+        
+        photo = cursor.fetchone()
+        return photo
+
+def get_photo_hashes(album_id):
+    """Get (id, phash) of active photos in album that have a perceptual hash"""
+    with db_cursor('get_photo_hashes') as cursor:
+        cursor.execute('''
+            SELECT id, phash FROM photos
+            WHERE album_id = ? AND status = 'active' AND phash IS NOT NULL
+        ''', (album_id,))
+        
+        rows = cursor.fetchall()
+        return rows
+
+def get_photos_by_ids(photo_ids):
+    """Get active photos by ID"""
+    photo_ids = list(photo_ids)
+    if not photo_ids:
+        return []
+    
+    with db_cursor('get_photos_by_ids') as cursor:
+        photos = []
+        for chunk in _chunks(photo_ids):
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'''
+                SELECT * FROM photos
+                WHERE id IN ({placeholders}) AND status = 'active'
+            ''', chunk)
+            photos.extend(cursor.fetchall())
+        
+        return photos
+
+def get_blobs(content_hashes):
+    """Get stored blobs keyed by content hash"""
+    content_hashes = list(content_hashes)
+    if not content_hashes:
+        return {}
+    
+    with db_cursor('get_blobs') as cursor:
+        blobs = {}
+        for chunk in _chunks(content_hashes):
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'''
+                SELECT * FROM blobs
+                WHERE content_hash IN ({placeholders})
+            ''', chunk)
+            blobs.update((blob['content_hash'], blob) for blob in cursor.fetchall())
+        
+        return blobs
+
+def _release_blobs(cursor, content_hashes):
+    """Drop one blob reference per content hash (repeats count) using an open cursor
+    
+    Deletes blobs left without references and returns their rows, so the
+    caller can remove their files once the transaction has committed.
+    """
+    counts = Counter(content_hash for content_hash in content_hashes if content_hash)
+    cursor.executemany('''
+        UPDATE blobs
+        SET ref_count = ref_count - ?
+        WHERE content_hash = ?
+    ''', [(count, content_hash) for content_hash, count in counts.items()])
+    
+    released = []
+    for chunk in _chunks(list(counts)):
+        placeholders = ', '.join('?' * len(chunk))
+        cursor.execute(f'''
+            DELETE FROM blobs
+            WHERE content_hash IN ({placeholders}) AND ref_count <= 0
+            RETURNING *
+        ''', chunk)
+        released.extend(cursor.fetchall())
+    
+    return released
+
+def release_blob(content_hash):
+    """Drop one reference to a blob once a photo row is removed for good
+    
+    Returns the blob row when this was the last reference, so the caller
+    can remove its files, otherwise None.
+    """
+    with db_cursor('release_blob') as cursor:
+        released = _release_blobs(cursor, [content_hash])
+        return released[0] if released else None
+
+def get_renditions(photo_id):
+    """Get all renditions of a photo"""
+    with db_cursor('get_renditions') as cursor:
+        cursor.execute('''
+            SELECT * FROM renditions
+            WHERE photo_id = ?
+            ORDER BY width
+        ''', (photo_id,))
+        
+        renditions = cursor.fetchall()
+        return renditions
+
+def create_rendition(photo_id, size, path, width, height, file_size, file_format=None, legacy_size=None):
+    """Record a generated rendition"""
+    with db_cursor('create_rendition') as cursor:
+        cursor.execute('''
+            INSERT OR REPLACE INTO renditions
+                (photo_id, size, path, width, height, file_size, format, legacy_size)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (photo_id, size, path, width, height, file_size, file_format, legacy_size))
+        
+        rendition_id = cursor.lastrowid
+        return rendition_id
+
+def claim_rendition(photo_id, size, token, timeout):
+    """Claim generating the renditions of a photo at size, unless another request holds it
+    
+    A claim older than timeout seconds is taken over: its holder is assumed
+    to have died. Returns True if token now holds the claim.
+    """
+    now = time.time()
+    with db_cursor('claim_rendition', immediate=True) as cursor:
+        cursor.execute('''
+            DELETE FROM rendition_claims
+            WHERE photo_id = ? AND size = ? AND claimed_at < ?
+        ''', (photo_id, size, now - timeout))
+        cursor.execute('''
+            INSERT OR IGNORE INTO rendition_claims (photo_id, size, token, claimed_at)
+            VALUES (?, ?, ?, ?)
+        ''', (photo_id, size, token, now))
+        
+        success = cursor.rowcount > 0
+        return success
+
+def release_rendition(photo_id, size, token):
+    """Drop a claim taken by claim_rendition, if token still holds it"""
+    with db_cursor('release_rendition') as cursor:
+        cursor.execute('''
+            DELETE FROM rendition_claims
+            WHERE photo_id = ? AND size = ? AND token = ?
+        ''', (photo_id, size, token))
+
+def get_format_savings():
+    """Get per-format totals of WebP/AVIF variants against the JPEG/PNG files they replace"""
+    with db_cursor('get_format_savings') as cursor:
+        cursor.execute('''
+            SELECT format,
+                   COUNT(*) AS variants,
+                   SUM(legacy_size) AS legacy_bytes,
+                   SUM(file_size) AS bytes,
+                   SUM(MIN(file_size, legacy_size)) AS served_bytes
+            FROM renditions
+            WHERE format IS NOT NULL
+            GROUP BY format
+            ORDER BY format
+        ''')
+        
+        savings = cursor.fetchall()
+        return savings
+
+def delete_renditions(photo_id):
+    """Delete all rendition rows of a photo and return their file paths"""
+    with db_cursor('delete_renditions') as cursor:
+        cursor.execute('''
+            SELECT path FROM renditions
+            WHERE photo_id = ?
+        ''', (photo_id,))
+        paths = [row['path'] for row in cursor.fetchall()]
+        
+        cursor.execute('''
+            DELETE FROM renditions
+            WHERE photo_id = ?
+        ''', (photo_id,))
+        
+        return paths
+
+def create_job(album_id, entries):
+    """Create upload job with one item per (filename, entry) pair
+    
+    Entries that are error messages are recorded as failed items so the job
+    reports every file that was part of the request.
+    """
+    with db_cursor('create_job') as cursor:
+        cursor.execute('''
+            INSERT INTO jobs (album_id, total)
+            VALUES (?, ?)
+        ''', (album_id, len(entries)))
+        job_id = cursor.lastrowid
+        
+        items = []
+        for position, (filename, entry) in enumerate(entries):
+            if isinstance(entry, dict):
+                items.append((job_id, position, filename, entry['content_hash'],
+                              entry['compressed_filename'], entry['file_format'],
+                              entry['original_path'], entry['compressed_path'],
+                              entry['original_size'], 'pending', None))
+            else:
+                items.append((job_id, position, filename, None, None, None, None, None, None, 'failed', entry))
+        
+        cursor.executemany('''
+            INSERT INTO job_items (job_id, position, original_filename, content_hash, filename,
+                                   file_format, original_path, compressed_path, original_size,
+                                   status, error)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', items)
+        
+        return job_id
+
+def get_job_by_id(job_id):
+    """Get upload job with per-status item counts"""
+    with db_cursor('get_job_by_id') as cursor:
+        cursor.execute('''
+            SELECT j.*,
+                   COALESCE(SUM(i.status = 'pending'), 0) as pending,
+                   COALESCE(SUM(i.status = 'processing'), 0) as processing,
+                   COALESCE(SUM(i.status = 'completed'), 0) as completed,
+                   COALESCE(SUM(i.status = 'failed'), 0) as failed
+            FROM jobs j
+            LEFT JOIN job_items i ON j.id = i.job_id
+            WHERE j.id = ?
+            GROUP BY j.id
+        ''', (job_id,))
+        
+        job = cursor.fetchone()
+        return job
+
+def get_job_items(job_id):
+    """Get job items in upload order"""
+    with db_cursor('get_job_items') as cursor:
+        cursor.execute('''
+            SELECT i.*, p.compressed_size, p.width, p.height, p.compression_ratio
+            FROM job_items i
+            LEFT JOIN photos p ON i.photo_id = p.id
+            WHERE i.job_id = ?
+            ORDER BY i.position
+        ''', (job_id,))
+        
+        items = cursor.fetchall()
+        return items
+
+def has_pending_job_items():
+    """Check whether any job item is waiting for a worker, without taking the write lock"""
+    with db_cursor('has_pending_job_items') as cursor:
+        cursor.execute("SELECT 1 FROM job_items WHERE status = 'pending' LIMIT 1")
+        
+        return cursor.fetchone() is not None
+
+def claim_next_job_item(worker_pid, worker_started):
+    """Atomically mark the oldest pending job item as processing and return it
+    
+    worker_started is the claiming process's start time (None where it is
+    unknown); with worker_pid it identifies the process even if the PID is
+    later reused.
+    """
+    # Take the write lock before reading so two workers never claim the same item
+    with db_cursor('claim_next_job_item', immediate=True) as cursor:
+        cursor.execute('''
+            SELECT i.*, j.album_id
+            FROM job_items i
+            JOIN jobs j ON i.job_id = j.id
+            WHERE i.status = 'pending'
+            ORDER BY i.id
+            LIMIT 1
+        ''')
+        item = cursor.fetchone()
+        
+        if item:
+            cursor.execute('''
+                UPDATE job_items
+                SET status = 'processing', worker_pid = ?, worker_started = ?
+                WHERE id = ?
+            ''', (worker_pid, worker_started, item['id']))
+        
+        return item
+
+def complete_job_item(item, result):
+    """Create the photo for a job item and mark the item completed in one transaction
+    
+    result holds the compress_image fields (compressed_size, width, height, phash).
+    """
+    photo = dict(result, album_id=item['album_id'], filename=item['filename'],
+                 original_filename=item['original_filename'], file_format=item['file_format'],
+                 original_path=item['original_path'], compressed_path=item['compressed_path'],
+                 original_size=item['original_size'], content_hash=item['content_hash'])
+    
+    with db_cursor('complete_job_item', immediate=True) as cursor:
+        photo_id = _insert_photos(cursor, [photo])[0]
+        
+        cursor.execute('''
+            UPDATE job_items
+            SET status = 'completed', photo_id = ?
+            WHERE id = ? AND status = 'processing'
+        ''', (photo_id, item['id']))
+        
+        return photo_id
+
+def fail_job_item(item_id, error):
+    """Mark job item as failed"""
+    with db_cursor('fail_job_item') as cursor:
+        cursor.execute('''
+            UPDATE job_items
+            SET status = 'failed', error = ?
+            WHERE id = ? AND status = 'processing'
+        ''', (error, item_id))
+
+def get_processing_job_items():
+    """Get job items currently claimed by a worker"""
+    with db_cursor('get_processing_job_items') as cursor:
+        cursor.execute('''
+            SELECT id, worker_pid, worker_started FROM job_items
+            WHERE status = 'processing'
+        ''')
+        
+        items = cursor.fetchall()
+        return items
+
+def requeue_job_items(item_ids):
+    """Return interrupted job items to the pending state"""
+    with db_cursor('requeue_job_items') as cursor:
+        cursor.executemany('''
+            UPDATE job_items
+            SET status = 'pending', worker_pid = NULL, worker_started = NULL
+            WHERE id = ? AND status = 'processing'
+        ''', [(item_id,) for item_id in item_ids])
+
+def create_upload_session(session_id, album_id, original_filename, file_format,
+                          partial_path, total_size):
+    """Create chunked upload session"""
+    with db_cursor('create_upload_session') as cursor:
+        cursor.execute('''
+            INSERT INTO upload_sessions (id, album_id, original_filename, file_format,
+                                         partial_path, total_size)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (session_id, album_id, original_filename, file_format,
+              partial_path, total_size))
+        
+        return session_id
+
+def get_upload_session(session_id):
+    """Get chunked upload session by ID"""
+    with db_cursor('get_upload_session') as cursor:
+        cursor.execute('''
+            SELECT * FROM upload_sessions
+            WHERE id = ?
+        ''', (session_id,))
+        
+        session = cursor.fetchone()
+        return session
+
+def append_upload_chunk(session_id, start, write):
+    """Call write() and advance the received byte count by what it wrote, if still at start
+    
+    The write lock is held while write runs, so of two requests for the same
+    offset only the first writes; the second finds the offset moved. Returns
+    the new received byte count, or None if the session is no longer
+    uploading at start.
+    """
+    with db_cursor('append_upload_chunk', immediate=True) as cursor:
+        cursor.execute('''
+            SELECT received_size FROM upload_sessions
+            WHERE id = ? AND status = 'uploading'
+        ''', (session_id,))
+        
+        session = cursor.fetchone()
+        if session is None or session['received_size'] != start:
+            return None
+        
+        received_size = start + write()
+        cursor.execute('''
+            UPDATE upload_sessions
+            SET received_size = ?
+            WHERE id = ?
+        ''', (received_size, session_id))
+        
+        return received_size
+
+def complete_upload_session(session_id):
+    """Mark chunked upload session as completed"""
+    with db_cursor('complete_upload_session') as cursor:
+        cursor.execute('''
+            UPDATE upload_sessions
+            SET status = 'completed'
+            WHERE id = ? AND status = 'uploading' AND received_size = total_size
+        ''', (session_id,))
+        
+        success = cursor.rowcount > 0
+        return success
+
+def get_imported_files(source_paths):
+    """Get bulk import records keyed by source path"""
+    source_paths = list(source_paths)
+    if not source_paths:
+        return {}
+    
+    with db_cursor('get_imported_files') as cursor:
+        records = {}
+        for chunk in _chunks(source_paths):
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'''
+                SELECT * FROM imported_files
+                WHERE source_path IN ({placeholders})
+            ''', chunk)
+            records.update((record['source_path'], record) for record in cursor.fetchall())
+        
+        return records
+
+def get_imported_hashes(content_hashes):
+    """Get the photo ID of each content hash the bulk importer has already imported"""
+    content_hashes = list(content_hashes)
+    if not content_hashes:
+        return {}
+    
+    with db_cursor('get_imported_hashes') as cursor:
+        imported = {}
+        for chunk in _chunks(content_hashes):
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'''
+                SELECT content_hash, photo_id FROM imported_files
+                WHERE content_hash IN ({placeholders}) AND status = 'imported'
+            ''', chunk)
+            imported.update((row['content_hash'], row['photo_id']) for row in cursor.fetchall())
+        
+        return imported
+
+def record_imported_files(records):
+    """Record the outcome of a batch of imported files in one transaction
+    
+    Each record is a dict with source_path, file_size, mtime_ns,
+    content_hash, album_id, photo_id, status and error.
+    """
+    with db_cursor('record_imported_files') as cursor:
+        cursor.executemany('''
+            INSERT OR REPLACE INTO imported_files
+                (source_path, file_size, mtime_ns, content_hash, album_id, photo_id, status, error)
+            VALUES (:source_path, :file_size, :mtime_ns, :content_hash, :album_id, :photo_id, :status, :error)
+        ''', records)
+
+def get_blob_paths(after, limit):
+    """Get a page of blob file paths in content hash order, starting after a content hash"""
+    with db_cursor('get_blob_paths') as cursor:
+        cursor.execute('''
+            SELECT content_hash, original_path, compressed_path FROM blobs
+            WHERE content_hash > ?
+            ORDER BY content_hash LIMIT ?
+        ''', (after, limit))
+        
+        blobs = cursor.fetchall()
+        return blobs
+
+def get_unhashed_photo_paths(after, limit):
+    """Get a page of file paths of photos stored before content hashing, in ID order"""
+    with db_cursor('get_unhashed_photo_paths') as cursor:
+        cursor.execute('''
+            SELECT id, original_path, compressed_path FROM photos
+            WHERE content_hash IS NULL AND id > ?
+            ORDER BY id LIMIT ?
+        ''', (after, limit))
+        
+        photos = cursor.fetchall()
+        return photos
+
+def relocate_files(blob_moves, photo_moves, old_paths):
+    """Point blobs and photos at moved files in one transaction
+    
+    blob_moves holds (content_hash, original_path, compressed_path) and
+    updates the blob and every photo sharing it; photo_moves holds
+    (photo_id, original_path, compressed_path) for photos without a content
+    hash. old_paths are recorded in stale_files for removal; new paths are
+    taken off it, in case a layout change moved files back to an old name.
+    """
+    new_paths = [(path,) for _, original_path, compressed_path in blob_moves + photo_moves
+                 for path in (original_path, compressed_path)]
+    
+    with db_cursor('relocate_files', immediate=True) as cursor:
+        cursor.executemany('''
+            UPDATE blobs SET original_path = ?2, compressed_path = ?3
+            WHERE content_hash = ?1
+        ''', blob_moves)
+        cursor.executemany('''
+            UPDATE photos SET original_path = ?2, compressed_path = ?3
+            WHERE content_hash = ?1
+        ''', blob_moves)
+        cursor.executemany('''
+            UPDATE photos SET original_path = ?2, compressed_path = ?3
+            WHERE id = ?1
+        ''', photo_moves)
+        cursor.executemany('INSERT OR IGNORE INTO stale_files (path) VALUES (?)',
+                           [(path,) for path in old_paths])
+        cursor.executemany('DELETE FROM stale_files WHERE path = ?', new_paths)
+
+def get_stale_files():
+    """Get old names of moved files that have not been removed yet"""
+    with db_cursor('get_stale_files') as cursor:
+        cursor.execute('SELECT path FROM stale_files')
+        
+        paths = [row['path'] for row in cursor.fetchall()]
+        return paths
+
+def clear_stale_files(paths):
+    """Forget old names of moved files once they are removed"""
+    with db_cursor('clear_stale_files') as cursor:
+        cursor.executemany('DELETE FROM stale_files WHERE path = ?', [(path,) for path in paths])
+
+# Soft-deleted rows older than this many seconds are due for collection
+_EXPIRED = "deleted_at <= datetime('now', '-' || :retention || ' seconds')"
+
+def purge_deleted_photos(retention, limit):
+    """Hard-delete up to limit photos deleted, or in albums deleted, over retention seconds ago
+    
+    Runs as one short write transaction. Expired photos are read off
+    idx_photos_deleted_at (the planner otherwise scans every deleted photo
+    through idx_photos_status). Returns a dict with the purged
+    photo_ids, the rendition_paths and the rows of blobs left without
+    references, and the files of purged photos stored before content
+    hashing that no other photo uses; the caller removes the files.
+    """
+    params = {'retention': retention, 'limit': limit}
+    
+    with db_cursor('purge_deleted_photos', immediate=True) as cursor:
+        cursor.execute(f'''
+            SELECT id, content_hash, original_path, compressed_path FROM photos
+            WHERE id IN (
+                SELECT id FROM photos INDEXED BY idx_photos_deleted_at
+                WHERE status = 'deleted' AND {_EXPIRED}
+                UNION ALL
+                SELECT photos.id FROM albums JOIN photos ON photos.album_id = albums.id
+                WHERE albums.status = 'deleted' AND albums.{_EXPIRED}
+                LIMIT :limit
+            )
+        ''', params)
+        photos = cursor.fetchall()
+        photo_ids = [photo['id'] for photo in photos]
+        
+        rendition_paths = []
+        for chunk in _chunks(photo_ids):
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'DELETE FROM renditions WHERE photo_id IN ({placeholders}) RETURNING path', chunk)
+            rendition_paths.extend(row['path'] for row in cursor.fetchall())
+            cursor.execute(f'DELETE FROM photos WHERE id IN ({placeholders})', chunk)
+            # Upload jobs keep reporting the file, just without its photo
+            cursor.execute(f'UPDATE job_items SET photo_id = NULL WHERE photo_id IN ({placeholders})', chunk)
+        
+        blobs = _release_blobs(cursor, [photo['content_hash'] for photo in photos])
+        
+        # Photos stored before content hashing own their files, unless a
+        # name clash left another photo pointing at the same ones
+        files = []
+        for photo in photos:
+            if photo['content_hash'] is None:
+                cursor.execute('''
+                    SELECT 1 FROM photos
+                    WHERE content_hash IS NULL AND (original_path = ? OR compressed_path = ?)
+                ''', (photo['original_path'], photo['compressed_path']))
+                if cursor.fetchone() is None:
+                    files.append((photo['original_path'], photo['compressed_path']))
+        
+        return {
+            'photo_ids': photo_ids,
+            'rendition_paths': rendition_paths,
+            'blobs': blobs,
+            'files': files
+        }
+
+def purge_deleted_albums(retention, limit):
+    """Hard-delete up to limit albums deleted over retention seconds ago that have no photos left
+    
+    Albums with queued uploads are kept until the queue has drained.
+    Returns the purged album IDs.
+    """
+    with db_cursor('purge_deleted_albums', immediate=True) as cursor:
+        cursor.execute(f'''
+            DELETE FROM albums
+            WHERE id IN (
+                SELECT id FROM albums
+                WHERE status = 'deleted' AND {_EXPIRED}
+                  AND NOT EXISTS (SELECT 1 FROM photos WHERE album_id = albums.id)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM jobs JOIN job_items ON job_items.job_id = jobs.id
+                      WHERE jobs.album_id = albums.id AND job_items.status IN ('pending', 'processing')
+                  )
+                LIMIT :limit
+            )
+            RETURNING id
+        ''', {'retention': retention, 'limit': limit})
+        
+        album_ids = [row['id'] for row in cursor.fetchall()]
+        return album_ids
+
+def purge_finished_jobs(retention, limit):
+    """Delete up to limit upload jobs created over retention seconds ago, with their items
+    
+    Jobs with items still queued or processing are kept. Age is taken from
+    created_at, as updated_at moves whenever an item changes.
+    Returns the deleted job IDs.
+    """
+    with db_cursor('purge_finished_jobs', immediate=True) as cursor:
+        cursor.execute('''
+            DELETE FROM jobs
+            WHERE id IN (
+                SELECT id FROM jobs
+                WHERE created_at <= datetime('now', '-' || ? || ' seconds')
+                  AND NOT EXISTS (
+                      SELECT 1 FROM job_items
+                      WHERE job_id = jobs.id AND status IN ('pending', 'processing')
+                  )
+                LIMIT ?
+            )
+            RETURNING id
+        ''', (retention, limit))
+        job_ids = [row['id'] for row in cursor.fetchall()]
+        
+        for chunk in _chunks(job_ids):
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'DELETE FROM job_items WHERE job_id IN ({placeholders})', chunk)
+        
+        return job_ids
+
+def expire_upload_sessions(ttl, limit):
+    """Delete up to limit chunked upload sessions idle for over ttl seconds
+    
+    Returns their status and partial_path; only unfinished sessions still
+    own their partial file.
+    """
+    with db_cursor('expire_upload_sessions', immediate=True) as cursor:
+        cursor.execute('''
+            DELETE FROM upload_sessions
+            WHERE id IN (
+                SELECT id FROM upload_sessions
+                WHERE updated_at <= datetime('now', '-' || ? || ' seconds')
+                LIMIT ?
+            )
+            RETURNING status, partial_path
+        ''', (ttl, limit))
+        
+        sessions = cursor.fetchall()
+        return sessions
+
+def get_active_partial_paths():
+    """Get the partial files of chunked uploads still in progress"""
+    with db_cursor('get_active_partial_paths') as cursor:
+        cursor.execute("SELECT partial_path FROM upload_sessions WHERE status = 'uploading'")
+        
+        paths = [row['partial_path'] for row in cursor.fetchall()]
+        return paths
+
+def get_content_paths(content_hashes):
+    """Get the (original_path, compressed_path) pairs recorded for the given content hashes
+    
+    Covers blobs, photos and job items not yet processed (whose original
+    is stored before any blob exists).
+    """
+    content_hashes = list(content_hashes)
+    paths = set()
+    
+    with db_cursor('get_content_paths') as cursor:
+        for chunk in _chunks(content_hashes):
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'''
+                SELECT original_path, compressed_path FROM blobs WHERE content_hash IN ({placeholders})
+                UNION
+                SELECT original_path, compressed_path FROM photos WHERE content_hash IN ({placeholders})
+                UNION
+                SELECT original_path, compressed_path FROM job_items
+                WHERE content_hash IN ({placeholders}) AND status IN ('pending', 'processing')
+            ''', chunk * 3)
+            paths.update(tuple(row) for row in cursor.fetchall())
+        
+        return paths
+
+def get_rendition_paths(photo_ids):
+    """Get the recorded rendition file paths of the given photos"""
+    photo_ids = list(photo_ids)
+    paths = set()
+    
+    with db_cursor('get_rendition_paths') as cursor:
+        for chunk in _chunks(photo_ids):
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'SELECT path FROM renditions WHERE photo_id IN ({placeholders})', chunk)
+            paths.update(row['path'] for row in cursor.fetchall())
+        
+        return paths
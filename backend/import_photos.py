@@ -0,0 +1,220 @@
+"""Bulk import a local directory tree of photos
+
+Every folder holding photos becomes an album named after its path relative
+to the root (photos directly in the root go to an album named after the
+root folder). Files go through the same save, compress and insert path as
+web uploads, compressed in parallel worker processes.
+
+Re-runs skip files whose path, size and modification time match an earlier
+import; with --match hash, files that changed or moved but whose content
+was already imported are skipped too. Progress is recorded after every
+batch, so an interrupted import resumes where it stopped.
+
+Run from the backend directory:
+
+    python import_photos.py /path/to/archive --workers 8
+"""
+import argparse
+import os
+import signal
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from config import Config
+from database import (
+    init_db, get_album_by_name, create_album, get_imported_files, get_imported_hashes,
+    record_imported_files
+)
+from services.file_manager import ensure_directories, save_stream, hash_file
+from services.image_processor import prepare_upload, store_original, process_saved_photos
+from services.batch_run import RunStats, run_batches, stop_requested
+
+class ImportStats(RunStats):
+    """Running totals and throughput of an import"""
+    
+    COUNTERS = (('imported', 'imported'), ('skipped', 'skipped'), ('failed', 'failed'))
+    
+    def __init__(self):
+        super().__init__()
+        self.bytes = 0
+    
+    def report(self, album_name):
+        """Print one progress line"""
+        elapsed = self.elapsed()
+        processed = self.imported + self.failed
+        print(f"{album_name}: {self.summary()}"
+              f" | {processed / elapsed:.1f} files/s, {self.bytes / elapsed / 1024 / 1024:.1f} MB/s",
+              flush=True)
+    
+    def has_failures(self):
+        return self.failed > 0
+
+def ignore_interrupts():
+    """Leave Ctrl-C to the parent so worker processes finish their current image"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def album_name_for(root, dirpath):
+    """Album name of a folder: its path relative to the root, or the root's own name"""
+    relative = os.path.relpath(dirpath, root)
+    if relative == '.':
+        return os.path.basename(os.path.abspath(root))
+    return relative.replace(os.sep, '/')
+
+def iter_folders(root):
+    """Yield (album name, [(path, file format)]) for every folder holding supported files"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        
+        files = []
+        for filename in sorted(filenames):
+            try:
+                files.append((os.path.abspath(os.path.join(dirpath, filename)), prepare_upload(filename)))
+            except Exception:
+                continue
+        
+        if files:
+            yield album_name_for(root, dirpath), files
+
+def get_or_create_album(name):
+    """Get the ID of the active album called name, creating it if needed"""
+    album = get_album_by_name(name)
+    if album:
+        return album['id']
+    return create_album(name)
+
+def pending_files(files, retry_failed):
+    """Stat files and drop those whose earlier import record still matches
+    
+    Returns ([(path, file format, stat)], number skipped).
+    """
+    records = get_imported_files(path for path, _ in files)
+    pending = []
+    
+    for path, file_format in files:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        
+        record = records.get(path)
+        if (record and record['file_size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns
+                and (record['status'] == 'imported' or not retry_failed)):
+            continue
+        pending.append((path, file_format, stat))
+    
+    return pending, len(files) - len(pending)
+
+def save_source(path, file_format):
+    """Copy one source file into original storage, hashing it on the way"""
+    try:
+        with open(path, 'rb') as f:
+            temp_path, content_hash, original_size = save_stream(f, Config.ORIGINALS_FOLDER)
+        return store_original(temp_path, content_hash, original_size, file_format)
+    except Exception as e:
+        return str(e)
+
+def import_batch(album_id, batch, match, executor, io_pool, stats):
+    """Import one batch of (path, file format, stat) into an album and checkpoint it"""
+    def record(path, stat, status, content_hash=None, photo_id=None, error=None):
+        return {
+            'source_path': path,
+            'file_size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'content_hash': content_hash,
+            'album_id': album_id,
+            'photo_id': photo_id,
+            'status': status,
+            'error': error
+        }
+    
+    records = []
+    
+    # Content already imported from another path (moved, renamed or touched files)
+    if match == 'hash':
+        hashes = list(io_pool.map(lambda item: hash_file(item[0]), batch))
+        imported = get_imported_hashes(hashes)
+        remaining = []
+        for item, content_hash in zip(batch, hashes):
+            if content_hash in imported:
+                records.append(record(item[0], item[2], 'imported', content_hash, imported[content_hash]))
+                stats.skipped += 1
+            else:
+                remaining.append(item)
+        batch = remaining
+    
+    # Copy originals on I/O threads while worker processes compress
+    saved = list(io_pool.map(lambda item: save_source(item[0], item[1]), batch))
+    entries = [(os.path.basename(path), entry) for (path, _, _), entry in zip(batch, saved)]
+    process_saved_photos(album_id, entries, executor)
+    
+    for (path, _, stat), (_, entry) in zip(batch, entries):
+        if not isinstance(entry, dict):
+            records.append(record(path, stat, 'failed', error=entry))
+            stats.failed += 1
+        elif entry.get('error') is not None:
+            records.append(record(path, stat, 'failed', entry['content_hash'], error=str(entry['error'])))
+            stats.failed += 1
+        else:
+            records.append(record(path, stat, 'imported', entry['content_hash'], entry['photo_id']))
+            stats.imported += 1
+            stats.bytes += entry['original_size']
+    
+    record_imported_files(records)
+
+def run_import(root, workers, batch_size, match, retry_failed):
+    """Import every folder under root and return the final stats"""
+    stats = ImportStats()
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=ignore_interrupts)
+    io_pool = ThreadPoolExecutor(max_workers=max(4, workers))
+    
+    try:
+        for album_name, files in iter_folders(root):
+            if stop_requested():
+                break
+            
+            pending, skipped = pending_files(files, retry_failed)
+            stats.skipped += skipped
+            if not pending:
+                continue
+            
+            try:
+                album_id = get_or_create_album(album_name)
+            except sqlite3.IntegrityError:
+                print(f"{album_name}: skipped, the name belongs to a deleted album", file=sys.stderr)
+                continue
+            
+            for start in range(0, len(pending), batch_size):
+                if stop_requested():
+                    break
+                import_batch(album_id, pending[start:start + batch_size], match, executor, io_pool, stats)
+                stats.report(album_name)
+    finally:
+        io_pool.shutdown(cancel_futures=True)
+        executor.shutdown(cancel_futures=True)
+    
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('root', help='directory to import')
+    parser.add_argument('--workers', type=int, default=Config.COMPRESSION_WORKERS,
+                        help='compression worker processes')
+    parser.add_argument('--batch-size', type=int, default=200,
+                        help='files compressed and checkpointed together')
+    parser.add_argument('--match', default='path', choices=['path', 'hash'],
+                        help='skip files by path, size and mtime only, or also by content hash')
+    parser.add_argument('--retry-failed', action='store_true',
+                        help='retry files that failed in an earlier run')
+    args = parser.parse_args()
+    
+    if not os.path.isdir(args.root):
+        parser.error(f"Not a directory: {args.root}")
+    
+    ensure_directories()
+    init_db()
+    
+    return run_batches(lambda: run_import(args.root, args.workers, args.batch_size,
+                                          args.match, args.retry_failed))
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""Move stored originals and compressed files into the configured directory layout
+
+Each file is linked at its new path, the database is pointed at the new
+path, and only then is the old name removed, so the app keeps serving
+photos while the migration runs. Work is done in batches; an interrupted
+run resumes where it stopped and first removes old names it had already
+replaced. Set STORAGE_SHARD_DEPTH and STORAGE_SHARD_WIDTH to the layout
+the app uses.
+
+Run from the backend directory:
+
+    python migrate_storage.py --batch-size 500
+"""
+import argparse
+import os
+import shutil
+import sys
+from config import Config
+from database import (
+    init_db, get_blob_paths, get_unhashed_photo_paths, relocate_files,
+    get_stale_files, clear_stale_files
+)
+from services.file_manager import (
+    ensure_directories, layout_path, get_original_file_path, get_file_path, cleanup_file
+)
+from services.batch_run import RunStats, run_batches, stop_requested
+
+class MigrationStats(RunStats):
+    """Running totals and throughput of a migration"""
+    
+    COUNTERS = (('moved', 'moved'), ('in_place', 'already in place'), ('missing', 'missing'))
+    
+    def report(self):
+        """Print one progress line"""
+        print(f"{self.summary()} | {(self.moved + self.in_place) / self.elapsed():.0f} entries/s", flush=True)
+    
+    def has_failures(self):
+        return self.missing > 0
+
+def place_file(source, target):
+    """Make target a name of the file at source, copying only across filesystems
+    
+    Returns False if neither exists. An existing target is kept: files are
+    named by content, or by upload time for photos stored before content
+    hashing, so it is the same file linked by an interrupted run.
+    """
+    if os.path.exists(target):
+        return True
+    
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+    except FileNotFoundError:
+        return False
+    except OSError:
+        # No hard links here (other filesystem, or not supported); copy under
+        # a temporary name so target only ever appears complete
+        temp_path = f"{target}.{os.getpid()}.tmp"
+        try:
+            shutil.copy2(source, temp_path)
+        except FileNotFoundError:
+            return False
+        os.replace(temp_path, target)
+    return True
+
+def plan_move(row):
+    """Link one entry's files at their layout paths
+    
+    Returns (original_path, compressed_path, old file paths) when the entry
+    has to be repointed, None when it is already in place, or False when a
+    file is missing.
+    """
+    paths = []
+    old_paths = []
+    
+    for stored_path, folder, resolve in ((row['original_path'], Config.ORIGINALS_FOLDER, get_original_file_path),
+                                         (row['compressed_path'], Config.COMPRESSED_FOLDER, get_file_path)):
+        source = resolve(stored_path)
+        target = layout_path(folder, os.path.basename(source))
+        
+        if source != target:
+            if not place_file(source, target):
+                return False
+            old_paths.append(source)
+        paths.append(target)
+    
+    if not old_paths and paths == [row['original_path'], row['compressed_path']]:
+        return None
+    return paths[0], paths[1], old_paths
+
+def remove_stale_files(paths):
+    """Remove old names of moved files, then forget them"""
+    for path in paths:
+        cleanup_file(path)
+    clear_stale_files(paths)
+
+def migrate_batch(rows, key, stats):
+    """Move one page of blobs (key 'content_hash') or unhashed photos (key 'id')"""
+    moves = []
+    old_paths = []
+    
+    for row in rows:
+        move = plan_move(row)
+        if move is False:
+            stats.missing += 1
+        elif move is None:
+            stats.in_place += 1
+        else:
+            moves.append((row[key], move[0], move[1]))
+            old_paths.extend(move[2])
+            stats.moved += 1
+    
+    if not moves:
+        return
+    
+    if key == 'content_hash':
+        relocate_files(moves, [], old_paths)
+    else:
+        relocate_files([], moves, old_paths)
+    remove_stale_files(old_paths)
+
+def run_migration(batch_size):
+    """Move every blob, then every photo stored before content hashing"""
+    stats = MigrationStats()
+    
+    # Finish removing old names an interrupted run had already replaced
+    remove_stale_files(get_stale_files())
+    
+    for fetch, key, start in ((get_blob_paths, 'content_hash', ''),
+                              (get_unhashed_photo_paths, 'id', 0)):
+        after = start
+        while not stop_requested():
+            rows = fetch(after, batch_size)
+            if not rows:
+                break
+            
+            migrate_batch(rows, key, stats)
+            stats.report()
+            after = rows[-1][key]
+    
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=500,
+                        help='entries moved and recorded together')
+    args = parser.parse_args()
+    
+    ensure_directories()
+    init_db()
+    
+    print(f"Layout: {Config.STORAGE_SHARD_DEPTH} levels of {Config.STORAGE_SHARD_WIDTH} hex characters", flush=True)
+    return run_batches(lambda: run_migration(args.batch_size))
+
+if __name__ == '__main__':
+    sys.exit(main())
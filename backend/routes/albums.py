@@ -1,8 +1,16 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
+from urllib.parse import quote
+import unicodedata
+from config import Config
 from database import (
     get_all_albums, get_album_by_id, create_album, 
-    update_album, delete_album, get_photos_by_album
+    update_album, delete_album,
+    get_photo_hashes, get_photos_by_ids
 )
+from services.similarity import find_duplicate_clusters, to_unsigned
+from routes.photos import album_photos_page
+from services.cache import photo_cache
+from services.album_export import stream_album_zip, EXPORT_VARIANTS
 
 albums_bp = Blueprint('albums', __name__)
 
@@ -19,6 +27,9 @@ def get_albums():
                 'name': album['name'],
                 'description': album['description'],
                 'photo_count': album['photo_count'],
+                'total_original_size': album['total_original_size'],
+                'total_compressed_size': album['total_compressed_size'],
+                'cover_photo': album['cover_photo_id'],
                 'created_at': album['created_at'],
                 'updated_at': album['updated_at']
             }
@@ -30,36 +41,27 @@ def get_albums():
 
 @albums_bp.route('/albums/<int:album_id>', methods=['GET'])
 def get_album(album_id):
-    """Get album details with photos"""
+    """Get album details with the first page of photos"""
     try:
         album = get_album_by_id(album_id)
         if not album:
             return jsonify({'error': 'Album not found'}), 404
         
-        photos = get_photos_by_album(album_id)
-        photos_data = []
-        
-        for photo in photos:
-            photo_data = {
-                'id': photo['id'],
-                'filename': photo['filename'],
-                'original_filename': photo['original_filename'],
-                'file_format': photo['file_format'],
-                'original_size': photo['original_size'],
-                'compressed_size': photo['compressed_size'],
-                'width': photo['width'],
-                'height': photo['height'],
-                'compression_ratio': photo['compression_ratio'],
-                'created_at': photo['created_at']
-            }
-            photos_data.append(photo_data)
+        try:
+            photos_data, next_cursor = album_photos_page(album_id, request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         album_data = {
             'id': album['id'],
             'name': album['name'],
             'description': album['description'],
             'photo_count': album['photo_count'],
+            'total_original_size': album['total_original_size'],
+            'total_compressed_size': album['total_compressed_size'],
+            'cover_photo': album['cover_photo_id'],
             'photos': photos_data,
+            'next_cursor': next_cursor,
             'created_at': album['created_at'],
             'updated_at': album['updated_at']
         }
@@ -90,6 +92,7 @@ def create_new_album():
             'name': name,
             'description': description,
             'photo_count': 0,
+            'cover_photo': None,
             'message': 'Album created successfully'
         }), 201
         
@@ -139,7 +142,86 @@ def delete_album_route(album_id):
         if not success:
             return jsonify({'error': 'Album not found'}), 404
         
+        photo_cache.invalidate(('album', album_id))
+        
         return jsonify({'message': 'Album deleted successfully'})
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@albums_bp.route('/albums/<int:album_id>/duplicates', methods=['GET'])
+def get_album_duplicates(album_id):
+    """Get clusters of near-identical photos in album"""
+    try:
+        album = get_album_by_id(album_id)
+        if not album:
+            return jsonify({'error': 'Album not found'}), 404
+        
+        threshold = request.args.get('threshold', Config.DUPLICATE_THRESHOLD, type=int)
+        if threshold < 0 or threshold > Config.MAX_DUPLICATE_THRESHOLD:
+            return jsonify({'error': f"Threshold must be between 0 and {Config.MAX_DUPLICATE_THRESHOLD}"}), 400
+        
+        rows = get_photo_hashes(album_id)
+        clusters = find_duplicate_clusters(
+            [row['id'] for row in rows],
+            [to_unsigned(row['phash']) for row in rows],
+            threshold
+        )
+        
+        photos = {photo['id']: photo for photo in get_photos_by_ids(
+            [photo_id for cluster in clusters for photo_id in cluster]
+        )}
+        clusters_data = []
+        
+        for cluster in clusters:
+            cluster_data = [{
+                'id': photo['id'],
+                'original_filename': photo['original_filename'],
+                'file_format': photo['file_format'],
+                'original_size': photo['original_size'],
+                'width': photo['width'],
+                'height': photo['height'],
+                'created_at': photo['created_at']
+            } for photo in (photos.get(photo_id) for photo_id in sorted(cluster)) if photo]
+            
+            if len(cluster_data) > 1:
+                clusters_data.append(cluster_data)
+        
+        return jsonify({
+            'album_id': album_id,
+            'threshold': threshold,
+            'clusters': clusters_data
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def attachment_disposition(download_name):
+    """Content-Disposition options for an attachment, with an RFC 2231 name when not ASCII"""
+    try:
+        download_name.encode('ascii')
+        return {'filename': download_name}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        return {'filename': simple, 'filename*': f"UTF-8''{quote(download_name, safe='')}"}
+
+@albums_bp.route('/albums/<int:album_id>/export', methods=['GET'])
+def export_album(album_id):
+    """Stream a ZIP of the album's original (or compressed) photo files"""
+    try:
+        album = get_album_by_id(album_id)
+        if not album:
+            return jsonify({'error': 'Album not found'}), 404
+        
+        variant = request.args.get('files', 'original')
+        if variant not in EXPORT_VARIANTS:
+            return jsonify({'error': f"files must be one of: {', '.join(EXPORT_VARIANTS)}"}), 400
+        
+        response = Response(stream_album_zip(album_id, variant), mimetype='application/zip')
+        response.headers.set('Content-Disposition', 'attachment',
+                             **attachment_disposition(f"{album['name']}.zip"))
+        response.cache_control.no_store = True
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,59 @@
+from flask import Blueprint, jsonify
+from database import get_job_by_id, get_job_items
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get upload job progress with per-file status"""
+    try:
+        job = get_job_by_id(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        items = get_job_items(job_id)
+        items_data = []
+        
+        for item in items:
+            item_data = {
+                'original_filename': item['original_filename'],
+                'status': item['status'],
+                'photo_id': item['photo_id'],
+                'error': item['error'],
+                'updated_at': item['updated_at']
+            }
+            # A completed item's photo fields are gone once the photo is purged
+            if item['status'] == 'completed' and item['compression_ratio'] is not None:
+                item_data.update({
+                    'file_format': item['file_format'],
+                    'original_size': item['original_size'],
+                    'compressed_size': item['compressed_size'],
+                    'width': item['width'],
+                    'height': item['height'],
+                    'compression_ratio': round(item['compression_ratio'], 2)
+                })
+            items_data.append(item_data)
+        
+        done = job['completed'] + job['failed']
+        if done == job['total']:
+            status = 'completed'
+        elif job['processing'] or done:
+            status = 'processing'
+        else:
+            status = 'queued'
+        
+        return jsonify({
+            'id': job['id'],
+            'album_id': job['album_id'],
+            'status': status,
+            'total': job['total'],
+            'pending': job['pending'],
+            'processing': job['processing'],
+            'completed': job['completed'],
+            'failed': job['failed'],
+            'items': items_data,
+            'created_at': job['created_at'],
+            'updated_at': job['updated_at']
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
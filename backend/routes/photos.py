@@ -1,34 +1,76 @@
-from flask import Blueprint, request, jsonify, send_file
-import os
-from database import get_photos_by_album, create_photo, delete_photo, get_photo_by_id
-from services.image_processor import process_uploaded_photos
-from services.file_manager import get_file_path, get_original_file_path
+from flask import Blueprint, Response, request, jsonify, send_file
+from werkzeug.http import is_resource_modified
+from collections import Counter
+from datetime import datetime, timezone
+import io
+import mimetypes
+from config import Config
+from database import (
+    get_photos_by_album, create_photo, delete_photo, get_photo_by_id, create_job,
+    get_format_savings, get_album_by_id, bulk_update_photos
+)
+from services.image_processor import process_saved_photos, save_uploaded_files
+from services.job_queue import notify_workers
+from services.file_manager import get_original_file_path, get_rendition_file_path, read_small_file
+from services.renditions import (
+    get_rendition_path, resolve_rendition_path, remove_renditions, remove_rendition_files,
+    accepted_formats, get_photo_view, select_variant, regenerate_variant, enabled_formats
+)
+from services.pagination import get_page_args, encode_cursor
+from services.cache import photo_cache
+from services.file_serving import serve_file, serves_in_process
+from services import metrics
 
 photos_bp = Blueprint('photos', __name__)
 
+def photo_data(photo):
+    """Serialize photo for listing responses"""
+    return {
+        'id': photo['id'],
+        'filename': photo['filename'],
+        'original_filename': photo['original_filename'],
+        'file_format': photo['file_format'],
+        'original_size': photo['original_size'],
+        'compressed_size': photo['compressed_size'],
+        'width': photo['width'],
+        'height': photo['height'],
+        'compression_ratio': photo['compression_ratio'],
+        'taken_at': photo['taken_at'],
+        'camera_model': photo['camera_model'],
+        'gps_latitude': photo['gps_latitude'],
+        'gps_longitude': photo['gps_longitude'],
+        'created_at': photo['created_at']
+    }
+
+def album_photos_page(album_id, args):
+    """Load one page of album photos from limit/cursor query parameters
+    
+    Returns (photos_data, next_cursor); next_cursor is None on the last page.
+    """
+    limit, after = get_page_args(args)
+    
+    # Fetch one extra row to know whether another page follows
+    photos = get_photos_by_album(album_id, limit + 1, after)
+    next_cursor = None
+    if len(photos) > limit:
+        photos = photos[:limit]
+        next_cursor = encode_cursor(photos[-1]['created_at'], photos[-1]['id'])
+    
+    return [photo_data(photo) for photo in photos], next_cursor
+
 @photos_bp.route('/albums/<int:album_id>/photos', methods=['GET'])
 def get_album_photos(album_id):
-    """Get all photos in album"""
+    """Get a page of photos in album"""
     try:
-        photos = get_photos_by_album(album_id)
-        photos_data = []
-        
-        for photo in photos:
-            photo_data = {
-                'id': photo['id'],
-                'filename': photo['filename'],
-                'original_filename': photo['original_filename'],
-                'file_format': photo['file_format'],
-                'original_size': photo['original_size'],
-                'compressed_size': photo['compressed_size'],
-                'width': photo['width'],
-                'height': photo['height'],
-                'compression_ratio': photo['compression_ratio'],
-                'created_at': photo['created_at']
-            }
-            photos_data.append(photo_data)
-        
-        return jsonify(photos_data)
+        try:
+            photos_data, next_cursor = album_photos_page(album_id, request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'photos': photos_data,
+            'next_cursor': next_cursor
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -44,27 +86,45 @@ def upload_photos(album_id):
         if not files or all(file.filename == '' for file in files):
             return jsonify({'error': 'No files selected'}), 400
         
-        # Process uploaded photos
-        result = process_uploaded_photos(album_id, files)
+        entries = save_uploaded_files(files)
+        return ingest_saved_photos(album_id, entries)
         
-        if result['failed'] > 0:
-            return jsonify({
-                'uploaded': result['uploaded'],
-                'failed': result['failed'],
-                'photos': result['photos'],
-                'errors': result.get('errors', []),
-                'message': f"Uploaded {result['uploaded']} photos, {result['failed']} failed"
-            }), 207  # Multi-status
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def ingest_saved_photos(album_id, entries):
+    """Compress saved originals now or queue them, and build the upload response"""
+    # Hand compression over to the job queue
+    if request.args.get('mode', Config.UPLOAD_MODE) == 'async':
+        job_id = create_job(album_id, entries)
+        notify_workers()
         
+        return jsonify({
+            'job_id': job_id,
+            'queued': sum(1 for _, entry in entries if isinstance(entry, dict)),
+            'failed': sum(1 for _, entry in entries if not isinstance(entry, dict)),
+            'status_url': f"/api/jobs/{job_id}",
+            'message': f"Queued {len(entries)} photos for processing"
+        }), 202
+    
+    # Process uploaded photos
+    result = process_saved_photos(album_id, entries)
+    
+    if result['failed'] > 0:
         return jsonify({
             'uploaded': result['uploaded'],
             'failed': result['failed'],
             'photos': result['photos'],
-            'message': f"Successfully uploaded {result['uploaded']} photos"
-        }), 201
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+            'errors': result.get('errors', []),
+            'message': f"Uploaded {result['uploaded']} photos, {result['failed']} failed"
+        }), 207  # Multi-status
+    
+    return jsonify({
+        'uploaded': result['uploaded'],
+        'failed': result['failed'],
+        'photos': result['photos'],
+        'message': f"Successfully uploaded {result['uploaded']} photos"
+    }), 201
 
 @photos_bp.route('/photos/<int:photo_id>', methods=['DELETE'])
 def delete_photo_route(photo_id):
@@ -75,49 +135,333 @@ def delete_photo_route(photo_id):
         if not success:
             return jsonify({'error': 'Photo not found'}), 404
         
+        remove_renditions(photo_id)
+        photo_cache.invalidate(('photo', photo_id))
+        
         return jsonify({'message': 'Photo deleted successfully'})
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Bulk outcomes that changed the photo; 'unchanged' photos were already as requested
+BULK_CHANGED = ('deleted', 'restored', 'moved')
+BULK_FILTER_KEYS = {'album_id', 'taken_from', 'taken_to', 'file_format'}
+
+def _is_id(value):
+    """Check whether a JSON value is an integer ID"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def parse_bulk_request(data):
+    """Validate a bulk request body and return (photo_ids, photo_filter)
+    
+    Exactly one of ids and filter must be given. Raises ValueError with a
+    message for the client.
+    """
+    photo_ids = data.get('ids')
+    photo_filter = data.get('filter')
+    if (photo_ids is None) == (photo_filter is None):
+        raise ValueError('Give either ids or filter')
+    
+    if photo_ids is not None:
+        if not isinstance(photo_ids, list) or not photo_ids or not all(_is_id(i) for i in photo_ids):
+            raise ValueError('ids must be a non-empty list of photo IDs')
+        if len(photo_ids) > Config.BULK_MAX_PHOTOS:
+            raise ValueError(f"At most {Config.BULK_MAX_PHOTOS} photos per request")
+        return photo_ids, None
+    
+    if not isinstance(photo_filter, dict) or not _is_id(photo_filter.get('album_id')):
+        raise ValueError('filter must include album_id')
+    unknown = set(photo_filter) - BULK_FILTER_KEYS
+    if unknown:
+        raise ValueError(f"Unknown filter fields: {', '.join(sorted(unknown))}")
+    for key in ('taken_from', 'taken_to'):
+        if photo_filter.get(key) is not None:
+            try:
+                datetime.strptime(photo_filter[key], '%Y-%m-%d')
+            except (TypeError, ValueError):
+                raise ValueError(f"{key} must be a YYYY-MM-DD date")
+    if photo_filter.get('file_format') is not None and not isinstance(photo_filter['file_format'], str):
+        raise ValueError('file_format must be a string')
+    return None, photo_filter
+
+@photos_bp.route('/photos/bulk/<any(delete, restore, move):action>', methods=['POST'])
+def bulk_photos(action):
+    """Delete, restore or move many photos in one transaction
+    
+    The body holds ids, or a filter selecting an album's photos; move also
+    needs target_album_id. A filter changes at most BULK_MAX_PHOTOS photos
+    per request and sets has_more when more remain. Answers 207 when some
+    photos could not be changed.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            photo_ids, photo_filter = parse_bulk_request(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        target_album_id = None
+        if action == 'move':
+            target_album_id = data.get('target_album_id')
+            if not _is_id(target_album_id):
+                return jsonify({'error': 'target_album_id is required'}), 400
+            if photo_filter and photo_filter['album_id'] == target_album_id:
+                return jsonify({'error': 'Photos are already in that album'}), 400
+            if not get_album_by_id(target_album_id):
+                return jsonify({'error': 'Album not found'}), 404
+        
+        if photo_filter and not get_album_by_id(photo_filter['album_id']):
+            return jsonify({'error': 'Album not found'}), 404
+        
+        result = bulk_update_photos(action, photo_ids, photo_filter, target_album_id)
+        remove_rendition_files(result['rendition_paths'])
+        
+        for photo_id, outcome in result['outcomes']:
+            if outcome in BULK_CHANGED:
+                photo_cache.invalidate(('photo', photo_id))
+        for album_id in result['album_ids']:
+            photo_cache.invalidate(('album', album_id))
+        
+        counts = Counter(outcome for _, outcome in result['outcomes'])
+        failed = sum(count for outcome, count in counts.items()
+                     if outcome not in BULK_CHANGED and outcome != 'unchanged')
+        
+        return jsonify({
+            'action': action,
+            'results': [{'id': photo_id, 'outcome': outcome} for photo_id, outcome in result['outcomes']],
+            'counts': dict(counts),
+            'has_more': result['has_more']
+        }), 207 if failed else 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def photo_etag(photo, variant):
+    """Strong ETag for one variant (original or a view size) of a photo
+    
+    Stored files never change once written, so the content hash identifies
+    them; photos stored before content hashing fall back to the row.
+    """
+    base = photo['content_hash'] or f"photo-{photo['id']}-{photo['original_size']}"
+    return f"{base}-{variant}"
+
+def photo_last_modified(photo):
+    """Last-Modified time of a photo's files, from its row"""
+    return datetime.strptime(photo['created_at'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+
+def set_cache_headers(response, etag, last_modified, immutable=False):
+    """Attach validators and, for immutable files, long-lived caching"""
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = Config.PHOTO_CACHE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    
+    return response
+
+def not_modified(etag, last_modified, immutable=False):
+    """Build a 304 response if the request's validators still match, else None
+    
+    Checked before the file is resolved, so revalidation never touches disk.
+    """
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    return set_cache_headers(Response(status=304), etag, last_modified, immutable)
+
+# Approximate footprint of a cached photo entry, excluding file bytes
+CACHE_ENTRY_OVERHEAD = 1024
+
+def cache_photo_entry(key, entry):
+    """Cache a photo view/download entry, tagged for invalidation by photo and album"""
+    size = CACHE_ENTRY_OVERHEAD + len(entry.get('data') or b'')
+    photo_cache.put(key, entry, size,
+                    tags=(('photo', entry['photo']['id']), ('album', entry['photo']['album_id'])))
+
+def photo_entry(photo, variant, rendition=None):
+    """Build the cache entry describing how to serve one variant of a photo
+    
+    rendition is the WebP/AVIF rendition row chosen for the view, if any.
+    """
+    return {
+        'photo': dict(photo),
+        'rendition': dict(rendition) if rendition else None,
+        'etag': photo_etag(photo, variant),
+        'last_modified': photo_last_modified(photo),
+        'path': None,
+        'data': None
+    }
+
+def vary_on_accept(response):
+    """Mark view responses as negotiated on Accept when modern formats are offered"""
+    if enabled_formats():
+        response.vary.add('Accept')
+    return response
+
+def load_view_file(photo, size, rendition=None):
+    """Resolve the file to serve for a view and read it if it is small enough to cache
+    
+    Returns (path, data); data is None for files sent from disk, which is
+    always the case when the fronting web server sends the files.
+    """
+    # A negative limit still opens the file, so missing renditions are caught here
+    max_size = Config.PHOTO_CACHE_MAX_FILE_SIZE if serves_in_process() else -1
+    
+    if rendition is not None:
+        try:
+            path = get_rendition_file_path(rendition['path'])
+            return path, read_small_file(path, max_size)
+        except FileNotFoundError:
+            # Variant rows are used without checking their files; regenerate it
+            path = regenerate_variant(photo, rendition)
+            return path, read_small_file(path, max_size)
+    
+    try:
+        path = resolve_rendition_path(photo, size)
+        return path, read_small_file(path, max_size)
+    except FileNotFoundError:
+        # A rendition row can outlive its file; regenerate it
+        path = get_rendition_path(photo, size)
+        return path, read_small_file(path, max_size)
+
 @photos_bp.route('/photos/<int:photo_id>/download', methods=['GET'])
 def download_photo(photo_id):
-    """Download original photo"""
+    """Download original photo, with conditional and range request support"""
     try:
-        photo = get_photo_by_id(photo_id)
+        key = ('download', photo_id)
+        entry = photo_cache.get(key)
+        cached = entry is not None
         
-        if not photo:
-            return jsonify({'error': 'Photo not found'}), 404
+        if entry is None:
+            photo = get_photo_by_id(photo_id)
+            
+            if not photo:
+                return jsonify({'error': 'Photo not found'}), 404
+            
+            entry = photo_entry(photo, 'original')
+            entry['path'] = get_original_file_path(photo['original_path'])
+            cache_photo_entry(key, entry)
         
-        original_path = get_original_file_path(photo['original_path'])
+        response = not_modified(entry['etag'], entry['last_modified'])
+        if response:
+            return response
         
-        if not os.path.exists(original_path):
+        try:
+            response = serve_file(
+                entry['path'],
+                as_attachment=True,
+                download_name=entry['photo']['original_filename'],
+                etag=entry['etag'],
+                last_modified=entry['last_modified']
+            )
+        except FileNotFoundError:
+            if cached:
+                # The file may have moved (migrate_storage.py) since it was cached
+                photo_cache.invalidate(('photo', photo_id))
+                return download_photo(photo_id)
             return jsonify({'error': 'Original file not found'}), 404
         
-        return send_file(
-            original_path,
-            as_attachment=True,
-            download_name=photo['original_filename']
-        )
+        return set_cache_headers(response, entry['etag'], entry['last_modified'])
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @photos_bp.route('/photos/<int:photo_id>/view', methods=['GET'])
 def view_photo(photo_id):
-    """View compressed photo"""
+    """View compressed photo, optionally at a smaller rendition size
+    
+    Clients listing image/webp or image/avif in Accept get the smallest
+    format they support. Cache hits for small files are answered without
+    touching the database or the filesystem.
+    """
     try:
-        photo = get_photo_by_id(photo_id)
+        size = request.args.get('size', 'full')
         
-        if not photo:
-            return jsonify({'error': 'Photo not found'}), 404
+        if size != 'full' and size not in Config.RENDITION_SIZES:
+            return jsonify({'error': 'Unknown size'}), 400
+        
+        formats = accepted_formats(request.accept_mimetypes)
+        key = ('view', photo_id, size, formats)
+        entry = photo_cache.get(key)
+        cached = entry is not None
+        
+        if entry is None:
+            photo, variants = get_photo_view(photo_id, size, formats)
+            
+            if not photo:
+                return jsonify({'error': 'Photo not found'}), 404
+            
+            rendition = select_variant(photo, size, formats, variants) if formats else None
+            variant = f"{size}-{rendition['format'].lower()}" if rendition else size
+            entry = photo_entry(photo, variant, rendition)
+            cache_photo_entry(key, entry)
         
-        compressed_path = get_file_path(photo['compressed_path'])
+        response = not_modified(entry['etag'], entry['last_modified'], immutable=True)
+        if response:
+            return vary_on_accept(response)
         
-        if not os.path.exists(compressed_path):
+        if entry['path'] is None:
+            try:
+                path, data = load_view_file(entry['photo'], size, entry['rendition'])
+            except FileNotFoundError:
+                photo_cache.invalidate(('photo', photo_id))
+                if cached:
+                    # The file may have moved (migrate_storage.py) since it was cached
+                    return view_photo(photo_id)
+                return jsonify({'error': 'Compressed file not found'}), 404
+            
+            entry = dict(entry, path=path, data=data, mimetype=mimetypes.guess_type(path)[0])
+            cache_photo_entry(key, entry)
+        
+        try:
+            if entry['data'] is not None:
+                response = send_file(io.BytesIO(entry['data']), mimetype=entry['mimetype'],
+                                     etag=entry['etag'], last_modified=entry['last_modified'])
+            else:
+                response = serve_file(entry['path'], etag=entry['etag'],
+                                      last_modified=entry['last_modified'])
+        except FileNotFoundError:
+            photo_cache.invalidate(('photo', photo_id))
+            if cached:
+                return view_photo(photo_id)
             return jsonify({'error': 'Compressed file not found'}), 404
         
-        return send_file(compressed_path)
+        rendition = entry['rendition']
+        if rendition and response.status_code == 200:
+            metrics.inc('photo_view_bytes_saved_total', rendition['legacy_size'] - rendition['file_size'],
+                        format=rendition['format'])
+        
+        response = set_cache_headers(response, entry['etag'], entry['last_modified'], immutable=True)
+        return vary_on_accept(response)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@photos_bp.route('/photos/format-savings', methods=['GET'])
+def format_savings():
+    """Bytes WebP/AVIF variants save over the JPEG/PNG files they replace, per format"""
+    try:
+        savings = []
+        for row in get_format_savings():
+            savings.append({
+                'format': row['format'],
+                'variants': row['variants'],
+                'legacy_bytes': row['legacy_bytes'],
+                'bytes': row['bytes'],
+                'served_bytes': row['served_bytes'],
+                'saved_bytes': row['legacy_bytes'] - row['served_bytes'],
+                'saved_percent': round((1 - row['served_bytes'] / row['legacy_bytes']) * 100, 2)
+                                 if row['legacy_bytes'] else 0.0
+            })
+        
+        return jsonify({
+            'enabled_formats': list(enabled_formats()),
+            'formats': savings
+        })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
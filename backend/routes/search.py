@@ -0,0 +1,54 @@
+from flask import Blueprint, request, jsonify
+from database import search
+from routes.photos import photo_data
+from services.pagination import get_page_args, encode_cursor
+
+search_bp = Blueprint('search', __name__)
+
+def search_result(row):
+    """Serialize one search match"""
+    album = {
+        'id': row['album_id'],
+        'name': row['album_name']
+    }
+    
+    if row['kind'] == 'album':
+        album.update({
+            'description': row['album_description'],
+            'photo_count': row['album_photo_count'],
+            'cover_photo': row['album_cover_photo_id']
+        })
+        return {'type': 'album', 'album': album}
+    
+    return {'type': 'photo', 'photo': photo_data(row), 'album': album}
+
+@search_bp.route('/search', methods=['GET'])
+def search_library():
+    """Search album names, descriptions and photo filenames, best match first
+    
+    Every word of q must match the start of a word in the album or photo.
+    """
+    try:
+        text = request.args.get('q', '').strip()
+        if not text:
+            return jsonify({'error': 'Search query is required'}), 400
+        
+        try:
+            limit, after = get_page_args(request.args)
+            # Fetch one extra match to know whether another page follows
+            results = search(text, limit + 1, after)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        next_cursor = None
+        if len(results) > limit:
+            results = results[:limit]
+            next_cursor = encode_cursor(results[-1]['score'], results[-1]['item'])
+        
+        return jsonify({
+            'query': text,
+            'results': [search_result(row) for row in results],
+            'next_cursor': next_cursor
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
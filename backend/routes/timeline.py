@@ -0,0 +1,49 @@
+from flask import Blueprint, request, jsonify
+from database import get_timeline_photos, get_timeline_buckets
+from routes.photos import photo_data
+from services.pagination import get_page_args, encode_cursor
+
+timeline_bp = Blueprint('timeline', __name__)
+
+@timeline_bp.route('/timeline', methods=['GET'])
+def get_timeline():
+    """Get a page of photos across all albums by capture time, newest first
+    
+    Photos without EXIF capture time are placed at their upload time.
+    """
+    try:
+        try:
+            limit, after = get_page_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Fetch one extra row to know whether another page follows
+        photos = get_timeline_photos(limit + 1, after)
+        next_cursor = None
+        if len(photos) > limit:
+            photos = photos[:limit]
+            next_cursor = encode_cursor(photos[-1]['timeline_time'], photos[-1]['id'])
+        
+        return jsonify({
+            'photos': [dict(photo_data(photo), album_id=photo['album_id']) for photo in photos],
+            'next_cursor': next_cursor
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@timeline_bp.route('/timeline/buckets', methods=['GET'])
+def get_buckets():
+    """Get photo counts per capture day or month"""
+    try:
+        granularity = request.args.get('granularity', 'month')
+        if granularity not in ('day', 'month'):
+            return jsonify({'error': 'Granularity must be day or month'}), 400
+        
+        buckets = get_timeline_buckets(granularity)
+        
+        return jsonify({
+            'granularity': granularity,
+            'buckets': [{'bucket': row['bucket'], 'count': row['count']} for row in buckets]
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,141 @@
+from flask import Blueprint, request, jsonify
+from werkzeug.http import parse_content_range_header
+from config import Config
+from database import get_album_by_id, get_upload_session
+from services.chunked_upload import start_upload, write_chunk, finish_upload, UploadConflict
+from routes.photos import ingest_saved_photos
+
+uploads_bp = Blueprint('uploads', __name__)
+
+def upload_session_data(session):
+    """Serialize upload session for API responses"""
+    return {
+        'upload_id': session['id'],
+        'album_id': session['album_id'],
+        'original_filename': session['original_filename'],
+        'total_size': session['total_size'],
+        'offset': session['received_size'],
+        'chunk_size': Config.UPLOAD_CHUNK_SIZE,
+        'status': session['status']
+    }
+
+@uploads_bp.route('/albums/<int:album_id>/uploads', methods=['POST'])
+def initiate_upload(album_id):
+    """Start a chunked upload"""
+    try:
+        data = request.get_json()
+        
+        if not data or not data.get('filename') or data.get('size') is None:
+            return jsonify({'error': 'Filename and size are required'}), 400
+        
+        size = data['size']
+        if not isinstance(size, int) or size <= 0:
+            return jsonify({'error': 'Size must be a positive integer'}), 400
+        
+        if size > Config.MAX_UPLOAD_SIZE:
+            return jsonify({'error': 'File is too large'}), 413
+        
+        if not get_album_by_id(album_id):
+            return jsonify({'error': 'Album not found'}), 404
+        
+        try:
+            session = start_upload(album_id, data['filename'], size)
+        except Exception as e:
+            return jsonify({'error': f"File {data['filename']}: {str(e)}"}), 400
+        
+        return jsonify(upload_session_data(session)), 201
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@uploads_bp.route('/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """Get chunked upload status, including the offset to resume from"""
+    try:
+        session = get_upload_session(upload_id)
+        if not session:
+            return jsonify({'error': 'Upload not found'}), 404
+        
+        return jsonify(upload_session_data(session))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@uploads_bp.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """Append a byte range (Content-Range: bytes start-end/total) to the upload"""
+    try:
+        session = get_upload_session(upload_id)
+        if not session:
+            return jsonify({'error': 'Upload not found'}), 404
+        
+        if session['status'] != 'uploading':
+            return jsonify({'error': 'Upload already finalized'}), 409
+        
+        content_range = parse_content_range_header(request.headers.get('Content-Range'))
+        if content_range is None or content_range.units != 'bytes':
+            return jsonify({'error': 'Valid Content-Range header is required'}), 400
+        
+        start, length = content_range.start, content_range.stop - content_range.start
+        
+        if content_range.length not in (None, session['total_size']) or content_range.stop > session['total_size']:
+            return jsonify({'error': 'Range does not match upload size'}), 416
+        
+        # Only the next missing byte range is accepted, so clients resume from offset
+        if start != session['received_size']:
+            return jsonify({
+                'error': 'Chunk does not start at the current offset',
+                'offset': session['received_size']
+            }), 409
+        
+        if request.content_length is not None and request.content_length != length:
+            return jsonify({'error': 'Body length does not match Content-Range'}), 400
+        
+        try:
+            offset = write_chunk(session, start, request.stream, length)
+        except UploadConflict as e:
+            # A concurrent request for the same range committed first
+            session = get_upload_session(upload_id)
+            return jsonify({
+                'error': str(e),
+                'offset': session['received_size'] if session else None
+            }), 409
+        
+        if offset < start + length:
+            return jsonify({'error': 'Incomplete chunk', 'offset': offset}), 400
+        
+        return jsonify({
+            'upload_id': upload_id,
+            'offset': offset,
+            'total_size': session['total_size']
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@uploads_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """Finalize a chunked upload and compress the assembled original"""
+    try:
+        session = get_upload_session(upload_id)
+        if not session:
+            return jsonify({'error': 'Upload not found'}), 404
+        
+        if session['status'] != 'uploading':
+            return jsonify({'error': 'Upload already finalized'}), 409
+        
+        if session['received_size'] != session['total_size']:
+            return jsonify({
+                'error': 'Upload is incomplete',
+                'offset': session['received_size']
+            }), 409
+        
+        try:
+            entry = finish_upload(session)
+        except UploadConflict as e:
+            return jsonify({'error': str(e)}), 409
+        
+        return ingest_saved_photos(session['album_id'], [entry])
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
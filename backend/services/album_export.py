@@ -0,0 +1,103 @@
+import os
+import zipfile
+from datetime import datetime
+from config import Config
+from database import get_photos_by_album
+from services.file_manager import get_original_file_path, get_file_path
+
+# Which stored file of each photo goes into the archive
+EXPORT_VARIANTS = ('original', 'compressed')
+
+class _ChunkBuffer:
+    """Write-only, unseekable sink collecting the bytes zipfile writes until drained
+    
+    Without seek/tell support zipfile writes each entry in one pass with a
+    trailing data descriptor, so nothing ever needs to be rewritten.
+    """
+    
+    def __init__(self):
+        self._chunks = []
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self):
+        """Get and forget everything written so far"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def entry_name(photo, variant, used):
+    """Pick a unique archive name for a photo, suffixing clashes as 'name (2).ext'
+    
+    Compressed entries keep the original name with the compressed file's
+    extension. used holds the lower-cased names taken so far.
+    """
+    name = os.path.basename(photo['original_filename'].replace('\\', '/')) or f"photo_{photo['id']}"
+    stem, ext = os.path.splitext(name)
+    if variant == 'compressed':
+        ext = os.path.splitext(photo['compressed_path'])[1]
+    
+    candidate = f"{stem}{ext}"
+    counter = 1
+    while candidate.lower() in used:
+        counter += 1
+        candidate = f"{stem} ({counter}){ext}"
+    
+    used.add(candidate.lower())
+    return candidate
+
+def _iter_album_photos(album_id):
+    """Yield active photos of an album page by page, so rows are never all in memory"""
+    after = None
+    while True:
+        photos = get_photos_by_album(album_id, Config.MAX_PAGE_SIZE, after)
+        yield from photos
+        if len(photos) < Config.MAX_PAGE_SIZE:
+            return
+        after = (photos[-1]['created_at'], photos[-1]['id'])
+
+def stream_album_zip(album_id, variant='original'):
+    """Generate a ZIP archive of an album's photos chunk by chunk
+    
+    Entries are stored without compression since the images already are
+    compressed. Files are copied in UPLOAD_BUFFER_SIZE blocks and each block
+    is yielded as soon as it is written, so memory stays flat however large
+    the album is; only the central directory (one small record per entry)
+    is held until the end. Photos whose file is missing are skipped.
+    """
+    buffer = _ChunkBuffer()
+    used = set()
+    
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for photo in _iter_album_photos(album_id):
+            if variant == 'original':
+                path = get_original_file_path(photo['original_path'])
+            else:
+                path = get_file_path(photo['compressed_path'])
+            
+            try:
+                source = open(path, 'rb')
+            except FileNotFoundError:
+                continue
+            
+            with source:
+                created_at = datetime.strptime(photo['created_at'], '%Y-%m-%d %H:%M:%S')
+                info = zipfile.ZipInfo(entry_name(photo, variant, used), created_at.timetuple()[:6])
+                info.compress_type = zipfile.ZIP_STORED
+                info.external_attr = 0o644 << 16
+                info.file_size = os.fstat(source.fileno()).st_size
+                
+                with archive.open(info, mode='w') as entry:
+                    for block in iter(lambda: source.read(Config.UPLOAD_BUFFER_SIZE), b''):
+                        entry.write(block)
+                        yield buffer.drain()
+            
+            yield buffer.drain()
+    
+    # Closing the archive wrote the central directory
+    yield buffer.drain()
@@ -0,0 +1,68 @@
+"""Ctrl-C handling and progress totals shared by the resumable batch scripts
+
+import_photos.py and migrate_storage.py record their progress after every
+batch. The first Ctrl-C lets the current batch finish and be recorded; a
+second one aborts at once. Either way a re-run resumes where they stopped.
+"""
+import signal
+import sys
+import threading
+import time
+
+# Set by the first Ctrl-C; scripts stop once the current batch is recorded
+_stop_requested = threading.Event()
+
+def request_stop(signum, frame):
+    """Stop after the current batch; a second Ctrl-C aborts at once"""
+    _stop_requested.set()
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    print("Stopping after the current batch (Ctrl-C again to abort)", file=sys.stderr, flush=True)
+
+def stop_requested():
+    """Check whether the script should stop before its next batch"""
+    return _stop_requested.is_set()
+
+class RunStats:
+    """Running totals and throughput of a batch run
+    
+    Subclasses list their counters in COUNTERS as (attribute, label) pairs;
+    each starts at zero and summary() reports them in that order.
+    """
+    
+    COUNTERS = ()
+    
+    def __init__(self):
+        self.start = time.perf_counter()
+        for name, _ in self.COUNTERS:
+            setattr(self, name, 0)
+    
+    def elapsed(self):
+        """Seconds since the run started"""
+        return max(time.perf_counter() - self.start, 1e-9)
+    
+    def summary(self):
+        """Counters as one phrase, e.g. '3 imported, 1 skipped, 0 failed'"""
+        return ', '.join(f"{getattr(self, name)} {label}" for name, label in self.COUNTERS)
+    
+    def has_failures(self):
+        """Check whether the run should exit with an error status"""
+        return False
+
+def run_batches(run):
+    """Call run() with Ctrl-C stopping it after the current batch, report the outcome
+    
+    run returns its RunStats. Returns the process exit status: 0 when done,
+    1 when done with failures, 130 when stopped or aborted.
+    """
+    signal.signal(signal.SIGINT, request_stop)
+    try:
+        stats = run()
+    except KeyboardInterrupt:
+        print("Aborted; completed batches are recorded, re-run to resume", file=sys.stderr)
+        return 130
+    
+    if stop_requested():
+        print(f"Stopped after {stats.elapsed():.1f}s: {stats.summary()}; re-run to resume", file=sys.stderr)
+        return 130
+    print(f"Done in {stats.elapsed():.1f}s: {stats.summary()}")
+    return 1 if stats.has_failures() else 0
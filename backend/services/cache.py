@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from config import Config
+
+class LRUCache:
+    """Thread-safe least-recently-used cache bounded by the total size of its values
+    
+    Entries carry tags so related entries (all variants of a photo, all
+    photos of an album) can be invalidated together. The cache is local to
+    the process and invalidation only reaches this process's copies, so
+    entries also expire ttl seconds after they are stored (None keeps them
+    until evicted).
+    """
+    
+    def __init__(self, max_bytes, ttl=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, size, tags, expires)
+        self._tagged = defaultdict(set)  # tag -> keys
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """Get a cached value and mark it recently used, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[3] is not None and entry[3] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, key, value, size, tags=()):
+        """Store a value, evicting least recently used entries to stay within budget"""
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                return False
+            
+            expires = time.monotonic() + self.ttl if self.ttl is not None else None
+            self._entries[key] = (value, size, tuple(tags), expires)
+            self.current_bytes += size
+            for tag in tags:
+                self._tagged[tag].add(key)
+            
+            while self.current_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            return True
+    
+    def invalidate(self, tag):
+        """Drop every entry carrying tag and return how many were dropped"""
+        with self._lock:
+            keys = list(self._tagged.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+    
+    def clear(self):
+        """Drop all entries, keeping the counters"""
+        with self._lock:
+            self._entries.clear()
+            self._tagged.clear()
+            self.current_bytes = 0
+    
+    def stats(self):
+        """Get hit/miss/eviction counters and current usage"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+    
+    def _remove(self, key):
+        """Remove an entry and its tag references; the lock must be held"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        
+        self.current_bytes -= entry[1]
+        for tag in entry[2]:
+            keys = self._tagged[tag]
+            keys.discard(key)
+            if not keys:
+                del self._tagged[tag]
+
+# Photo rows and small image files served by the photo view and download routes
+photo_cache = LRUCache(Config.PHOTO_CACHE_MAX_BYTES, Config.PHOTO_CACHE_TTL)
@@ -0,0 +1,81 @@
+import os
+import shutil
+import uuid
+from config import Config
+from database import (
+    create_upload_session, get_upload_session, append_upload_chunk,
+    complete_upload_session
+)
+from services.file_manager import hash_file, cleanup_file
+from services.image_processor import prepare_upload, store_original
+
+class UploadConflict(Exception):
+    """Another request moved the upload on, or finalized it, first"""
+
+def start_upload(album_id, original_filename, total_size):
+    """Validate the file and create an upload session with an empty partial file"""
+    file_format = prepare_upload(original_filename)
+    session_id = uuid.uuid4().hex
+    
+    # Chunks are appended to a partial file next to the originals, which is
+    # renamed (not copied) to its content-addressed path when finalized
+    partial_path = os.path.join(Config.ORIGINALS_FOLDER, f"{session_id}.part")
+    open(partial_path, 'wb').close()
+    
+    create_upload_session(session_id, album_id, original_filename, file_format,
+                          partial_path, total_size)
+    return get_upload_session(session_id)
+
+def write_chunk(session, start, stream, length):
+    """Stream a chunk of the request body into the original at offset start
+    
+    The body is received into a temporary file of its own, so a slow or
+    retried request never touches the partial file. It is copied in only
+    while append_upload_chunk holds the offset at start, after truncating
+    the partial file to start to drop bytes of a copy that was cut short.
+    Returns the new committed offset; it is less than start + length if the
+    client disconnected mid-chunk. Raises UploadConflict if another request
+    wrote this range first.
+    """
+    partial_path = session['partial_path']
+    chunk_path = f"{partial_path}.{uuid.uuid4().hex}.tmp"
+    written = 0
+    
+    def append():
+        with open(chunk_path, 'rb') as chunk, open(partial_path, 'r+b') as f:
+            f.truncate(start)
+            f.seek(start)
+            shutil.copyfileobj(chunk, f, Config.UPLOAD_BUFFER_SIZE)
+        return written
+    
+    try:
+        with open(chunk_path, 'wb') as f:
+            while written < length:
+                block = stream.read(min(Config.UPLOAD_BUFFER_SIZE, length - written))
+                if not block:
+                    break
+                f.write(block)
+                written += len(block)
+        
+        offset = append_upload_chunk(session['id'], start, append)
+    finally:
+        cleanup_file(chunk_path)
+    
+    if offset is None:
+        raise UploadConflict("Upload offset changed by a concurrent request")
+    
+    return offset
+
+def finish_upload(session):
+    """Mark the session complete, store the original and return its (filename, entry) pair
+    
+    Chunks may arrive over many requests, so the content hash is computed in
+    one read pass here rather than while streaming.
+    """
+    if not complete_upload_session(session['id']):
+        raise UploadConflict("Upload is incomplete or already finalized")
+    
+    partial_path = session['partial_path']
+    entry = store_original(partial_path, hash_file(partial_path),
+                           os.path.getsize(partial_path), session['file_format'])
+    return (session['original_filename'], entry)
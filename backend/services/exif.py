@@ -0,0 +1,99 @@
+from datetime import datetime
+
+# Image.Transpose methods that undo each EXIF orientation (1 is upright), by
+# name: Pillow is only imported once an image is actually being read
+ORIENTATION_TRANSPOSE = {
+    2: 'FLIP_LEFT_RIGHT',
+    3: 'ROTATE_180',
+    4: 'FLIP_TOP_BOTTOM',
+    5: 'TRANSPOSE',
+    6: 'ROTATE_270',
+    7: 'TRANSVERSE',
+    8: 'ROTATE_90'
+}
+
+# Metadata fields returned by read_metadata and stored per photo and blob
+METADATA_FIELDS = ('taken_at', 'camera_model', 'orientation', 'gps_latitude', 'gps_longitude')
+
+def swaps_dimensions(orientation):
+    """Check whether applying an orientation swaps width and height"""
+    return orientation in (5, 6, 7, 8)
+
+def apply_orientation(image, orientation):
+    """Rotate/flip image upright for its EXIF orientation"""
+    from PIL import Image
+    
+    method = ORIENTATION_TRANSPOSE.get(orientation)
+    return image.transpose(Image.Transpose[method]) if method is not None else image
+
+def _parse_datetime(value):
+    """Convert an EXIF 'YYYY:MM:DD HH:MM:SS' value to the database timestamp format"""
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.strptime(value.strip('\x00 ')[:19], '%Y:%m:%d %H:%M:%S').strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return None
+
+def _parse_coordinate(value, ref):
+    """Convert EXIF (degrees, minutes, seconds) and a N/S/E/W reference to signed degrees"""
+    try:
+        degrees, minutes, seconds = (float(part) for part in value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    
+    coordinate = degrees + minutes / 60 + seconds / 3600
+    if isinstance(ref, bytes):
+        ref = ref.decode('ascii', 'ignore')
+    if ref and ref.strip('\x00 ').upper() in ('S', 'W'):
+        coordinate = -coordinate
+    return round(coordinate, 7)
+
+def read_metadata(exif):
+    """Extract capture time, camera model, orientation and GPS position from an Image.Exif
+    
+    Capture time is the camera's local time, as EXIF records it. Fields
+    that are missing or malformed are None; orientation defaults to 1.
+    """
+    from PIL import ExifTags
+    
+    exif_ifd = exif.get_ifd(ExifTags.IFD.Exif)
+    gps_ifd = exif.get_ifd(ExifTags.IFD.GPSInfo)
+    
+    taken_at = (_parse_datetime(exif_ifd.get(ExifTags.Base.DateTimeOriginal))
+                or _parse_datetime(exif_ifd.get(ExifTags.Base.DateTimeDigitized))
+                or _parse_datetime(exif.get(ExifTags.Base.DateTime)))
+    
+    camera_model = exif.get(ExifTags.Base.Model)
+    camera_model = (camera_model.strip('\x00 ') or None) if isinstance(camera_model, str) else None
+    
+    orientation = exif.get(ExifTags.Base.Orientation)
+    if orientation not in range(1, 9):
+        orientation = 1
+    
+    latitude = longitude = None
+    if gps_ifd:
+        latitude = _parse_coordinate(gps_ifd.get(ExifTags.GPS.GPSLatitude), gps_ifd.get(ExifTags.GPS.GPSLatitudeRef))
+        longitude = _parse_coordinate(gps_ifd.get(ExifTags.GPS.GPSLongitude), gps_ifd.get(ExifTags.GPS.GPSLongitudeRef))
+        if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            latitude = longitude = None
+    
+    return {
+        'taken_at': taken_at,
+        'camera_model': camera_model,
+        'orientation': orientation,
+        'gps_latitude': latitude,
+        'gps_longitude': longitude
+    }
+
+def read_heif_metadata(heif_file):
+    """Extract metadata from a pillow_heif file; libheif has already applied its rotation"""
+    from PIL import Image
+    
+    exif = Image.Exif()
+    if heif_file.info.get('exif'):
+        exif.load(heif_file.info['exif'])
+    
+    metadata = read_metadata(exif)
+    metadata['orientation'] = heif_file.info.get('original_orientation') or metadata['orientation']
+    return metadata
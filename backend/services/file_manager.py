@@ -1,18 +1,75 @@
 import os
+import re
+import hashlib
+import tempfile
 from config import Config
 
+# Stem of content-addressed filenames (SHA-256 hex digest)
+_CONTENT_HASH = re.compile(r'[0-9a-f]{64}')
+
+def filename_content_hash(filename):
+    """Get the content hash a content-addressed filename is named by, or None"""
+    stem = os.path.splitext(filename)[0]
+    return stem if _CONTENT_HASH.fullmatch(stem) else None
+
+def _shard_key(filename):
+    """Get the hex string whose leading characters pick a file's shard directories
+    
+    Content-addressed files are sharded on their own hash; files named
+    before content hashing are sharded on a hash of their name.
+    """
+    return filename_content_hash(filename) or hashlib.sha256(filename.encode('utf-8')).hexdigest()
+
+def shard_dirs(filename):
+    """Get the fan-out directories of a file in the configured layout"""
+    key = _shard_key(filename)
+    width = Config.STORAGE_SHARD_WIDTH
+    return [key[level * width:(level + 1) * width] for level in range(Config.STORAGE_SHARD_DEPTH)]
+
+def layout_path(folder, filename, create=False):
+    """Get the path of a file under folder in the configured layout
+    
+    With create=True its shard directory is created if needed.
+    """
+    path = os.path.join(folder, *shard_dirs(filename), filename)
+    if create:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+def _resolve_stored_path(folder, stored_path):
+    """Resolve a path recorded in the database to the file under folder
+    
+    The shard directories a file was stored under are kept, so files
+    written under an earlier layout keep resolving until they are migrated.
+    Paths outside folder fall back to its top level, as before sharding.
+    """
+    relative = os.path.relpath(os.path.normpath(stored_path), folder)
+    if os.path.isabs(relative) or relative == os.pardir or relative.startswith(os.pardir + os.sep):
+        relative = os.path.basename(stored_path)
+    return os.path.join(folder, relative)
+
 def get_file_path(relative_path):
     """Get absolute path for compressed files"""
-    return os.path.join(Config.COMPRESSED_FOLDER, os.path.basename(relative_path))
+    return _resolve_stored_path(Config.COMPRESSED_FOLDER, relative_path)
 
 def get_original_file_path(relative_path):
     """Get absolute path for original files"""
-    return os.path.join(Config.ORIGINALS_FOLDER, os.path.basename(relative_path))
+    return _resolve_stored_path(Config.ORIGINALS_FOLDER, relative_path)
+
+def get_rendition_file_path(relative_path):
+    """Get absolute path for rendition files"""
+    return os.path.join(Config.RENDITIONS_FOLDER, os.path.basename(relative_path))
+
+def get_internal_redirect_uri(file_path):
+    """Get the X-Accel-Redirect URI of a stored file, relative to the uploads folder"""
+    relative_path = os.path.relpath(file_path, Config.UPLOAD_FOLDER).replace(os.sep, '/')
+    return f"{Config.X_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{relative_path}"
 
 def ensure_directories():
     """Ensure upload directories exist"""
     os.makedirs(Config.ORIGINALS_FOLDER, exist_ok=True)
     os.makedirs(Config.COMPRESSED_FOLDER, exist_ok=True)
+    os.makedirs(Config.RENDITIONS_FOLDER, exist_ok=True)
 
 def cleanup_file(file_path):
     """Delete file if it exists"""
@@ -30,3 +87,63 @@ def get_file_size(file_path):
         return os.path.getsize(file_path)
     except Exception:
         return 0
+
+def read_small_file(file_path, max_size):
+    """Read a file into memory if it is at most max_size bytes, else return None"""
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size > max_size:
+            return None
+        return f.read()
+
+def content_filename(content_hash, file_format):
+    """Get the content-addressed filename for a file"""
+    return f"{content_hash}.{file_format.lower()}"
+
+def save_stream(stream, folder):
+    """Copy stream into a temporary file in folder, hashing it on the way
+    
+    Returns (temp_path, sha256 hex digest, size in bytes).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=folder, suffix='.part')
+    
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                block = stream.read(Config.UPLOAD_BUFFER_SIZE)
+                if not block:
+                    break
+                digest.update(block)
+                f.write(block)
+                size += len(block)
+    except Exception:
+        cleanup_file(temp_path)
+        raise
+    
+    return temp_path, digest.hexdigest(), size
+
+def hash_file(file_path):
+    """Get SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(Config.UPLOAD_BUFFER_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def store_content(temp_path, folder, filename):
+    """Move a temporary file to its content-addressed path in the configured layout
+    
+    If the content is already stored the temporary file is dropped and the
+    stored file touched, so the garbage collector's grace period covers the
+    new reference.
+    """
+    file_path = layout_path(folder, filename, create=True)
+    
+    if os.path.exists(file_path):
+        cleanup_file(temp_path)
+        os.utime(file_path)
+    else:
+        os.replace(temp_path, file_path)
+    
+    return file_path
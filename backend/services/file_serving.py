@@ -0,0 +1,64 @@
+import mimetypes
+import os
+import unicodedata
+from urllib.parse import quote
+from flask import Response, request, send_file
+from config import Config
+from services.file_manager import get_internal_redirect_uri
+
+SERVING_BACKENDS = ('stream', 'sendfile', 'x-accel-redirect', 'x-sendfile')
+
+def serves_in_process():
+    """Check whether file bytes pass through this process (vs. the fronting web server)"""
+    return Config.FILE_SERVING in ('stream', 'sendfile')
+
+def serve_file(path, **options):
+    """Send a stored file with the configured FILE_SERVING backend
+    
+    options are passed on to send_file (etag, last_modified, as_attachment,
+    download_name, mimetype). x-sendfile is handled by send_file itself once
+    create_app has set USE_X_SENDFILE.
+    """
+    if Config.FILE_SERVING == 'x-accel-redirect':
+        return accel_redirect_response(path, **options)
+    
+    if Config.FILE_SERVING == 'stream':
+        # Read the file in Python even if the server offers a zero-copy wrapper
+        request.environ.pop('wsgi.file_wrapper', None)
+    
+    return send_file(path, **options)
+
+def _content_disposition(download_name):
+    """Build Content-Disposition parameters for an attachment, as send_file does
+    
+    Names that are not ASCII get an ASCII fallback in filename and the
+    exact name in filename* (RFC 2231).
+    """
+    try:
+        download_name.encode('ascii')
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        return {'filename': simple, 'filename*': f"UTF-8''{quote(download_name, safe='!#$&+^`|~')}"}
+    return {'filename': download_name}
+
+def accel_redirect_response(path, mimetype=None, as_attachment=False, download_name=None,
+                            etag=None, last_modified=None):
+    """Build an empty response that has nginx send path from an internal location
+    
+    Only the headers nginx passes on are set: Content-Type, the validators,
+    and Content-Disposition for attachments. nginx replaces the body and
+    its length with the redirected file's and handles Range requests.
+    """
+    download_name = download_name or os.path.basename(path)
+    response = Response(mimetype=mimetype or mimetypes.guess_type(download_name)[0]
+                        or 'application/octet-stream')
+    
+    if as_attachment:
+        response.headers.set('Content-Disposition', 'attachment', **_content_disposition(download_name))
+    if etag:
+        response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    
+    response.headers['X-Accel-Redirect'] = get_internal_redirect_uri(path)
+    return response
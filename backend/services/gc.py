@@ -0,0 +1,221 @@
+import os
+import re
+import threading
+import time
+from config import Config
+from database import (
+    purge_deleted_photos, purge_deleted_albums, purge_finished_jobs, expire_upload_sessions,
+    get_active_partial_paths,
+    get_content_paths, get_rendition_paths, get_unhashed_photo_paths
+)
+from services.file_manager import (
+    get_original_file_path, get_file_path, get_rendition_file_path, get_file_size,
+    cleanup_file, filename_content_hash
+)
+from services.cache import photo_cache
+from services import metrics
+
+# Counters reported by collect_garbage
+GC_STATS = ('photos', 'albums', 'blobs', 'renditions', 'jobs', 'upload_sessions', 'orphan_files',
+            'bytes_reclaimed')
+
+# Temporary files of uploads, renditions and migrations
+TEMP_SUFFIXES = ('.part', '.tmp')
+
+_RENDITION_NAME = re.compile(r'photo_(\d+)_')
+_collector = None
+
+def _remove_file(path, stats, kind=None):
+    """Delete a stored file, counting it under kind and its size as reclaimed"""
+    size = get_file_size(path)
+    if not cleanup_file(path):
+        return False
+    
+    stats['bytes_reclaimed'] += size
+    if kind:
+        stats[kind] += 1
+    return True
+
+def _recently_written(path):
+    """Check whether a file was written or reused within the orphan grace period"""
+    try:
+        return time.time() - os.path.getmtime(path) < Config.GC_ORPHAN_GRACE
+    except OSError:
+        return False
+
+def _remove_purged_files(purged, stats):
+    """Delete the files left behind by one purge_deleted_photos batch"""
+    for path in purged['rendition_paths']:
+        _remove_file(get_rendition_file_path(path), stats, 'renditions')
+    
+    # A blob file touched within the grace period may have just been picked
+    # up again by an upload of the same content; the orphan scan gets it later
+    for blob in purged['blobs']:
+        stats['blobs'] += 1
+        for path in (get_original_file_path(blob['original_path']), get_file_path(blob['compressed_path'])):
+            if not _recently_written(path):
+                _remove_file(path, stats)
+    
+    for original_path, compressed_path in purged['files']:
+        _remove_file(get_original_file_path(original_path), stats)
+        _remove_file(get_file_path(compressed_path), stats)
+    
+    for photo_id in purged['photo_ids']:
+        photo_cache.invalidate(('photo', photo_id))
+
+def _scan_files(folder):
+    """Yield (path, filename) of files under folder last written before the grace period"""
+    cutoff = time.time() - Config.GC_ORPHAN_GRACE
+    for root, dirs, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    yield path, name
+            except OSError:
+                continue
+
+def _batched(items, size):
+    """Group an iterable into lists of at most size items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _stored_paths(pairs):
+    """Resolve (original_path, compressed_path) pairs to the files they name"""
+    paths = set()
+    for original_path, compressed_path in pairs:
+        if original_path:
+            paths.add(os.path.normpath(get_original_file_path(original_path)))
+        if compressed_path:
+            paths.add(os.path.normpath(get_file_path(compressed_path)))
+    return paths
+
+def _unhashed_paths(batch_size):
+    """Get the files of every photo stored before content hashing"""
+    paths = set()
+    after = 0
+    while True:
+        rows = get_unhashed_photo_paths(after, batch_size)
+        if not rows:
+            return paths
+        paths |= _stored_paths((row['original_path'], row['compressed_path']) for row in rows)
+        after = rows[-1]['id']
+
+def collect_orphans(stats, batch_size):
+    """Delete stored files no database row refers to
+    
+    Only files older than GC_ORPHAN_GRACE are considered, so uploads and
+    renditions still being recorded are never touched. Partial files of
+    upload sessions in progress are kept.
+    """
+    active_partials = {os.path.normpath(path) for path in get_active_partial_paths()}
+    unhashed_paths = None
+    
+    for folder in (Config.ORIGINALS_FOLDER, Config.COMPRESSED_FOLDER):
+        for batch in _batched(_scan_files(folder), batch_size):
+            hashes = {filename_content_hash(name) for path, name in batch} - {None}
+            referenced = _stored_paths(get_content_paths(hashes)) if hashes else set()
+            
+            for path, name in batch:
+                path = os.path.normpath(path)
+                if name.endswith(TEMP_SUFFIXES):
+                    orphaned = path not in active_partials
+                elif filename_content_hash(name):
+                    orphaned = path not in referenced
+                else:
+                    if unhashed_paths is None:
+                        unhashed_paths = _unhashed_paths(batch_size)
+                    orphaned = path not in unhashed_paths
+                
+                if orphaned:
+                    _remove_file(path, stats, 'orphan_files')
+    
+    for batch in _batched(_scan_files(Config.RENDITIONS_FOLDER), batch_size):
+        photo_ids = {int(match.group(1)) for match in (_RENDITION_NAME.match(name) for path, name in batch) if match}
+        referenced = {os.path.normpath(get_rendition_file_path(path)) for path in get_rendition_paths(photo_ids)}
+        
+        for path, name in batch:
+            if name.endswith(TEMP_SUFFIXES) or (_RENDITION_NAME.match(name)
+                                                and os.path.normpath(path) not in referenced):
+                _remove_file(path, stats, 'orphan_files')
+
+def collect_garbage(retention_days=None, batch_size=None, orphans=True):
+    """Hard-delete photos and albums soft-deleted over retention_days ago, and their files
+    
+    Work is done in transactions of at most batch_size photos, so uploads
+    and other writes are only ever held up briefly. Also drops finished
+    upload jobs older than retention_days, abandoned upload sessions and,
+    with orphans=True, files nothing refers to.
+    Returns counts of what was removed and the bytes reclaimed. Runs
+    from several processes at once are safe.
+    """
+    if retention_days is None:
+        retention_days = Config.GC_RETENTION_DAYS
+    retention = int(retention_days * 24 * 60 * 60)
+    batch_size = batch_size or Config.GC_BATCH_SIZE
+    stats = dict.fromkeys(GC_STATS, 0)
+    
+    while True:
+        purged = purge_deleted_photos(retention, batch_size)
+        stats['photos'] += len(purged['photo_ids'])
+        _remove_purged_files(purged, stats)
+        if len(purged['photo_ids']) < batch_size:
+            break
+    
+    # Jobs go first: an album's jobs are all older than its deletion
+    while True:
+        job_ids = purge_finished_jobs(retention, batch_size)
+        stats['jobs'] += len(job_ids)
+        if len(job_ids) < batch_size:
+            break
+    
+    while True:
+        album_ids = purge_deleted_albums(retention, batch_size)
+        stats['albums'] += len(album_ids)
+        for album_id in album_ids:
+            photo_cache.invalidate(('album', album_id))
+        if len(album_ids) < batch_size:
+            break
+    
+    while True:
+        sessions = expire_upload_sessions(Config.UPLOAD_SESSION_TTL, batch_size)
+        stats['upload_sessions'] += len(sessions)
+        for session in sessions:
+            if session['status'] == 'uploading':
+                _remove_file(session['partial_path'], stats)
+        if len(sessions) < batch_size:
+            break
+    
+    if orphans:
+        collect_orphans(stats, batch_size)
+    
+    for kind in GC_STATS[:-1]:
+        if stats[kind]:
+            metrics.inc('gc_deleted_total', stats[kind], kind=kind)
+    metrics.inc('gc_reclaimed_bytes_total', stats['bytes_reclaimed'])
+    return stats
+
+def _collector_loop():
+    """Collect garbage every GC_INTERVAL seconds until the process exits"""
+    while True:
+        time.sleep(Config.GC_INTERVAL)
+        try:
+            collect_garbage()
+        except Exception:
+            pass
+
+def start_collector():
+    """Start the background garbage collector if GC_INTERVAL is set"""
+    global _collector
+    if _collector or Config.GC_INTERVAL <= 0:
+        return _collector
+    
+    _collector = threading.Thread(target=_collector_loop, name='garbage-collector', daemon=True)
+    _collector.start()
+    return _collector
@@ -1,152 +1,406 @@
 import os
-import time
-import random
-from PIL import Image
-import pillow_heif
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from config import Config
+from services.file_manager import content_filename, layout_path, save_stream, store_content, cleanup_file
+from services.similarity import dhash, to_signed
+from services.exif import (
+    METADATA_FIELDS, read_metadata, read_heif_metadata, apply_orientation, swaps_dimensions
+)
+from services import metrics
+from services.metrics import StageTimer
 
-# Register HEIF opener with Pillow
-pillow_heif.register_heif_opener()
+# Fields returned by compress_image and stored per blob
+RESULT_FIELDS = ('compressed_size', 'width', 'height', 'phash') + METADATA_FIELDS
 
-def generate_filename(original_filename, file_format):
-    """Generate unique filename with timestamp"""
-    timestamp = int(time.time())
-    random_suffix = random.randint(1000, 9999)
-    name, _ = os.path.splitext(original_filename)
-    safe_name = "".join(c for c in name if c.isalnum() or c in (' ', '-', '_')).rstrip()
-    safe_name = safe_name.replace(' ', '_')
-    return f"photo_{timestamp}_{random_suffix}.{file_format.lower()}"
+_codecs_lock = threading.Lock()
+_heif_registered = False
+
+def load_codecs():
+    """Import Pillow and register the HEIF opener, once per process
+    
+    Deferred until the first image is decoded or encoded, so processes that
+    only serve JSON and stored files never load the codec libraries.
+    """
+    global _heif_registered
+    if not _heif_registered:
+        with _codecs_lock:
+            if not _heif_registered:
+                import pillow_heif
+                pillow_heif.register_heif_opener()
+                _heif_registered = True
+
+def get_output_format(file_format):
+    """Get the format compressed files are written in (HEIC is stored as JPEG)"""
+    return 'JPEG' if file_format.upper() in ('HEIC', 'JPEG') else 'PNG'
+
+def save_image(image, output_path, file_format):
+    """Save image as JPEG, PNG, WebP or AVIF with the configured compression settings"""
+    from PIL import Image
+    
+    if file_format.upper() in ('WEBP', 'AVIF'):
+        # Both encoders take RGB or RGBA; keep alpha where the image has any
+        if image.mode not in ('RGB', 'RGBA'):
+            has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+        
+        if file_format.upper() == 'WEBP':
+            image.save(output_path, 'WEBP', quality=Config.WEBP_QUALITY, method=4)
+        else:
+            image.save(output_path, 'AVIF', quality=Config.AVIF_QUALITY)
+    elif file_format.upper() == 'JPEG':
+        # Convert to RGB if necessary (for PNG with transparency)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # Create white background
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            if image.mode == 'P':
+                image = image.convert('RGBA')
+            background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
+            image = background
+        
+        image.save(output_path, 'JPEG', quality=Config.JPEG_QUALITY, optimize=True)
+    else:  # PNG
+        image.save(output_path, 'PNG', optimize=True, compress_level=Config.PNG_COMPRESS_LEVEL)
+
+def draft_for_size(image, size):
+    """Let libjpeg decode at the smallest DCT scale (1/2, 1/4, 1/8) that still covers size"""
+    if Config.FAST_DECODE and image.format == 'JPEG':
+        image.draft(image.mode, size)
+
+def resize_image(image, size):
+    """Resize with LANCZOS, reducing by whole factors first when fast decode is on"""
+    from PIL import Image
+    reducing_gap = Config.REDUCING_GAP if Config.FAST_DECODE else None
+    return image.resize(size, Image.Resampling.LANCZOS, reducing_gap=reducing_gap)
 
 def compress_image(input_path, output_path, file_format):
-    """Compress image with specified format"""
+    """Compress image with specified format
+    
+    EXIF metadata is read once here and the image is turned upright for its
+    orientation, so stored width and height are as displayed. Returns a dict
+    with the RESULT_FIELDS, plus the stage timings under 'stages' when
+    metrics are enabled.
+    """
+    load_codecs()
+    from PIL import Image
+    import pillow_heif
+    
+    timer = StageTimer()
+    
     try:
         # Handle HEIC files
-        if file_format.upper() == 'HEIC':
-            heif_file = pillow_heif.read_heif(input_path)
-            image = Image.frombytes(
-                heif_file.mode, 
-                heif_file.size, 
-                heif_file.data
-            )
-            # Convert HEIC to JPEG
-            file_format = 'JPEG'
-        else:
-            image = Image.open(input_path)
-        
-        # Get image dimensions
-        width, height = image.size
+        with timer('decode'):
+            if file_format.upper() == 'HEIC':
+                heif_file = pillow_heif.read_heif(input_path)
+                image = Image.frombytes(
+                    heif_file.mode, 
+                    heif_file.size, 
+                    heif_file.data
+                )
+                metadata = read_heif_metadata(heif_file)
+                transpose = 1  # libheif already applied the rotation
+                # Convert HEIC to JPEG
+                file_format = 'JPEG'
+            else:
+                image = Image.open(input_path)
+                metadata = read_metadata(image.getexif())
+                transpose = metadata['orientation']
+            
+            # Get image dimensions as displayed
+            width, height = image.size
+            if swaps_dimensions(transpose):
+                width, height = height, width
+            
+            # Resize if width > max_width
+            new_size = None
+            if width > Config.MAX_WIDTH:
+                ratio = Config.MAX_WIDTH / width
+                new_size = (Config.MAX_WIDTH, int(height * ratio))
+                # Resizing happens before the rotation, in stored orientation
+                stored_size = new_size[::-1] if swaps_dimensions(transpose) else new_size
+                draft_for_size(image, stored_size)
+            image.load()
         
-        # Resize if width > max_width
-        if width > Config.MAX_WIDTH:
-            ratio = Config.MAX_WIDTH / width
-            new_size = (Config.MAX_WIDTH, int(height * ratio))
-            image = image.resize(new_size, Image.Resampling.LANCZOS)
+        if new_size:
+            with timer('resize'):
+                image = resize_image(image, stored_size)
             width, height = new_size
         
-        # Save with compression
-        if file_format.upper() == 'JPEG':
-            # Convert to RGB if necessary (for PNG with transparency)
-            if image.mode in ('RGBA', 'LA', 'P'):
-                # Create white background
-                background = Image.new('RGB', image.size, (255, 255, 255))
-                if image.mode == 'P':
-                    image = image.convert('RGBA')
-                background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
-                image = background
-            
-            image.save(output_path, 'JPEG', quality=Config.JPEG_QUALITY, optimize=True)
-        else:  # PNG
-            image.save(output_path, 'PNG', optimize=True, compress_level=Config.PNG_COMPRESS_LEVEL)
+        # Rotate the downscaled image, which is cheaper than rotating the original
+        image = apply_orientation(image, transpose)
+        
+        # Perceptual hash of the already downscaled image, for near-duplicate search
+        with timer('hash'):
+            phash = to_signed(dhash(image))
+        
+        # Save with compression; write to a temporary file first because
+        # compressed files are shared by every photo with the same content
+        with timer('encode'):
+            temp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                save_image(image, temp_path, file_format)
+                os.replace(temp_path, output_path)
+            except Exception:
+                cleanup_file(temp_path)
+                raise
         
-        return os.path.getsize(output_path), width, height
+        result = {
+            'compressed_size': os.path.getsize(output_path),
+            'width': width,
+            'height': height,
+            'phash': phash,
+            **metadata
+        }
+        if timer.stages is not None:
+            result['stages'] = timer.stages
+        return result
         
     except Exception as e:
         raise Exception(f"Image compression failed: {str(e)}")
 
-def process_uploaded_photos(album_id, files):
-    """Process multiple uploaded photos"""
-    uploaded_photos = []
-    failed_uploads = []
-    errors = []
+class SerialExecutor(Executor):
+    """Executor that runs each task immediately in the calling thread"""
+    
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+_executor = None
+
+def create_executor(kind=None, workers=None):
+    """Create a compression executor of the given kind"""
+    kind = kind or Config.COMPRESSION_EXECUTOR
+    workers = workers or Config.COMPRESSION_WORKERS
+    
+    if kind == 'process':
+        # concurrent.futures.process pulls in multiprocessing; only load it when used
+        from concurrent.futures import ProcessPoolExecutor
+        return ProcessPoolExecutor(max_workers=workers)
+    if kind == 'thread':
+        return ThreadPoolExecutor(max_workers=workers)
+    if kind == 'serial':
+        return SerialExecutor()
+    raise ValueError(f"Unknown compression executor: {kind}")
+
+def get_executor():
+    """Get the shared compression executor, creating it on first use"""
+    global _executor
+    if _executor is None:
+        _executor = create_executor()
+    return _executor
+
+def set_executor(executor):
+    """Replace the shared compression executor"""
+    global _executor
+    _executor = executor
+
+def compress_batch(jobs, executor=None):
+    """Compress (input_path, output_path, file_format) jobs concurrently
+    
+    Returns one (result, error) pair per job, in the same order as the jobs.
+    """
+    executor = executor or get_executor()
+    futures = [executor.submit(compress_image, *job) for job in jobs]
+    
+    results = []
+    for job, future in zip(jobs, futures):
+        try:
+            result = future.result()
+            metrics.record_stages(result.pop('stages', None), format=job[2])
+            results.append((result, None))
+        except Exception as e:
+            results.append((None, e))
+    return results
+
+def get_file_format(file_ext):
+    """Map a file extension to its stored format"""
+    if file_ext in ['heic', 'heif']:
+        return 'HEIC'
+    if file_ext in ['jpg', 'jpeg']:
+        return 'JPEG'
+    if file_ext == 'png':
+        return 'PNG'
+    return None
+
+def prepare_upload(filename):
+    """Validate an upload filename and return its stored format
+    
+    Raises an exception with a user-facing message for unsupported files.
+    """
+    # Get file extension
+    file_ext = os.path.splitext(filename)[1].lower().lstrip('.')
+    
+    if file_ext not in Config.ALLOWED_EXTENSIONS:
+        raise Exception("Unsupported format")
+    
+    # Determine file format
+    file_format = get_file_format(file_ext)
+    if file_format is None:
+        raise Exception("Unknown format")
+    
+    return file_format
+
+def store_original(temp_path, content_hash, original_size, file_format):
+    """Move a fully received original to its content-addressed path
+    
+    Returns the entry describing where the original and its compressed
+    version live. Identical content always maps to the same paths.
+    """
+    metrics.inc('photo_bytes_in_total', original_size, format=file_format)
+    
+    compressed_filename = content_filename(content_hash, get_output_format(file_format))
+    original_path = store_content(temp_path, Config.ORIGINALS_FOLDER,
+                                  content_filename(content_hash, file_format))
+    
+    return {
+        'content_hash': content_hash,
+        'compressed_filename': compressed_filename,
+        'file_format': file_format,
+        'original_path': original_path,
+        'compressed_path': layout_path(Config.COMPRESSED_FOLDER, compressed_filename, create=True),
+        'original_size': original_size
+    }
+
+def save_uploaded_files(files):
+    """Validate uploaded files and save their originals in request order
+    
+    Returns (filename, entry) pairs where entry is either an error message
+    or a dict describing the saved original and its target paths.
+    """
+    entries = []
     
     for file in files:
+        filename = file.filename if file else ''
         try:
             # Validate file
             if not file or file.filename == '':
                 continue
             
-            # Get file extension
-            filename = file.filename
-            file_ext = os.path.splitext(filename)[1].lower().lstrip('.')
-            
-            if file_ext not in Config.ALLOWED_EXTENSIONS:
-                errors.append(f"File {filename}: Unsupported format")
-                failed_uploads.append(filename)
-                continue
-            
-            # Determine file format
-            if file_ext in ['heic', 'heif']:
-                file_format = 'HEIC'
-            elif file_ext in ['jpg', 'jpeg']:
-                file_format = 'JPEG'
-            elif file_ext == 'png':
-                file_format = 'PNG'
-            else:
-                errors.append(f"File {filename}: Unknown format")
-                failed_uploads.append(filename)
-                continue
-            
-            # Generate unique filename
-            compressed_filename = generate_filename(filename, file_format)
-            original_filename = generate_filename(filename, file_format)
-            
-            # Create file paths
-            original_path = os.path.join(Config.ORIGINALS_FOLDER, original_filename)
-            compressed_path = os.path.join(Config.COMPRESSED_FOLDER, compressed_filename)
-            
-            # Save original file
-            file.save(original_path)
-            original_size = os.path.getsize(original_path)
+            file_format = prepare_upload(filename)
             
-            # Compress image
-            compressed_size, width, height = compress_image(original_path, compressed_path, file_format)
+            # Save original file, hashing it while it is written
+            with metrics.timed('photo_stage_seconds', stage='save', format=file_format):
+                temp_path, content_hash, original_size = save_stream(file.stream, Config.ORIGINALS_FOLDER)
+            entries.append((filename, store_original(temp_path, content_hash, original_size, file_format)))
             
-            # Import here to avoid circular import
-            from database import create_photo
-            
-            # Save to database
-            photo_id = create_photo(
-                album_id=album_id,
-                filename=compressed_filename,
-                original_filename=filename,
-                file_format=file_format,
-                original_path=original_path,
-                compressed_path=compressed_path,
-                original_size=original_size,
-                compressed_size=compressed_size,
-                width=width,
-                height=height
-            )
-            
-            # Calculate compression ratio
-            compression_ratio = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
+        except Exception as e:
+            entries.append((filename, str(e)))
+    
+    return entries
+
+def use_stored_blob(entry, blob):
+    """Point an entry at already compressed content instead of compressing it again"""
+    entry.update({
+        'compressed_filename': os.path.basename(blob['compressed_path']),
+        'original_path': blob['original_path'],
+        'compressed_path': blob['compressed_path'],
+        'result': {field: blob[field] for field in RESULT_FIELDS},
+        'error': None
+    })
+
+def photo_summary(photo_id, filename, entry, result):
+    """Build the upload response entry for a compressed photo"""
+    compressed_size = result['compressed_size']
+    original_size = entry['original_size']
+    
+    # Calculate compression ratio
+    compression_ratio = ((original_size - compressed_size) / original_size * 100) if original_size > 0 else 0
+    
+    return {
+        'id': photo_id,
+        'filename': entry['compressed_filename'],
+        'original_filename': filename,
+        'file_format': entry['file_format'],
+        'original_size': original_size,
+        'compressed_size': compressed_size,
+        'width': result['width'],
+        'height': result['height'],
+        'compression_ratio': round(compression_ratio, 2)
+    }
+
+def process_uploaded_photos(album_id, files, executor=None):
+    """Process multiple uploaded photos
+    
+    Originals are saved in request order, compressed in parallel on the
+    executor and then recorded in the database in request order.
+    """
+    return process_saved_photos(album_id, save_uploaded_files(files), executor)
+
+def process_saved_photos(album_id, entries, executor=None):
+    """Compress and record originals already saved by save_uploaded_files"""
+    uploaded_photos = []
+    failed_uploads = []
+    errors = []
+    
+    # Import here to avoid circular import
+    from database import create_photos, get_blobs
+    
+    saved = [entry for _, entry in entries if isinstance(entry, dict)]
+    blobs = get_blobs({entry['content_hash'] for entry in saved})
+    
+    # Compress each new content once, even if it appears several times in the batch
+    pending = {}
+    for entry in saved:
+        if entry['content_hash'] not in blobs:
+            pending.setdefault(entry['content_hash'], entry)
+    
+    jobs = [(entry['original_path'], entry['compressed_path'], entry['file_format'])
+            for entry in pending.values()]
+    results = dict(zip(pending, compress_batch(jobs, executor)))
+    
+    for content_hash, (result, _) in results.items():
+        if result is not None:
+            metrics.inc('photo_bytes_out_total', result['compressed_size'],
+                        format=pending[content_hash]['file_format'])
+    
+    for entry in saved:
+        if entry['content_hash'] in blobs:
+            use_stored_blob(entry, blobs[entry['content_hash']])
+        else:
+            entry['result'], entry['error'] = results[entry['content_hash']]
+    
+    # Record every photo that made it this far in one bulk insert
+    ready = [(filename, entry) for filename, entry in entries
+             if isinstance(entry, dict) and entry['error'] is None]
+    with metrics.timed('photo_stage_seconds', stage='db_insert', format='all'):
+        inserted = create_photos([
+            dict(album_id=album_id,
+                 filename=entry['compressed_filename'],
+                 original_filename=filename,
+                 file_format=entry['file_format'],
+                 original_path=entry['original_path'],
+                 compressed_path=entry['compressed_path'],
+                 original_size=entry['original_size'],
+                 content_hash=entry['content_hash'],
+                 **entry['result'])
+            for filename, entry in ready
+        ])
+    for (_, entry), (photo_id, error) in zip(ready, inserted):
+        entry['photo_id'] = photo_id
+        if error is not None:
+            entry['error'] = Exception(f"Database insert failed: {error}")
+    
+    for filename, entry in entries:
+        try:
+            if not isinstance(entry, dict):
+                raise Exception(entry)
+            if entry['error'] is not None:
+                raise entry['error']
             
-            uploaded_photos.append({
-                'id': photo_id,
-                'filename': compressed_filename,
-                'original_filename': filename,
-                'file_format': file_format,
-                'original_size': original_size,
-                'compressed_size': compressed_size,
-                'width': width,
-                'height': height,
-                'compression_ratio': round(compression_ratio, 2)
-            })
+            uploaded_photos.append(photo_summary(entry['photo_id'], filename, entry, entry['result']))
+            outcome = 'compressed' if pending.get(entry['content_hash']) is entry else 'deduplicated'
+            metrics.inc('photos_processed_total', format=entry['file_format'], outcome=outcome)
             
         except Exception as e:
             error_msg = f"File {filename}: {str(e)}"
             errors.append(error_msg)
             failed_uploads.append(filename)
+            file_format = entry['file_format'] if isinstance(entry, dict) else 'unknown'
+            metrics.inc('photos_processed_total', format=file_format, outcome='failed')
     
     return {
         'uploaded': len(uploaded_photos),
@@ -154,5 +408,3 @@ def process_uploaded_photos(album_id, files):
         'photos': uploaded_photos,
         'errors': errors
     }
-
-# Import will be done at function call to avoid circular import
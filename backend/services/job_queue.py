@@ -0,0 +1,139 @@
+import os
+import threading
+from config import Config
+from database import (
+    has_pending_job_items, claim_next_job_item, complete_job_item, fail_job_item,
+    get_processing_job_items, requeue_job_items, get_blobs
+)
+from services.image_processor import compress_image, get_executor, RESULT_FIELDS
+from services import metrics
+
+_wakeup = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+
+def notify_workers():
+    """Wake idle workers after new items were enqueued, starting them on first use"""
+    start_workers()
+    _wakeup.set()
+
+def process_job_item(item):
+    """Compress one claimed job item and record the resulting photo"""
+    try:
+        # Identical content that is already compressed is reused as-is
+        blob = get_blobs([item['content_hash']]).get(item['content_hash'])
+        if blob:
+            item = dict(item, original_path=blob['original_path'],
+                        compressed_path=blob['compressed_path'],
+                        filename=os.path.basename(blob['compressed_path']))
+            photo_id = complete_job_item(item, {field: blob[field] for field in RESULT_FIELDS})
+            metrics.inc('photos_processed_total', format=item['file_format'], outcome='deduplicated')
+            return photo_id
+        
+        # Run the CPU-bound work on the shared compression executor
+        future = get_executor().submit(
+            compress_image, item['original_path'], item['compressed_path'], item['file_format']
+        )
+        result = future.result()
+        metrics.record_stages(result.pop('stages', None), format=item['file_format'])
+        metrics.inc('photo_bytes_out_total', result['compressed_size'], format=item['file_format'])
+        
+        with metrics.timed('photo_stage_seconds', stage='db_insert', format='all'):
+            photo_id = complete_job_item(item, result)
+        metrics.inc('photos_processed_total', format=item['file_format'], outcome='compressed')
+        return photo_id
+    except Exception as e:
+        fail_job_item(item['id'], str(e))
+        metrics.inc('photos_processed_total', format=item['file_format'], outcome='failed')
+        return None
+
+def _pid_alive(pid):
+    """Check whether a process with the given PID is still running"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def process_start_time(pid):
+    """Get when the process with the given PID started, in clock ticks since boot
+    
+    Read from /proc, so it is None where that is not available or the
+    process does not exist. A PID reused after a restart, by this app or any
+    other program, comes with a later start time.
+    """
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Fields after the parenthesized command name, which may contain spaces;
+    # starttime is field 22 of the whole line
+    return int(stat.rsplit(')', 1)[1].split()[19])
+
+def _worker_alive(pid, started):
+    """Check whether the process that claimed an item, identified by PID and start time, still runs"""
+    if started is not None:
+        return process_start_time(pid) == started
+    # Claimed where start times are unavailable, or before they were recorded
+    return _pid_alive(pid)
+
+def recover_interrupted_items():
+    """Requeue items left in processing by a worker process that has exited
+    
+    Items owned by the current PID are also stale: this runs before any of
+    this process's workers have claimed anything. A PID now used by another
+    process does not keep its items, as its start time differs.
+    """
+    current_pid = os.getpid()
+    stale = [item['id'] for item in get_processing_job_items()
+             if item['worker_pid'] is None
+             or item['worker_pid'] == current_pid
+             or not _worker_alive(item['worker_pid'], item['worker_started'])]
+    
+    if stale:
+        requeue_job_items(stale)
+    return len(stale)
+
+def _worker_loop():
+    """Drain pending job items until the process exits"""
+    pid = os.getpid()
+    started = process_start_time(pid)
+    while True:
+        try:
+            # Polling with a read keeps idle workers off the write lock
+            item = claim_next_job_item(pid, started) if has_pending_job_items() else None
+        except Exception:
+            item = None
+        
+        if item is None:
+            _wakeup.wait(Config.JOB_POLL_INTERVAL)
+            _wakeup.clear()
+            continue
+        
+        process_job_item(item)
+
+def start_workers(count=None):
+    """Start the background queue workers of this process, once"""
+    with _workers_lock:
+        if _workers:
+            return _workers
+        
+        for index in range(count or Config.JOB_WORKERS):
+            worker = threading.Thread(target=_worker_loop, name=f"job-worker-{index}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+        
+        return _workers
+
+def resume_workers():
+    """Recover interrupted items and start the workers if uploads are queued
+    
+    Must run before this process's workers start. In sync mode the workers
+    otherwise start with the first job enqueued (?mode=async).
+    """
+    recover_interrupted_items()
+    if Config.UPLOAD_MODE == 'async' or has_pending_job_items():
+        start_workers()
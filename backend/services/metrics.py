@@ -0,0 +1,170 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from config import Config
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Metric descriptions for the exposition; names not listed here are not exported
+METRICS = {
+    'photo_stage_seconds': ('histogram', 'Time spent in each photo ingest stage'),
+    'photo_bytes_in_total': ('counter', 'Original bytes received'),
+    'photo_bytes_out_total': ('counter', 'Compressed bytes written'),
+    'photos_processed_total': ('counter', 'Uploaded photos by format and outcome'),
+    'photo_view_bytes_saved_total': ('counter', 'Bytes saved by serving WebP/AVIF views instead of JPEG/PNG'),
+    'db_transaction_seconds': ('histogram', 'Time spent in each database helper, including commit'),
+    'db_commit_seconds': ('histogram', 'Time spent committing database transactions'),
+    'photo_cache': ('gauge', 'In-process photo cache usage (entries, bytes, max_bytes)'),
+    'photo_cache_hits_total': ('counter', 'Photo cache lookups that found an entry'),
+    'photo_cache_misses_total': ('counter', 'Photo cache lookups that found nothing'),
+    'photo_cache_evictions_total': ('counter', 'Photo cache entries evicted to stay within budget'),
+    'gc_deleted_total': ('counter', 'Rows and files removed by the garbage collector, by kind'),
+    'gc_reclaimed_bytes_total': ('counter', 'Bytes of files removed by the garbage collector')
+}
+
+_NULL_CONTEXT = nullcontext()
+_lock = threading.Lock()
+_counters = defaultdict(float)  # (name, labels) -> value
+_gauges = {}  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> per-bucket counts, then +Inf count and sum
+
+def enabled():
+    """Check whether metrics are being recorded"""
+    return Config.METRICS_ENABLED
+
+def _key(name, labels):
+    """Build the storage key of a metric and label set"""
+    return name, tuple(sorted(labels.items()))
+
+def inc(name, amount=1, **labels):
+    """Add to a counter"""
+    if not Config.METRICS_ENABLED:
+        return
+    with _lock:
+        _counters[_key(name, labels)] += amount
+
+def set_counter(name, value, **labels):
+    """Set a counter that is kept elsewhere to its current total"""
+    if not Config.METRICS_ENABLED:
+        return
+    with _lock:
+        _counters[_key(name, labels)] = value
+
+def set_gauge(name, value, **labels):
+    """Set a gauge to its current value"""
+    if not Config.METRICS_ENABLED:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+def observe(name, seconds, **labels):
+    """Record one observation in a histogram"""
+    if not Config.METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        histogram[bisect_left(BUCKETS, seconds)] += 1
+        histogram[-1] += seconds
+
+@contextmanager
+def _timer(name, labels):
+    """Observe the duration of the block"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+def timed(name, **labels):
+    """Context manager recording the duration of its block in a histogram
+    
+    Returns a shared no-op context when metrics are disabled.
+    """
+    if not Config.METRICS_ENABLED:
+        return _NULL_CONTEXT
+    return _timer(name, labels)
+
+class StageTimer:
+    """Collect stage durations where they cannot be recorded directly
+    
+    Compression runs in worker processes whose metrics would be lost, so
+    compress_image returns its stage timings and the caller records them
+    with record_stages.
+    """
+    
+    def __init__(self):
+        self.stages = [] if Config.METRICS_ENABLED else None
+    
+    @contextmanager
+    def _measure(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((stage, time.perf_counter() - start))
+    
+    def __call__(self, stage):
+        if self.stages is None:
+            return _NULL_CONTEXT
+        return self._measure(stage)
+
+def record_stages(stages, **labels):
+    """Record stage timings collected by a StageTimer"""
+    for stage, seconds in stages or ():
+        observe('photo_stage_seconds', seconds, stage=stage, **labels)
+
+def _format_labels(labels, extra=()):
+    """Format a label set as {name="value",...}"""
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def _format_value(value):
+    """Format a sample value without losing precision on large counts"""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def render():
+    """Render all metrics in the Prometheus text exposition format"""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {key: list(value) for key, value in _histograms.items()}
+    
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        
+        if kind == 'histogram':
+            for (metric_name, labels), histogram in sorted(histograms.items()):
+                if metric_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), histogram):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram[-1]:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        else:
+            values = counters if kind == 'counter' else gauges
+            for (metric_name, labels), value in sorted(values.items()):
+                if metric_name == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    
+    return '\n'.join(lines) + '\n'
+
+def reset():
+    """Clear all recorded metrics"""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
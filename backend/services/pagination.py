@@ -0,0 +1,34 @@
+import base64
+import json
+from config import Config
+
+def encode_cursor(*values):
+    """Encode the sort key of the last row on a page as an opaque cursor"""
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, size):
+    """Decode a cursor back into its sort key values"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return tuple(values)
+
+def get_page_args(args, key_size=2):
+    """Read limit and cursor query parameters
+    
+    Returns (limit, after) where after is the decoded sort key to continue
+    from, or None for the first page. Raises ValueError on bad input.
+    """
+    limit = args.get('limit', Config.PAGE_SIZE, type=int)
+    if limit is None or not 1 <= limit <= Config.MAX_PAGE_SIZE:
+        raise ValueError(f"Limit must be between 1 and {Config.MAX_PAGE_SIZE}")
+    
+    cursor = args.get('cursor')
+    after = decode_cursor(cursor, key_size) if cursor else None
+    return limit, after
@@ -0,0 +1,250 @@
+import os
+import threading
+import time
+import uuid
+import mimetypes
+from contextlib import contextmanager
+from config import Config
+from database import (
+    get_photo_for_view, get_renditions, create_rendition, delete_renditions,
+    claim_rendition, release_rendition
+)
+from services.file_manager import get_file_path, get_rendition_file_path, cleanup_file
+from services.image_processor import get_output_format, save_image, draft_for_size, resize_image
+
+# Formats offered alongside JPEG/PNG, with the media type clients list in Accept
+MODERN_FORMATS = {
+    'WEBP': 'image/webp',
+    'AVIF': 'image/avif'
+}
+
+for _format, _mimetype in MODERN_FORMATS.items():
+    mimetypes.add_type(_mimetype, f".{_format.lower()}")
+
+_enabled_formats = None
+
+def enabled_formats():
+    """Get the configured formats this Pillow build can encode, smallest output expected first
+    
+    Checked on first use: asking Pillow at import time would load it in
+    processes that never serve an image.
+    """
+    global _enabled_formats
+    if _enabled_formats is None:
+        from PIL import features
+        _enabled_formats = tuple(fmt for fmt in ('AVIF', 'WEBP')
+                                 if fmt in Config.RENDITION_FORMATS and features.check(fmt.lower()))
+    return _enabled_formats
+
+@contextmanager
+def _generation_claim(photo_id, size):
+    """Hold the database claim on generating a photo's renditions at size
+    
+    The claim is shared by all processes using the database, so a rendition
+    is generated once however many workers request it together; the others
+    wait here and then find it recorded.
+    """
+    token = uuid.uuid4().hex
+    while not claim_rendition(photo_id, size, token, Config.RENDITION_CLAIM_TIMEOUT):
+        time.sleep(Config.RENDITION_CLAIM_POLL_INTERVAL)
+    
+    try:
+        yield
+    finally:
+        release_rendition(photo_id, size, token)
+
+def _find_rendition(renditions, size):
+    """Get the rendition row for size if its file is present"""
+    for rendition in renditions:
+        if rendition['size'] == size and os.path.exists(get_rendition_file_path(rendition['path'])):
+            return rendition
+    return None
+
+def _serves_compressed(photo, size):
+    """Check whether size is served by the compressed file itself
+    
+    Photos no wider than the requested size are served as-is.
+    """
+    return size == 'full' or not photo['width'] or photo['width'] <= Config.RENDITION_SIZES[size]
+
+def get_rendition_path(photo, size):
+    """Resolve the file to serve for a photo at size, generating it on first use"""
+    if _serves_compressed(photo, size):
+        return get_file_path(photo['compressed_path'])
+    
+    rendition = _find_rendition(get_renditions(photo['id']), size)
+    if rendition:
+        return get_rendition_file_path(rendition['path'])
+    
+    with _generation_claim(photo['id'], size):
+        # Another request may have generated it while this one waited
+        renditions = get_renditions(photo['id'])
+        rendition = _find_rendition(renditions, size)
+        if rendition:
+            return get_rendition_file_path(rendition['path'])
+        
+        return generate_rendition(photo, size, renditions)
+
+def resolve_rendition_path(photo, size):
+    """Resolve the file to serve from a get_photo_for_view row without touching disk
+    
+    Falls back to get_rendition_path (which checks and generates files) only
+    when no rendition row exists yet.
+    """
+    if _serves_compressed(photo, size):
+        return get_file_path(photo['compressed_path'])
+    
+    if photo['rendition_path']:
+        return get_rendition_file_path(photo['rendition_path'])
+    
+    return get_rendition_path(photo, size)
+
+def _load_resized(source_path, target_width):
+    """Decode source_path downscaled to target_width"""
+    from PIL import Image
+    
+    with Image.open(source_path) as image:
+        ratio = target_width / image.width
+        new_size = (target_width, max(int(image.height * ratio), 1))
+        draft_for_size(image, new_size)
+        return resize_image(image, new_size)
+
+def _write_rendition(photo, key, image, output_format, legacy_size=None):
+    """Encode image as a rendition file of photo and record it under key
+    
+    Returns (path, file size).
+    """
+    # Named per photo: compressed files are shared between identical photos,
+    # but renditions are owned by (and deleted with) a single photo
+    name = key.split(':')[0]
+    output_path = os.path.join(Config.RENDITIONS_FOLDER,
+                               f"photo_{photo['id']}_{name}.{output_format.lower()}")
+    temp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    
+    # Write to a temporary file so readers never see a partial rendition
+    try:
+        save_image(image, temp_path, output_format)
+        os.replace(temp_path, output_path)
+    except Exception:
+        cleanup_file(temp_path)
+        raise
+    
+    file_size = os.path.getsize(output_path)
+    create_rendition(photo['id'], key, output_path, image.width, image.height, file_size,
+                     output_format if legacy_size is not None else None, legacy_size)
+    return output_path, file_size
+
+def generate_rendition(photo, size, renditions):
+    """Downscale the nearest larger rendition (or the compressed file) to size"""
+    target_width = Config.RENDITION_SIZES[size]
+    output_format = get_output_format(photo['file_format'])
+    
+    # Pick the smallest existing legacy rendition that is still wider than the target
+    source_path = get_file_path(photo['compressed_path'])
+    larger = [r for r in renditions
+              if r['format'] is None and r['width'] > target_width
+              and os.path.exists(get_rendition_file_path(r['path']))]
+    if larger:
+        source_path = get_rendition_file_path(min(larger, key=lambda r: r['width'])['path'])
+    
+    resized = _load_resized(source_path, target_width)
+    output_path, _ = _write_rendition(photo, size, resized, output_format)
+    return output_path
+
+def accepted_formats(accept):
+    """Get the enabled modern formats a request's Accept header lists explicitly
+    
+    Wildcards are ignored: clients sending only */* may not decode WebP or AVIF.
+    """
+    listed = {value.lower() for value, quality in accept if quality > 0}
+    return tuple(fmt for fmt in enabled_formats() if MODERN_FORMATS[fmt] in listed)
+
+def variant_key(size, file_format):
+    """Rendition key of a modern-format variant"""
+    return f"{size}:{file_format.lower()}"
+
+def generate_variants(photo, size, renditions):
+    """Encode every enabled modern format of photo at size that is still missing
+    
+    The image is decoded and resized once for all formats. Each variant
+    records the size of the JPEG/PNG file it stands in for.
+    """
+    missing = [fmt for fmt in enabled_formats()
+               if not _find_rendition(renditions, variant_key(size, fmt))]
+    if not missing:
+        return
+    
+    if size == 'full':
+        from PIL import Image
+        legacy_size = photo['compressed_size']
+        with Image.open(get_file_path(photo['compressed_path'])) as image:
+            image.load()
+    else:
+        image = _load_resized(get_file_path(photo['compressed_path']), Config.RENDITION_SIZES[size])
+        legacy = _find_rendition(renditions, size)
+        if legacy is None:
+            _, legacy_size = _write_rendition(photo, size, image, get_output_format(photo['file_format']))
+        else:
+            legacy_size = legacy['file_size']
+    
+    for fmt in missing:
+        _write_rendition(photo, variant_key(size, fmt), image, fmt, legacy_size)
+
+# Rendition columns returned for each variant joined by get_photo_for_view
+VARIANT_FIELDS = ('path', 'size', 'format', 'file_size', 'legacy_size')
+
+def get_photo_view(photo_id, size, formats):
+    """Get a photo for viewing at size with its generated variants in formats
+    
+    One get_photo_for_view lookup, without checking files on disk. Returns
+    (photo, variants): variants holds the rendition row of each format, or
+    None where it is not generated yet. photo is None if there is no such
+    active photo.
+    """
+    variant_keys = [(variant_key(size, fmt), variant_key('full', fmt)) for fmt in formats]
+    photo = get_photo_for_view(photo_id, size, variant_keys, Config.RENDITION_SIZES.get(size, 0))
+    if photo is None:
+        return None, []
+    
+    variants = [{field: photo[f"variant_{i}_{field}"] for field in VARIANT_FIELDS}
+                if photo[f"variant_{i}_path"] else None
+                for i in range(len(formats))]
+    return photo, variants
+
+def select_variant(photo, size, formats, variants):
+    """Pick the smallest variant of photo at size among formats, generating missing ones
+    
+    variants are the rows get_photo_view found; the renditions are only
+    listed (and their files checked) when one of them is missing. Returns
+    the rendition row, or None when the JPEG/PNG file is smaller.
+    """
+    if None in variants:
+        if _serves_compressed(photo, size):
+            size = 'full'
+        
+        with _generation_claim(photo['id'], size):
+            generate_variants(photo, size, get_renditions(photo['id']))
+            renditions = get_renditions(photo['id'])
+        variants = [_find_rendition(renditions, variant_key(size, fmt)) for fmt in formats]
+    
+    best = min((variant for variant in variants if variant is not None),
+               key=lambda variant: variant['file_size'], default=None)
+    if best is None or best['file_size'] >= best['legacy_size']:
+        return None
+    return best
+
+def regenerate_variant(photo, rendition):
+    """Re-encode a variant whose row outlived its file and return the file's path"""
+    size = rendition['size'].split(':')[0]
+    with _generation_claim(photo['id'], size):
+        generate_variants(photo, size, get_renditions(photo['id']))
+    return get_rendition_file_path(rendition['path'])
+
+def remove_rendition_files(paths):
+    """Delete rendition files whose rows are already gone"""
+    for path in paths:
+        cleanup_file(get_rendition_file_path(path))
+
+def remove_renditions(photo_id):
+    """Delete all renditions of a photo, rows and files"""
+    remove_rendition_files(delete_renditions(photo_id))
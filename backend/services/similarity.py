@@ -0,0 +1,78 @@
+from collections import defaultdict
+from itertools import combinations
+
+HASH_BITS = 64
+
+def dhash(image):
+    """Compute a 64-bit difference hash of an image
+    
+    Each bit records whether a pixel of a 9x8 grayscale thumbnail is brighter
+    than its right-hand neighbour, which survives resizing and re-encoding.
+    """
+    from PIL import Image
+    
+    small = image.convert('L').resize((9, 8), Image.Resampling.BOX)
+    pixels = small.tobytes()
+    
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            offset = row * 9 + col
+            value = (value << 1) | (pixels[offset] > pixels[offset + 1])
+    return value
+
+def to_signed(value):
+    """Convert an unsigned 64-bit hash to the signed form SQLite INTEGER stores"""
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+def to_unsigned(value):
+    """Convert a hash read back from SQLite to its unsigned form"""
+    return value & ((1 << HASH_BITS) - 1)
+
+def find_duplicate_clusters(photo_ids, hashes, threshold):
+    """Group photos whose hashes are within threshold bits of each other
+    
+    Uses multi-index hashing: the hash is split into threshold + 1 bands, so
+    by the pigeonhole principle any two hashes within threshold bits agree
+    exactly on at least one band. Only hashes sharing a band value are
+    compared, and matches are merged into clusters with union-find. Photos
+    with equal hashes count as one, and hashes already in the same cluster
+    are not compared again, so exact copies cost nothing.
+    Returns lists of photo IDs, each with at least two members.
+    """
+    nodes = {}
+    for value in hashes:
+        nodes.setdefault(value, len(nodes))
+    values = list(nodes)
+    
+    bands = threshold + 1
+    edges = [HASH_BITS * band // bands for band in range(bands + 1)]
+    parent = list(range(len(values)))
+    
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+    
+    for low, high in zip(edges, edges[1:]):
+        mask = (1 << (high - low)) - 1
+        buckets = defaultdict(list)
+        for index, value in enumerate(values):
+            buckets[(value >> low) & mask].append(index)
+        
+        for bucket in buckets.values():
+            if len(bucket) < 2 or len({parent[index] for index in bucket}) < 2:
+                continue
+            for i, j in combinations(bucket, 2):
+                # Hashes sharing a parent are in the same cluster already
+                if parent[i] == parent[j] or bin(values[i] ^ values[j]).count('1') > threshold:
+                    continue
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+    
+    clusters = defaultdict(list)
+    for photo_id, value in zip(photo_ids, hashes):
+        clusters[find(nodes[value])].append(photo_id)
+    return [cluster for cluster in clusters.values() if len(cluster) > 1]
@@ -0,0 +1,132 @@
+"""Check the headers and bodies of each FILE_SERVING backend without nginx
+
+Run from the backend directory:
+
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from config import Config
+import database
+from app import create_app
+from services.cache import photo_cache
+from services.file_manager import ensure_directories
+
+# Larger than PHOTO_CACHE_MAX_FILE_SIZE, so views are sent from disk too
+PAYLOAD = os.urandom(300 * 1024)
+
+class StandInFileWrapper:
+    """A wsgi.file_wrapper that records the files the app hands to the server"""
+    
+    def __init__(self):
+        self.files = []
+    
+    def __call__(self, file, block_size=8192):
+        self.files.append(os.path.abspath(file.name))
+        return self._read(file, block_size)
+    
+    def _read(self, file, block_size):
+        with file:
+            yield from iter(lambda: file.read(block_size), b'')
+
+class FileServingTest(unittest.TestCase):
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.saved = {name: getattr(Config, name) for name in (
+            'FILE_SERVING', 'UPLOAD_FOLDER', 'ORIGINALS_FOLDER', 'COMPRESSED_FOLDER', 'RENDITIONS_FOLDER')}
+        cls.saved_database_path = database.DATABASE_PATH
+        
+        uploads = os.path.join(cls.directory, 'uploads')
+        Config.UPLOAD_FOLDER = uploads
+        Config.ORIGINALS_FOLDER = os.path.join(uploads, 'originals')
+        Config.COMPRESSED_FOLDER = os.path.join(uploads, 'compressed')
+        Config.RENDITIONS_FOLDER = os.path.join(uploads, 'renditions')
+        database.DATABASE_PATH = os.path.join(cls.directory, 'photo_organizer.db')
+        
+        ensure_directories()
+        cls.app = create_app()
+        album_id = database.create_album('Serving', None)
+        cls.original_path = os.path.join(Config.ORIGINALS_FOLDER, 'photo.jpg')
+        cls.compressed_path = os.path.join(Config.COMPRESSED_FOLDER, 'photo.jpeg')
+        for path in (cls.original_path, cls.compressed_path):
+            with open(path, 'wb') as f:
+                f.write(PAYLOAD)
+        cls.photo_id = database.create_photo(album_id, 'photo.jpeg', 'Fjällvägen.jpg', 'JPEG',
+                                             cls.original_path, cls.compressed_path,
+                                             len(PAYLOAD), len(PAYLOAD))
+    
+    @classmethod
+    def tearDownClass(cls):
+        for name, value in cls.saved.items():
+            setattr(Config, name, value)
+        database.DATABASE_PATH = cls.saved_database_path
+        photo_cache.clear()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+    
+    def setUp(self):
+        # Cached entries hold file bytes only for the in-process backends
+        photo_cache.clear()
+    
+    def get(self, url, backend, wrapper=None):
+        Config.FILE_SERVING = backend
+        self.app.config['USE_X_SENDFILE'] = backend == 'x-sendfile'
+        environ = {'wsgi.file_wrapper': wrapper} if wrapper else {}
+        return self.app.test_client().get(url, environ_overrides=environ, buffered=True)
+    
+    def test_sendfile_uses_server_file_wrapper(self):
+        wrapper = StandInFileWrapper()
+        response = self.get(f'/api/photos/{self.photo_id}/download', 'sendfile', wrapper)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, PAYLOAD)
+        self.assertEqual(wrapper.files, [os.path.abspath(self.original_path)])
+    
+    def test_stream_reads_file_in_process(self):
+        wrapper = StandInFileWrapper()
+        response = self.get(f'/api/photos/{self.photo_id}/view', 'stream', wrapper)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, PAYLOAD)
+        self.assertEqual(wrapper.files, [])
+    
+    def test_accel_redirect_view(self):
+        response = self.get(f'/api/photos/{self.photo_id}/view', 'x-accel-redirect')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['X-Accel-Redirect'], '/protected-uploads/compressed/photo.jpeg')
+        self.assertEqual(response.mimetype, 'image/jpeg')
+        self.assertIsNotNone(response.headers.get('ETag'))
+        self.assertIsNotNone(response.headers.get('Last-Modified'))
+        self.assertNotIn('Content-Disposition', response.headers)
+    
+    def test_accel_redirect_download(self):
+        response = self.get(f'/api/photos/{self.photo_id}/download', 'x-accel-redirect')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['X-Accel-Redirect'], '/protected-uploads/originals/photo.jpg')
+        self.assertEqual(response.headers['Content-Disposition'],
+                         "attachment; filename=Fjallvagen.jpg; filename*=UTF-8''Fj%C3%A4llv%C3%A4gen.jpg")
+    
+    def test_accel_redirect_not_modified(self):
+        etag = self.get(f'/api/photos/{self.photo_id}/view', 'x-accel-redirect').headers['ETag']
+        Config.FILE_SERVING = 'x-accel-redirect'
+        response = self.app.test_client().get(f'/api/photos/{self.photo_id}/view',
+                                              headers={'If-None-Match': etag})
+        
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn('X-Accel-Redirect', response.headers)
+    
+    def test_x_sendfile(self):
+        response = self.get(f'/api/photos/{self.photo_id}/download', 'x-sendfile')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Sendfile'], os.path.abspath(self.original_path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -26,7 +26,7 @@ const AlbumCard = ({ album, onEdit, onDelete, onView }) => {
       <div className="album-cover">
         {album.cover_photo ? (
           <img 
-            src={`/api/photos/${album.cover_photo}/view`} 
+            src={`/api/photos/${album.cover_photo}/view?size=small`} 
             alt={album.name}
             onError={(e) => {
               e.target.style.display = 'none'
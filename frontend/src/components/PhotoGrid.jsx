@@ -27,7 +27,8 @@ const PhotoGrid = ({ photos, onDelete, isLoading }) => {
       {photos.map((photo) => (
         <div key={photo.id} className="photo-item">
           <img
-            src={`/api/photos/${photo.id}/view`}
+            src={`/api/photos/${photo.id}/view?size=thumb`}
+            srcSet={`/api/photos/${photo.id}/view?size=thumb 1x, /api/photos/${photo.id}/view?size=small 2x`}
             alt={photo.original_filename}
             loading="lazy"
             onError={(e) => {
@@ -12,6 +12,8 @@ const AlbumDetail = () => {
   
   const [album, setAlbum] = useState(null)
   const [photos, setPhotos] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
+  const [isLoadingMore, setIsLoadingMore] = useState(false)
   const [isLoading, setIsLoading] = useState(true)
   const [isUploading, setIsUploading] = useState(false)
   const [isModalOpen, setIsModalOpen] = useState(false)
@@ -31,6 +33,7 @@ const AlbumDetail = () => {
       const albumData = response.data
       setAlbum(albumData)
       setPhotos(albumData.photos || [])
+      setNextCursor(albumData.next_cursor || null)
     } catch (err) {
       setError('Failed to load album. Please try again.')
       console.error('Error loading album:', err)
@@ -39,6 +42,23 @@ const AlbumDetail = () => {
     }
   }
 
+  const loadMorePhotos = async () => {
+    if (!nextCursor || isLoadingMore) return
+
+    try {
+      setIsLoadingMore(true)
+      setError(null)
+      const response = await photosAPI.getByAlbum(id, nextCursor)
+      setPhotos(current => [...current, ...response.data.photos])
+      setNextCursor(response.data.next_cursor || null)
+    } catch (err) {
+      setError('Failed to load more photos. Please try again.')
+      console.error('Error loading photos:', err)
+    } finally {
+      setIsLoadingMore(false)
+    }
+  }
+
   const handleUpload = async (files) => {
     try {
       setIsUploading(true)
@@ -164,12 +184,23 @@ const AlbumDetail = () => {
               )}
             </div>
           </div>
-          <button
-            className="btn btn-primary"
-            onClick={handleEditAlbum}
-          >
-            ✏️ Edit
-          </button>
+          <div className="flex items-center gap-4">
+            {album.photo_count > 0 && (
+              <a
+                className="btn btn-secondary"
+                href={albumsAPI.exportUrl(album.id)}
+                download
+              >
+                ⬇️ Export
+              </a>
+            )}
+            <button
+              className="btn btn-primary"
+              onClick={handleEditAlbum}
+            >
+              ✏️ Edit
+            </button>
+          </div>
         </div>
       </header>
 
@@ -204,7 +235,7 @@ const AlbumDetail = () => {
       />
 
       <div className="mb-4" style={{ color: '#718096', fontSize: '14px' }}>
-        Showing {photos.length} {photos.length === 1 ? 'photo' : 'photos'}
+        Showing {photos.length} of {album.photo_count} {album.photo_count === 1 ? 'photo' : 'photos'}
       </div>
 
       <PhotoGrid
@@ -213,6 +244,18 @@ const AlbumDetail = () => {
         isLoading={false}
       />
 
+      {nextCursor && (
+        <div className="text-center mt-4">
+          <button
+            className="btn btn-secondary"
+            onClick={loadMorePhotos}
+            disabled={isLoadingMore}
+          >
+            {isLoadingMore ? 'Loading...' : 'Load more photos'}
+          </button>
+        </div>
+      )}
+
       <Modal
         isOpen={isModalOpen}
         onClose={handleCloseModal}
@@ -14,7 +14,7 @@ export const albumsAPI = {
   // Get all albums
   getAll: () => api.get('/albums'),
   
-  // Get album by ID with photos
+  // Get album by ID with the first page of photos
   getById: (id) => api.get(`/albums/${id}`),
   
   // Create new album
@@ -25,12 +25,18 @@ export const albumsAPI = {
   
   // Delete album
   delete: (id) => api.delete(`/albums/${id}`),
+  
+  // URL of the album's ZIP export (files: original or compressed); used as a
+  // plain link so the browser streams the archive straight to disk
+  exportUrl: (id, files = 'original') => `${API_BASE_URL}/albums/${id}/export?files=${files}`,
 }
 
 // Photos API
 export const photosAPI = {
-  // Get photos in album
-  getByAlbum: (albumId) => api.get(`/albums/${albumId}/photos`),
+  // Get a page of photos in album (pass the previous response's next_cursor)
+  getByAlbum: (albumId, cursor = null, limit = null) => api.get(`/albums/${albumId}/photos`, {
+    params: { cursor: cursor || undefined, limit: limit || undefined },
+  }),
   
   // Upload photos to album
   upload: (albumId, formData) => api.post(`/albums/${albumId}/photos`, formData, {
@@ -47,12 +53,55 @@ export const photosAPI = {
     responseType: 'blob',
   }),
   
-  // View compressed photo
-  view: (id) => api.get(`/photos/${id}/view`, {
+  // View compressed photo (size: thumb, small, medium or full)
+  view: (id, size = 'full') => api.get(`/photos/${id}/view`, {
+    params: { size },
     responseType: 'blob',
   }),
 }
 
+// Chunked, resumable uploads
+export const uploadsAPI = {
+  // Start a chunked upload
+  initiate: (albumId, file) => api.post(`/albums/${albumId}/uploads`, {
+    filename: file.name,
+    size: file.size,
+  }),
+  
+  // Get upload status and the offset to resume from
+  status: (uploadId) => api.get(`/uploads/${uploadId}`),
+  
+  // Send one byte range of the file
+  putChunk: (uploadId, chunk, start, total) => api.put(`/uploads/${uploadId}`, chunk, {
+    headers: {
+      'Content-Type': 'application/octet-stream',
+      'Content-Range': `bytes ${start}-${start + chunk.size - 1}/${total}`,
+    },
+  }),
+  
+  // Finalize and compress the uploaded file
+  complete: (uploadId) => api.post(`/uploads/${uploadId}/complete`),
+}
+
+// Upload a file in chunks, resuming from the server offset after failures
+export const uploadChunked = async (albumId, file, uploadId = null) => {
+  if (!uploadId) {
+    const { data } = await uploadsAPI.initiate(albumId, file)
+    uploadId = data.upload_id
+  }
+  
+  const { data: session } = await uploadsAPI.status(uploadId)
+  let offset = session.offset
+  
+  while (offset < file.size) {
+    const chunk = file.slice(offset, offset + session.chunk_size)
+    const { data } = await uploadsAPI.putChunk(uploadId, chunk, offset, file.size)
+    offset = data.offset
+  }
+  
+  return uploadsAPI.complete(uploadId)
+}
+
 // Health check
 export const healthCheck = () => api.get('/health')
 